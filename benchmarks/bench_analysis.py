@@ -0,0 +1,54 @@
+"""
+Document analysis benchmark against the offline Document Intelligence fake.
+
+Compares analyzing a folder serially with `analyze_custom_documents` against the concurrent
+`analyze_documents_batch`, including throttled (429) requests.
+
+Usage:
+    python benchmarks/bench_analysis.py [--folder data/insurance_docs] [--latency 0.5] [--concurrency 8]
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+from fakes import FakeDocumentIntelligenceClient
+from get_custom_text.extract_custom_doc import analyze_custom_documents, analyze_documents_batch
+
+def sample_fields(source):
+    return {"insured_name": os.path.basename(str(source)), "insured_premium": "$1,000.00"}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--folder", default="data/insurance_docs")
+    parser.add_argument("--latency", type=float, default=0.5, help="Simulated seconds per analysis.")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--throttle-every", type=int, default=5, help="Reject every n-th request with 429.")
+    args = parser.parse_args()
+
+    paths = [os.path.abspath(path) for path in sorted(glob.glob(os.path.join(args.folder, "*.pdf")))]
+
+    client = FakeDocumentIntelligenceClient(sample_fields, latency=args.latency)
+    start = time.perf_counter()
+    for path in paths:
+        analyze_custom_documents("fake-custom-model", path, client=client)
+    serial = time.perf_counter() - start
+
+    client = FakeDocumentIntelligenceClient(sample_fields, latency=args.latency, throttle_every=args.throttle_every,
+                                            retry_after=args.latency / 5)
+    start = time.perf_counter()
+    results = list(analyze_documents_batch("fake-custom-model", paths, max_concurrency=args.concurrency,
+                                           client=client))
+    batch = time.perf_counter() - start
+    failed = sum(result["error"] is not None for result in results)
+
+    print(f"{len(paths)} documents, {args.latency}s simulated latency")
+    print(f"serial: {serial:.2f}s ({len(paths) / serial:.1f} docs/s)")
+    print(f"batch:  {batch:.2f}s ({len(paths) / batch:.1f} docs/s), concurrency {args.concurrency}, "
+          f"{client.throttled} throttled requests retried, {failed} failed")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Encoder backend benchmark and parity check: PyTorch against ONNX Runtime (fp32 and int8).
+
+For the MiniLM embedding model and the BERT similarity model, encodes the same synthetic policy
+texts with every backend at each thread count and reports texts/sec, plus the cosine similarity of
+each ONNX embedding to its PyTorch counterpart. Exits with status 1 if any ONNX embedding drifts
+below `--min-cosine`, so it can gate switching `encoder.backend` to onnx.
+
+Usage:
+    python benchmarks/bench_encoders.py [--models minilm,bert] [--texts 512] [--threads 1,4]
+        [--min-cosine 0.98] [--output benchmarks/results/encoders.json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from run_benchmarks import generate_corpus
+
+BATCH_SIZE = 64
+
+def bert_torch(threads):
+    """
+    Mean-pooled BERT embeddings with PyTorch, as `compute_similarity` computes them.
+    """
+    import torch
+    from retrieve_chunks_and_compare import load_bert
+
+    torch.set_num_threads(threads)
+    tokenizer, model = load_bert()
+
+    def encode(texts):
+        vectors = []
+        for start in range(0, len(texts), BATCH_SIZE):
+            inputs = tokenizer(texts[start:start + BATCH_SIZE], return_tensors="pt", padding=True,
+                               truncation=True, max_length=512)
+            with torch.inference_mode():
+                hidden = model(**inputs).last_hidden_state
+            mask = inputs["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+            vectors.append(((hidden * mask).sum(dim=1) / mask.sum(dim=1)).numpy())
+        embeddings = np.concatenate(vectors)
+        return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return encode
+
+def bert_onnx(threads, quantize):
+    from chunking.onnx_encoder import OnnxEncoder
+    from retrieve_chunks_and_compare import bert_model_name
+
+    encoder = OnnxEncoder(bert_model_name, quantize=quantize, intra_op_threads=threads)
+    return lambda texts: np.concatenate([encoder.embed(texts[start:start + BATCH_SIZE], max_length=512, normalize=True)
+                                         for start in range(0, len(texts), BATCH_SIZE)])
+
+def minilm(threads, backend, quantize=False):
+    from chunking.embedding_engine import EmbeddingEngine
+    from chunking.onnx_encoder import configure_encoder
+
+    configure_encoder(quantize=quantize, intra_op_threads=threads)
+    engine = EmbeddingEngine(batch_size=BATCH_SIZE, num_threads=threads, backend=backend)
+    if backend == "torch":
+        import torch
+
+        torch.set_num_threads(threads)
+    return engine.embed
+
+def encoder(model, variant, threads):
+    if model == "minilm":
+        if variant == "torch":
+            return minilm(threads, "torch")
+        return minilm(threads, "onnx", quantize=variant == "onnx-int8")
+    if variant == "torch":
+        return bert_torch(threads)
+    return bert_onnx(threads, quantize=variant == "onnx-int8")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--models", default="minilm,bert")
+    parser.add_argument("--texts", type=int, default=512, help="Number of policy texts to encode.")
+    parser.add_argument("--threads", default=f"1,{os.cpu_count()}", help="Comma-separated thread counts.")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--min-cosine", type=float, default=0.98,
+                        help="Fail if an ONNX embedding's cosine similarity to PyTorch's is below this.")
+    parser.add_argument("--output", help="Write the results as JSON.")
+    args = parser.parse_args()
+
+    texts = [chunk["chunk"] for chunk in generate_corpus(args.texts)["chunks"]]
+    results = []
+    failed = False
+    for model in args.models.split(","):
+        reference = None
+        for variant in ("torch", "onnx-fp32", "onnx-int8"):
+            for threads in (int(threads) for threads in args.threads.split(",")):
+                encode = encoder(model, variant, threads)
+                embeddings = encode(texts)  # Warm up: exports the ONNX model on first use
+                timings = []
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    encode(texts)
+                    timings.append(time.perf_counter() - start)
+                seconds = sorted(timings)[len(timings) // 2]
+                result = {"model": model, "variant": variant, "threads": threads,
+                          "texts_per_second": len(texts) / seconds}
+                if variant == "torch":
+                    reference = embeddings
+                else:
+                    normalized = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+                    cosine = np.sum(normalized * reference / np.linalg.norm(reference, axis=1, keepdims=True), axis=1)
+                    result.update(mean_cosine=float(cosine.mean()), min_cosine=float(cosine.min()))
+                    failed |= result["min_cosine"] < args.min_cosine
+                results.append(result)
+                drift = f"  cosine mean {result['mean_cosine']:.4f} min {result['min_cosine']:.4f}" \
+                    if "min_cosine" in result else ""
+                print(f"{model:<7} {variant:<10} {threads:>3} threads  {result['texts_per_second']:>9.1f} texts/s{drift}")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if failed:
+        print(f"ONNX embeddings drift below cosine {args.min_cosine} from PyTorch.")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
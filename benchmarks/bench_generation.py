@@ -0,0 +1,104 @@
+"""
+CPU generation benchmark for the LLaMA comparison model.
+
+Each inference mode runs in a fresh interpreter so resident memory is measured in isolation.
+Reports load time, time-to-first-token, tokens/sec and resident memory per mode, with and
+without the cached instruction prefix.
+
+Usage:
+    python benchmarks/bench_generation.py [--modes fp32 bf16 int8] [--max-new-tokens 64]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+
+SAMPLE_PROMPT = (
+    "Request: Compare the insurance policies for premium and deductible changes.\n\n"
+    "Changed fields:\n- insured_premium: $1,729.59 -> $1,850.00\n- insured_deductible: $573.97 -> $500.00\n\n"
+    "Differences:\n"
+)
+
+def current_rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+def run_mode(mode, max_new_tokens, model_path):
+    """
+    Benchmark one inference mode in the current process and return its metrics.
+    """
+    sys.path.insert(0, SRC_DIR)
+    from comparison.generation import configure_generation, llama_key, stream_generate
+    from model_registry import registry
+    from retrieve_chunks_and_compare import COMPARISON_INSTRUCTIONS
+
+    configure_generation(model_path=model_path, max_new_tokens=max_new_tokens)
+    start = time.perf_counter()
+    tokenizer, _ = registry.get(llama_key(mode))
+    result = {"mode": mode, "load_seconds": time.perf_counter() - start}
+
+    for label, prefix, prompt in (
+        ("no_prefix_cache", "", COMPARISON_INSTRUCTIONS + SAMPLE_PROMPT),
+        ("prefix_cache_cold", COMPARISON_INSTRUCTIONS, SAMPLE_PROMPT),
+        ("prefix_cache_warm", COMPARISON_INSTRUCTIONS, SAMPLE_PROMPT),
+    ):
+        start = time.perf_counter()
+        first_token, text = None, ""
+        for piece in stream_generate(prompt, prefix=prefix, mode=mode):
+            if first_token is None and piece:
+                first_token = time.perf_counter() - start
+            text += piece
+        elapsed = time.perf_counter() - start
+        tokens = len(tokenizer(text, add_special_tokens=False)["input_ids"])
+        result[label] = {
+            "time_to_first_token_seconds": first_token,
+            "tokens": tokens,
+            "tokens_per_second": tokens / elapsed if elapsed > 0 else 0.0,
+        }
+
+    result["rss_mb"] = current_rss_mb()
+    result["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", default=["fp32", "bf16", "int8"])
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--model-path", default=None, help="Local LLaMA checkpoint directory.")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_mode(args.child, args.max_new_tokens, args.model_path)))
+        return
+
+    results = []
+    for mode in args.modes:
+        command = [sys.executable, __file__, "--child", mode, "--max-new-tokens", str(args.max_new_tokens)]
+        if args.model_path:
+            command += ["--model-path", args.model_path]
+        proc = subprocess.run(command, capture_output=True, text=True)
+        if proc.returncode != 0:
+            error = proc.stderr.strip().splitlines()[-1] if proc.stderr else f"exit code {proc.returncode}"
+            results.append({"mode": mode, "error": error})
+            continue
+        results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    print(f"{'mode':<6} {'load (s)':>9} {'TTFT cold (s)':>14} {'TTFT warm (s)':>14} {'tok/s':>7} {'RSS (MB)':>9}")
+    for result in results:
+        if "error" in result:
+            print(f"{result['mode']:<6} error: {result['error']}")
+            continue
+        cold, warm = result["no_prefix_cache"], result["prefix_cache_warm"]
+        print(f"{result['mode']:<6} {result['load_seconds']:>9.1f} {cold['time_to_first_token_seconds'] or 0:>14.2f} "
+              f"{warm['time_to_first_token_seconds'] or 0:>14.2f} {warm['tokens_per_second']:>7.2f} "
+              f"{result['rss_mb']:>9.0f}")
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
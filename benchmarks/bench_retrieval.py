@@ -0,0 +1,92 @@
+"""
+Retrieval benchmark comparing the vector search backends.
+
+Builds a synthetic clustered corpus and reports p50/p99 query latency and recall@k against exact
+search for the NumPy backend, the HNSW backend (if `hnswlib` is installed) and the Azure backend
+pointed at the local search stand-in.
+
+Usage:
+    python benchmarks/bench_retrieval.py [--chunks 50000] [--queries 200] [--top-k 5]
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+from fakes import FakeSearchService
+from indexing.index_to_azure import index_documents
+from retrieval.backends import AzureSearchBackend, HnswSearchBackend, NumpySearchBackend
+
+def synthetic_corpus(count, dim=384, clusters=50, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    embeddings = centers[rng.integers(0, clusters, count)] + 0.3 * rng.normal(size=(count, dim)).astype(np.float32)
+    records = [{
+        "id": f"doc_{i // 4}_chunk_{i % 4}",
+        "document_index": str(i // 4),
+        "chunk_id": str(i % 4),
+        "chunk": f"chunk {i}",
+    } for i in range(count)]
+    return embeddings.astype(np.float32), records
+
+def run(backend, queries, top_k):
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append([result["id"] for result in backend.search(query, top_k=top_k)])
+        latencies.append(time.perf_counter() - start)
+    return np.asarray(latencies) * 1000, results
+
+def recall(results, truth):
+    return float(np.mean([len(set(r) & set(t)) / len(t) for r, t in zip(results, truth) if t]))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--azure-chunks", type=int, default=5000, help="Corpus size loaded into the HTTP stand-in.")
+    args = parser.parse_args()
+
+    embeddings, records = synthetic_corpus(args.chunks)
+    rng = np.random.default_rng(1)
+    queries = embeddings[rng.integers(0, args.chunks, args.queries)] + 0.1 * rng.normal(size=(args.queries, 384))
+
+    exact = NumpySearchBackend(embeddings, records)
+    backends = {"numpy": exact}
+    try:
+        start = time.perf_counter()
+        backends["hnsw"] = HnswSearchBackend(embeddings, records)
+        print(f"HNSW build: {time.perf_counter() - start:.1f}s")
+    except ImportError:
+        print("hnswlib not installed, skipping the HNSW backend")
+
+    _, truth = run(exact, queries, args.top_k)
+    print(f"{'backend':<8} {'chunks':>7} {'p50 (ms)':>9} {'p99 (ms)':>9} {'recall@k':>9}")
+    for name, backend in backends.items():
+        latencies, results = run(backend, queries, args.top_k)
+        print(f"{name:<8} {args.chunks:>7} {np.percentile(latencies, 50):>9.2f} "
+              f"{np.percentile(latencies, 99):>9.2f} {recall(results, truth):>9.3f}")
+
+    # The HTTP stand-in searches in Python, so it gets a smaller corpus
+    service = FakeSearchService().start()
+    try:
+        small = min(args.azure_chunks, args.chunks)
+        documents = [{
+            "id": record["id"], "document_index": record["document_index"], "chunk_id": record["chunk_id"],
+            "chunk_text": record["chunk"], "text_vector": embeddings[i].tolist(),
+        } for i, record in enumerate(records[:small])]
+        index_documents(service.endpoint, "fake-key", "bench-index", documents, base_delay=0.01)
+        _, small_truth = run(NumpySearchBackend(embeddings[:small], records[:small]), queries, args.top_k)
+        latencies, results = run(AzureSearchBackend(service.endpoint, "fake-key", "bench-index"), queries, args.top_k)
+        print(f"{'azure*':<8} {small:>7} {np.percentile(latencies, 50):>9.2f} "
+              f"{np.percentile(latencies, 99):>9.2f} {recall(results, small_truth):>9.3f}")
+        print("* local HTTP stand-in; real service latency includes the network round-trip")
+    finally:
+        service.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Startup benchmark for the project entry points.
+
+Each entry point is imported in a fresh interpreter, then a cheap first request is issued.
+Reports import time, time-to-first-request and peak RSS per entry point.
+
+Usage:
+    python benchmarks/bench_startup.py [--repeat 3] [--skip-first-request]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+
+# Entry point module -> code issuing a representative first request
+ENTRY_POINTS = {
+    "retrieve_chunks_and_compare": "module.compute_similarity('premium 1200', 'premium 1300')",
+    "main_pipeline": "module.load_config_and_env()",
+    "frontend_app": "module.demo.config",
+}
+
+CHILD_TEMPLATE = """
+import importlib, json, resource, sys, time
+sys.path.insert(0, {src!r})
+start = time.perf_counter()
+module = importlib.import_module({module!r})
+imported = time.perf_counter()
+first_request = None
+if {run_first_request!r}:
+    {first_request}
+    first_request = time.perf_counter() - start
+print(json.dumps({{
+    "import_seconds": imported - start,
+    "first_request_seconds": first_request,
+    "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}}))
+"""
+
+def measure(module, first_request, run_first_request):
+    """
+    Run one entry point in a fresh interpreter and return its timings.
+    """
+    code = CHILD_TEMPLATE.format(
+        src=SRC_DIR, module=module, first_request=first_request, run_first_request=run_first_request
+    )
+    proc = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=os.path.dirname(SRC_DIR))
+    if proc.returncode != 0:
+        return {"error": proc.stderr.strip().splitlines()[-1] if proc.stderr else f"exit code {proc.returncode}"}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per entry point; the best run is reported.")
+    parser.add_argument("--skip-first-request", action="store_true", help="Only measure the import.")
+    args = parser.parse_args()
+
+    results = {}
+    for module, first_request in ENTRY_POINTS.items():
+        runs = [measure(module, first_request, not args.skip_first_request) for _ in range(args.repeat)]
+        ok = [run for run in runs if "error" not in run]
+        results[module] = min(ok, key=lambda run: run["import_seconds"]) if ok else runs[-1]
+
+    print(f"{'entry point':<30} {'import (s)':>10} {'first req (s)':>14} {'peak RSS (MB)':>14}")
+    for module, result in results.items():
+        if "error" in result:
+            print(f"{module:<30} error: {result['error']}")
+            continue
+        first = result["first_request_seconds"]
+        print(f"{module:<30} {result['import_seconds']:>10.2f} "
+              f"{first if first is not None else float('nan'):>14.2f} {result['peak_rss_mb']:>14.0f}")
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
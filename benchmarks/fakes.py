@@ -0,0 +1,209 @@
+"""
+Offline stand-ins for the Azure services used by the pipeline, for benchmarks and local runs.
+"""
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+import numpy as np
+from azure.core.exceptions import HttpResponseError
+
+class _FakeResponse:
+    def __init__(self, status_code, reason, headers=None):
+        self.status_code = status_code
+        self.reason = reason
+        self.headers = headers or {}
+
+    def text(self, encoding=None):
+        return ""
+
+class _FakePoller:
+    def __init__(self, result_fn, latency):
+        self._result_fn = result_fn
+        self._latency = latency
+
+    def result(self):
+        time.sleep(self._latency)
+        return self._result_fn()
+
+def _field(value, confidence=0.98):
+    return SimpleNamespace(value_string=str(value), content=str(value), confidence=confidence)
+
+class FakeDocumentIntelligenceClient:
+    """
+    In-process fake of DocumentIntelligenceClient.
+
+    `begin_analyze_document` returns a poller whose `result()` sleeps for `latency` seconds and
+    returns an AnalyzeResult-like object with the fields given by `fields_for(source)`. Every
+    `throttle_every`-th request is rejected with HTTP 429 and a Retry-After header.
+
+    Args:
+        fields_for (callable): Maps the document source (path, URL or file name) to a dict of field values.
+        latency (float): Seconds each analysis takes.
+        throttle_every (int): Reject every n-th request with 429; never if 0.
+        retry_after (float): Retry-After value sent with 429 responses.
+        max_concurrency (int): Requests above this many in flight are also rejected with 429.
+    """
+
+    def __init__(self, fields_for, latency=0.5, throttle_every=0, retry_after=0.1, max_concurrency=None,
+                 model_id="fake-custom-model"):
+        self.fields_for = fields_for
+        self.latency = latency
+        self.throttle_every = throttle_every
+        self.retry_after = retry_after
+        self.max_concurrency = max_concurrency
+        self.model_id = model_id
+        self.requests = 0
+        self.throttled = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def _throttle(self):
+        self.throttled += 1
+        response = _FakeResponse(429, "Too Many Requests", {"Retry-After": str(self.retry_after)})
+        raise HttpResponseError(message="Rate limit exceeded", response=response)
+
+    def begin_analyze_document(self, model_id=None, analyze_request=None, content_type=None, **kwargs):
+        source = getattr(analyze_request, "url_source", None) or getattr(analyze_request, "name", None)
+        with self._lock:
+            self.requests += 1
+            if self.throttle_every and self.requests % self.throttle_every == 0:
+                self._throttle()
+            if self.max_concurrency and self._in_flight >= self.max_concurrency:
+                self._throttle()
+            self._in_flight += 1
+
+        def result():
+            try:
+                fields = {name: _field(value) for name, value in self.fields_for(source).items()}
+                document = SimpleNamespace(doc_type=f"{self.model_id}:insurance", confidence=0.99, fields=fields)
+                return SimpleNamespace(model_id=model_id or self.model_id, documents=[document])
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+
+        return _FakePoller(result, self.latency)
+
+class FakeSearchService:
+    """
+    Local HTTP stand-in for an Azure Cognitive Search service.
+
+    Supports the document batch endpoint (upload, merge, mergeOrUpload and delete actions) and
+    exact vector search with `eq` filters. A fraction of keys can be failed with 503 to exercise
+    partial (207) responses. Start it with
+    `start()` and point a SearchClient at `endpoint`.
+
+    Args:
+        failure_rate (float): Probability that an individual key fails with 503.
+        latency (float): Seconds added to every request.
+        seed (int): Seed for the failure injection.
+    """
+
+    def __init__(self, failure_rate=0.0, latency=0.0, seed=0):
+        self.failure_rate = failure_rate
+        self.latency = latency
+        self.indexes = {}
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def endpoint(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                match = re.match(r"/indexes\('?([^')]+)'?\)/docs/([\w.]+)", self.path)
+                if match is None:
+                    return self._reply(404, {"error": {"message": f"Unknown path {self.path}"}})
+                time.sleep(service.latency)
+                status, payload = service.handle(match.group(1), match.group(2), body)
+                self._reply(status, payload)
+
+            def _reply(self, status, payload):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; odata.metadata=none")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def handle(self, index_name, operation, body):
+        """
+        Handle one request and return (HTTP status, JSON payload).
+        """
+        with self._lock:
+            self.requests += 1
+            index = self.indexes.setdefault(index_name, {})
+            if operation == "search.index":
+                return self._index(index, body)
+            if operation == "search.post.search":
+                return self._search(index, body)
+            return 404, {"error": {"message": f"Unsupported operation {operation}"}}
+
+    def _index(self, index, body):
+        results = []
+        for action in body.get("value", []):
+            action = dict(action)
+            kind = action.pop("@search.action", "upload")
+            key = str(action.get("id"))
+            if self.failure_rate and self._random.random() < self.failure_rate:
+                results.append({"key": key, "status": False, "errorMessage": "Service unavailable", "statusCode": 503})
+                continue
+            if kind == "delete":
+                index.pop(key, None)
+            elif kind in ("merge", "mergeOrUpload") and key in index:
+                index[key].update(action)
+            elif kind == "merge":
+                results.append({"key": key, "status": False, "errorMessage": "Not found", "statusCode": 404})
+                continue
+            else:
+                index[key] = action
+            results.append({"key": key, "status": True, "errorMessage": None, "statusCode": 200})
+        status = 200 if all(result["status"] for result in results) else 207
+        return status, {"value": results}
+
+    def _search(self, index, body):
+        documents = list(index.values())
+        filter_expression = body.get("filter")
+        if filter_expression:
+            field, value = re.match(r"(\w+) eq '((?:[^']|'')*)'", filter_expression).groups()
+            value = value.replace("''", "'")
+            documents = [doc for doc in documents if str(doc.get(field)) == value]
+
+        top = body.get("top") or 50
+        for query in body.get("vectorQueries") or []:
+            if not documents:
+                break
+            vector = np.asarray(query["vector"], dtype=np.float32)
+            matrix = np.asarray([doc[query["fields"]] for doc in documents], dtype=np.float32)
+            scores = matrix @ vector / np.maximum(np.linalg.norm(matrix, axis=1) * np.linalg.norm(vector), 1e-12)
+            best = np.argsort(-scores)[:query.get("k", top)]
+            documents = [{**documents[i], "@search.score": float(scores[i])} for i in best]
+
+        selected = body.get("select")
+        fields = selected.split(",") if selected else None
+        value = [{key: doc[key] for key in doc if fields is None or key in fields or key.startswith("@")}
+                 for doc in documents[:top]]
+        return 200, {"value": value}
@@ -0,0 +1,74 @@
+"""
+Load test for the Gradio comparison service.
+
+Starts N simulated users at once, each submitting a pair of documents to a running
+`frontend_app.py`, and reports throughput, time to first update and end-to-end latency.
+
+Usage:
+    python src/frontend_app.py &
+    python benchmarks/load_test_frontend.py --users 8 [--url http://127.0.0.1:7860/] \
+        [--doc1 data/insurance_docs/a.pdf --doc2 data/insurance_docs/b.pdf]
+"""
+import argparse
+import glob
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+def run_user(url, doc1, doc2):
+    from gradio_client import Client, handle_file
+
+    client = Client(url, verbose=False)
+    start = time.perf_counter()
+    first_update = None
+    job = client.submit(handle_file(doc1), handle_file(doc2), api_name="/process_documents")
+    for _ in job:
+        if first_update is None:
+            first_update = time.perf_counter() - start
+    text, report_path = job.result()
+    latency = time.perf_counter() - start
+    return {"first_update": first_update if first_update is not None else latency, "latency": latency,
+            "ok": report_path is not None}
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else float("nan")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:7860/")
+    parser.add_argument("--users", type=int, default=8, help="Number of simultaneous users.")
+    parser.add_argument("--doc1")
+    parser.add_argument("--doc2")
+    args = parser.parse_args()
+
+    if args.doc1 is None or args.doc2 is None:
+        pdfs = sorted(glob.glob("data/insurance_docs/*.pdf"))
+        if len(pdfs) < 2:
+            parser.error("Pass --doc1 and --doc2, or generate sample documents in data/insurance_docs.")
+        args.doc1, args.doc2 = args.doc1 or pdfs[0], args.doc2 or pdfs[1]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.users) as executor:
+        futures = [executor.submit(run_user, args.url, args.doc1, args.doc2) for _ in range(args.users)]
+        results, errors = [], []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as error:
+                errors.append(error)
+    elapsed = time.perf_counter() - start
+
+    latencies = [result["latency"] for result in results]
+    first_updates = [result["first_update"] for result in results]
+    failed = len(errors) + sum(not result["ok"] for result in results)
+    print(f"{args.users} users, {len(results) - failed} completed, {failed} failed in {elapsed:.1f}s "
+          f"({len(results) / elapsed:.2f} comparisons/s)")
+    print(f"first update: p50 {percentile(first_updates, 50):.2f}s, p95 {percentile(first_updates, 95):.2f}s")
+    print(f"latency:      p50 {percentile(latencies, 50):.2f}s, p95 {percentile(latencies, 95):.2f}s, "
+          f"max {max(latencies, default=float('nan')):.2f}s")
+    for error in errors[:5]:
+        print(f"error: {error}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+"""
+Benchmark harness covering every pipeline stage, with Azure services replaced by local fakes.
+
+Generates synthetic policies with `data/doc_generation_script.py` at each corpus size, times each
+stage (character and token splitting, embedding from text, from token ids and with ONNX Runtime, Chroma writes, indexing, retrieval, field comparison, BERT similarity
+and generation) and writes the results as JSON. Stages whose dependencies are not installed are
+recorded as skipped. With `--baseline`, medians are compared against an earlier results file and
+the run fails if any stage got slower than the threshold.
+
+Usage:
+    python benchmarks/run_benchmarks.py [--sizes 100,1000] [--repeat 3] [--stages embed,index]
+        [--generation] [--output benchmarks/results/latest.json]
+        [--baseline benchmarks/results/previous.json --threshold 0.2]
+"""
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+sys.path.insert(0, os.path.join(ROOT, "data"))
+
+from fakes import FakeSearchService
+
+BENCHMARKS = []
+
+def benchmark(name, requires=()):
+    """
+    Register a stage benchmark.
+
+    The decorated function receives the corpus and a scratch directory and returns a zero-argument
+    callable to time and the number of items it processes per call.
+    """
+    def register(setup):
+        BENCHMARKS.append((name, requires, setup))
+        return setup
+    return register
+
+def generate_corpus(size, seed=0, dim=384):
+    """
+    Generate `size` policies as analyzed documents and chunks: the prior policies of `size // 2`
+    year-over-year pairs, then their renewals.
+    """
+    from doc_generation_script import extraction_fields, generate_pair
+
+    base_year = datetime.now().year - 1
+    pairs = [generate_pair(seed, i, base_year) for i in range(size // 2)]
+    policies = [prior for prior, _, _ in pairs] + [renewal for _, renewal, _ in pairs]
+    documents = []
+    for i, policy in enumerate(policies):
+        values = extraction_fields(policy)
+        documents.append({
+            "document_index": 1,
+            "source_id": f"policy_{i}_1",
+            "doc_type": "insurance-policy",
+            "confidence": 0.99,
+            "model_id": "benchmark-model",
+            "fields": {name: {"value": value, "confidence": 0.98} for name, value in values.items()},
+        })
+
+    # One chunk per document, as `flatten_fields` renders these short field lists
+    rng = np.random.default_rng(seed)
+    embeddings = rng.normal(size=(size, dim)).astype(np.float32)
+    chunks = [{
+        "document_index": doc["source_id"],
+        "chunk_id": 0,
+        "chunk": "\n".join(f"{name.replace('_', ' ').title()}: {field['value']}" for name, field in doc["fields"].items()),
+        "embedding": embedding.tolist(),
+    } for doc, embedding in zip(documents, embeddings)]
+    queries = rng.normal(size=(min(size, 100), dim)).astype(np.float32)
+    return {"documents": documents, "chunks": chunks, "embeddings": embeddings, "queries": queries}
+
+@benchmark("split", requires=("langchain",))
+def bench_split(corpus, scratch):
+    from chunking.chunk_and_embed import split_documents
+
+    return lambda: split_documents(corpus["documents"]), len(corpus["documents"])
+
+@benchmark("split_tokens", requires=("transformers",))
+def bench_split_tokens(corpus, scratch):
+    from chunking.chunk_and_embed import flatten_fields
+    from chunking.token_chunker import TokenChunker
+
+    chunker = TokenChunker()
+    chunker.split(["warm up"])
+    texts = [flatten_fields(doc) for doc in corpus["documents"]]
+    return lambda: chunker.split(texts), len(texts)
+
+@benchmark("embed", requires=("sentence_transformers", "torch"))
+def bench_embed(corpus, scratch):
+    from chunking.embedding_engine import EmbeddingEngine
+
+    engine = EmbeddingEngine()
+    engine.embed(["warm up"])
+    texts = [chunk["chunk"] for chunk in corpus["chunks"]]
+    return lambda: engine.embed(texts), len(texts)
+
+@benchmark("embed_onnx", requires=("onnxruntime", "transformers", "torch"))
+def bench_embed_onnx(corpus, scratch):
+    from chunking.embedding_engine import EmbeddingEngine
+
+    engine = EmbeddingEngine(backend="onnx")
+    engine.embed(["warm up"])
+    texts = [chunk["chunk"] for chunk in corpus["chunks"]]
+    return lambda: engine.embed(texts), len(texts)
+
+@benchmark("embed_token_ids", requires=("sentence_transformers", "torch"))
+def bench_embed_token_ids(corpus, scratch):
+    from chunking.embedding_engine import EmbeddingEngine
+    from chunking.token_chunker import TokenChunker
+
+    engine = EmbeddingEngine()
+    engine.embed(["warm up"])
+    token_ids = [ids for chunks in TokenChunker().split([chunk["chunk"] for chunk in corpus["chunks"]])
+                 for _, ids in chunks]
+    return lambda: engine.embed_token_ids(token_ids), len(token_ids)
+
+@benchmark("embed_cached", requires=("sentence_transformers", "torch"))
+def bench_embed_cached(corpus, scratch):
+    from chunking.embedding_cache import EmbeddingCache
+    from chunking.embedding_engine import EmbeddingEngine
+
+    engine = EmbeddingEngine(cache=EmbeddingCache(os.path.join(scratch, "embedding_cache")))
+    texts = [chunk["chunk"] for chunk in corpus["chunks"]]
+    engine.embed(texts)
+    return lambda: engine.embed(texts), len(texts)
+
+@benchmark("chroma_upsert", requires=("chromadb",))
+def bench_chroma_upsert(corpus, scratch):
+    from chunking.chroma_store import get_collection, upsert_chunks
+
+    collection = get_collection("benchmark", os.path.join(scratch, "chroma_db"))
+    return lambda: upsert_chunks(collection, corpus["chunks"]), len(corpus["chunks"])
+
+@benchmark("index", requires=("azure.search.documents",))
+def bench_index(corpus, scratch):
+    from indexing.index_to_azure import chunks_to_documents, index_documents
+
+    service = FakeSearchService().start()
+    corpus["services"].append(service)
+    documents = chunks_to_documents(corpus["chunks"])
+    return lambda: index_documents(service.endpoint, "fake-key", "benchmark-index", documents), len(documents)
+
+@benchmark("retrieve_numpy")
+def bench_retrieve_numpy(corpus, scratch):
+    from retrieval.backends import NumpySearchBackend
+
+    backend = NumpySearchBackend.from_chunks(corpus["chunks"])
+    return lambda: [backend.search(query, top_k=5) for query in corpus["queries"]], len(corpus["queries"])
+
+@benchmark("retrieve_azure", requires=("azure.search.documents",))
+def bench_retrieve_azure(corpus, scratch):
+    from indexing.index_to_azure import chunks_to_documents, index_documents
+    from retrieval.backends import AzureSearchBackend
+
+    service = FakeSearchService().start()
+    corpus["services"].append(service)
+    index_documents(service.endpoint, "fake-key", "benchmark-index", chunks_to_documents(corpus["chunks"]))
+    backend = AzureSearchBackend(service.endpoint, "fake-key", "benchmark-index")
+    return lambda: [backend.search(query, top_k=5) for query in corpus["queries"]], len(corpus["queries"])
+
+@benchmark("field_compare")
+def bench_field_compare(corpus, scratch):
+    from comparison.field_comparator import compare_field_pairs
+
+    half = len(corpus["documents"]) // 2
+    pairs = [(a["fields"], b["fields"]) for a, b in zip(corpus["documents"][:half], corpus["documents"][half:])]
+    return lambda: compare_field_pairs(pairs), len(pairs)
+
+@benchmark("similarity", requires=("transformers", "torch"))
+def bench_similarity(corpus, scratch):
+    from model_registry import registry
+    from retrieve_chunks_and_compare import compute_similarity
+
+    registry.warmup("bert")
+    texts = [chunk["chunk"] for chunk in corpus["chunks"][:100]]
+    pairs = list(zip(texts[::2], texts[1::2]))
+    return lambda: [compute_similarity(a, b) for a, b in pairs], len(pairs)
+
+@benchmark("generation", requires=("transformers", "torch"))
+def bench_generation(corpus, scratch):
+    from retrieve_chunks_and_compare import generate_text
+
+    prompt = f"Changed fields:\n- premium: {corpus['documents'][0]['fields']['premium']['value']} -> $1,234.00\n\nDifferences:\n"
+    generate_text(prompt, max_new_tokens=4)
+    return lambda: generate_text(prompt, max_new_tokens=32), 32
+
+def run_benchmark(name, requires, setup, corpus, repeat):
+    missing = [module for module in requires if importlib.util.find_spec(module.split(".")[0]) is None
+               or importlib.util.find_spec(module) is None]
+    if missing:
+        return {"skipped": f"missing {', '.join(missing)}"}
+    scratch = tempfile.mkdtemp(prefix=f"bench_{name}_")
+    try:
+        run, items = setup(corpus, scratch)
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - start)
+    except Exception as error:
+        # A crash is not a missing dependency: it is reported and fails a run checked against a baseline
+        return {"error": f"{type(error).__name__}: {error}"}
+    finally:
+        for service in corpus["services"]:
+            service.stop()
+        corpus["services"].clear()
+        shutil.rmtree(scratch, ignore_errors=True)
+    median = statistics.median(timings)
+    return {
+        "items": items,
+        "median_seconds": median,
+        "min_seconds": min(timings),
+        "max_seconds": max(timings),
+        "items_per_second": items / median if median > 0 else None,
+        "runs": timings,
+    }
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit or None,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+def compare(results, baseline, threshold):
+    """
+    Return (stage, size, baseline median, new median) for every stage that slowed down by more than `threshold`.
+    """
+    regressions = []
+    for size, stages in results["results"].items():
+        for name, result in stages.items():
+            previous = baseline.get("results", {}).get(size, {}).get(name)
+            if not previous or "median_seconds" not in previous or "median_seconds" not in result:
+                continue
+            if result["median_seconds"] > previous["median_seconds"] * (1 + threshold):
+                regressions.append((name, size, previous["median_seconds"], result["median_seconds"]))
+    return regressions
+
+def failures(results, baseline):
+    """
+    Return (stage, size, error) for every stage that failed but has a baseline median.
+    """
+    failed = []
+    for size, stages in results["results"].items():
+        for name, result in stages.items():
+            previous = baseline.get("results", {}).get(size, {}).get(name)
+            if "error" in result and previous and "median_seconds" in previous:
+                failed.append((name, size, result["error"]))
+    return failed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100,1000", help="Comma-separated corpus sizes.")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--stages", help="Comma-separated stages to run (default: all).")
+    parser.add_argument("--generation", action="store_true", help="Include LLaMA generation (slow).")
+    parser.add_argument("--output", default=os.path.join(ROOT, "benchmarks", "results",
+                                                         datetime.now().strftime("%Y%m%d-%H%M%S") + ".json"))
+    parser.add_argument("--baseline", help="Earlier results file to check for regressions.")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed slowdown before failing, e.g. 0.2 = 20%%.")
+    args = parser.parse_args()
+
+    selected = set(args.stages.split(",")) if args.stages else None
+    results = {"environment": environment(), "results": {}}
+    for size in (int(size) for size in args.sizes.split(",")):
+        corpus = generate_corpus(size)
+        corpus["services"] = []
+        results["results"][str(size)] = {}
+        for name, requires, setup in BENCHMARKS:
+            if (selected and name not in selected) or (name == "generation" and not args.generation):
+                continue
+            result = run_benchmark(name, requires, setup, corpus, args.repeat)
+            results["results"][str(size)][name] = result
+            if "skipped" in result:
+                print(f"{name:<15} {size:>7}  skipped ({result['skipped']})")
+            elif "error" in result:
+                print(f"{name:<15} {size:>7}  FAILED ({result['error']})")
+            else:
+                print(f"{name:<15} {size:>7}  {result['median_seconds'] * 1000:>10.1f} ms  "
+                      f"{result['items_per_second']:>10.0f} items/s")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        failed = failures(results, baseline)
+        for name, size, before, after in regressions:
+            print(f"REGRESSION {name} at {size}: {before * 1000:.1f} ms -> {after * 1000:.1f} ms")
+        for name, size, error in failed:
+            print(f"FAILED {name} at {size}: {error}")
+        if regressions or failed:
+            sys.exit(1)
+        print("No regressions.")
+
+if __name__ == "__main__":
+    main()
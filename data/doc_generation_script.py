@@ -1,15 +1,24 @@
 from faker import Faker
-from reportlab.lib.pagesizes import LETTER
-from reportlab.lib import colors
-from reportlab.pdfgen import canvas
-from reportlab.platypus import Table, TableStyle
+import argparse
+import json
 import random
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
 
 fake = Faker()
 
+# Settings of the corpus in an output folder, checked before resuming it
+CORPUS_MANIFEST = "corpus.json"
+
 def generate_insurance_pdf(file_path, insured_name, carrier_name, address, premium, deductible, accidents, policy_year):
+    # Only needed for rendering, so policies can be generated without reportlab
+    from reportlab.lib.pagesizes import LETTER
+    from reportlab.lib import colors
+    from reportlab.pdfgen import canvas
+    from reportlab.platypus import Table, TableStyle
+
     c = canvas.Canvas(file_path, pagesize=LETTER)
     width, height = LETTER
 
@@ -50,26 +59,228 @@ def generate_insurance_pdf(file_path, insured_name, carrier_name, address, premi
 
     c.save()
 
-def generate_sample_documents(output_dir="data/insurance_docs", count=10):
-    os.makedirs(output_dir, exist_ok=True)
-    current_year = datetime.now().year
-    last_year = current_year - 1
+def random_policy(policy_year, rng=random, faker=fake):
+    """
+    Draw the values of one insurance policy.
+    """
+    return {
+        "insured_name": faker.name(),
+        "carrier_name": faker.company(),
+        "address": faker.address().replace("\n", ", "),
+        "premium": round(rng.uniform(600, 2500), 2),
+        "deductible": round(rng.uniform(200, 1000), 2),
+        "accidents": rng.randint(0, 3),
+        "policy_year": policy_year,
+    }
+
+def renew_policy(prior, rng=random, faker=fake):
+    """
+    Derive next year's policy from a prior one with designed changes.
+
+    The premium always moves (mostly up, more after new accidents); the deductible, accident count,
+    carrier and address change with fixed probabilities. The insured name never changes.
+    """
+    renewal = dict(prior, policy_year=prior["policy_year"] + 1)
+    if rng.random() < 0.3:
+        renewal["accidents"] = prior["accidents"] + rng.randint(1, 2)
+    if rng.random() < 0.3:
+        renewal["deductible"] = round(max(100.0, prior["deductible"] * rng.choice([0.5, 0.75, 1.5, 2.0])), 2)
+    if rng.random() < 0.1:
+        renewal["carrier_name"] = faker.company()
+    if rng.random() < 0.05:
+        renewal["address"] = faker.address().replace("\n", ", ")
+    change = rng.gauss(0.05, 0.08) + 0.1 * (renewal["accidents"] - prior["accidents"])
+    renewal["premium"] = round(max(100.0, prior["premium"] * (1 + change)), 2)
+    return renewal
+
+# Policy keys -> the custom extraction model's field names and value formats, so the ground truth
+# reads like the model's output (e.g. "insured_premium": "$1,729.59")
+EXTRACTION_FIELDS = {
+    "insured_name": ("insured_name", str),
+    "carrier_name": ("insured_carrier", str),
+    "address": ("insured_address", str),
+    "premium": ("insured_premium", "${:,.2f}".format),
+    "deductible": ("insured_deductible", "${:,.2f}".format),
+    "accidents": ("no_of_accidents", str),
+    "policy_year": ("insured_year", str),
+}
+
+def extraction_fields(policy):
+    """
+    A policy's fields as the extraction model reports them.
+    """
+    return {name: fmt(policy[key]) for key, (name, fmt) in EXTRACTION_FIELDS.items()}
+
+def policy_changes(prior, renewal):
+    """
+    Ground-truth differences between two policies, keyed by extraction field name, with deltas and
+    percent changes for numeric fields.
+    """
+    changes = {}
+    for key, (name, fmt) in EXTRACTION_FIELDS.items():
+        if prior[key] == renewal[key]:
+            continue
+        change = {"from": fmt(prior[key]), "to": fmt(renewal[key])}
+        if isinstance(prior[key], (int, float)):
+            change["delta"] = round(renewal[key] - prior[key], 2)
+            if prior[key] and key != "policy_year":
+                change["pct_change"] = round((renewal[key] - prior[key]) / abs(prior[key]) * 100, 4)
+        changes[name] = change
+    return changes
+
+_pair_faker = None
+
+def generate_pair(seed, pair_index, base_year):
+    """
+    Generate the prior and renewal policy of one pair. The result depends only on (seed, pair_index, base_year).
+    """
+    global _pair_faker
+    if _pair_faker is None:
+        _pair_faker = Faker()
+    rng = random.Random(f"{seed}-{pair_index}")
+    faker = _pair_faker
+    # Reseeding resets the instance's generator, so one Faker per process stays deterministic
+    faker.seed_instance(rng.getrandbits(64))
+    prior = random_policy(base_year, rng, faker)
+    renewal = renew_policy(prior, rng, faker)
+    return prior, renewal, policy_changes(prior, renewal)
+
+def pair_directory(output_dir, pair_index, shard_size):
+    """
+    Shard directory of `shard_size` pairs holding a pair, or `output_dir` itself if `shard_size` is 0.
 
-    for i in range(count):
-        insured_name = fake.name()
-        carrier_name = fake.company()
-        address = fake.address().replace("\n", ", ")
-        premium = round(random.uniform(600, 2500), 2)
-        deductible = round(random.uniform(200, 1000), 2)
-        accidents = random.randint(0, 3)
+    Depends only on the pair and the corpus's fixed shard size, so growing a corpus keeps earlier pairs in place.
+    """
+    if shard_size:
+        return os.path.join(output_dir, f"shard_{pair_index // shard_size:05d}")
+    return output_dir
+
+def _write_json(path, payload):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(payload, f, indent=2)
+    os.replace(tmp_path, path)
+
+def generate_pairs(output_dir, start, stop, seed, base_year, shard_size, render, overwrite):
+    """
+    Render pairs [start, stop) with their ground-truth JSON. Pairs whose pair JSON exists are skipped.
+
+    Returns:
+        list: The pair records generated or found.
+    """
+    records = []
+    for pair_index in range(start, stop):
+        directory = pair_directory(output_dir, pair_index, shard_size)
+        os.makedirs(directory, exist_ok=True)
+        stem = os.path.join(directory, f"policy_{pair_index:06d}")
+        pair_path = f"{stem}_pair.json"
+        if not overwrite and os.path.exists(pair_path):
+            with open(pair_path) as f:
+                records.append(json.load(f))
+            continue
+
+        prior, renewal, changes = generate_pair(seed, pair_index, base_year)
+        record = {"pair_id": pair_index, "seed": seed, "changes": changes}
+        for role, policy in (("prior", prior), ("renewal", renewal)):
+            json_path = f"{stem}_{role}.json"
+            ground_truth = {"pair_id": pair_index, "role": role, "fields": extraction_fields(policy)}
+            if render:
+                pdf_path = f"{stem}_{role}.pdf"
+                generate_insurance_pdf(pdf_path, **policy)
+                ground_truth["file"] = os.path.basename(pdf_path)
+            _write_json(json_path, ground_truth)
+            # Without PDFs, the pair points at the ground-truth JSON, which batch comparison loads directly
+            record[role] = os.path.relpath(pdf_path if render else json_path, output_dir)
+        # Written last, so its presence marks the pair as complete
+        _write_json(pair_path, record)
+        records.append(record)
+    return records
+
+def read_corpus_settings(output_dir, seed, base_year, shard_size, overwrite):
+    """
+    Check the settings of the corpus already in `output_dir` (its `corpus.json`) against this run's.
+
+    An existing corpus can only be resumed or grown with the settings it was generated with; with
+    `overwrite`, it is regenerated with the new ones instead. Without an explicit `base_year`, the
+    corpus keeps its own, so resuming in a new calendar year does not change it.
+
+    Returns:
+        dict: The settings of the run: "seed", "base_year" and "shard_size".
+    """
+    path = os.path.join(output_dir, CORPUS_MANIFEST)
+    existing = None
+    if os.path.exists(path):
+        with open(path) as f:
+            existing = json.load(f)
+    if base_year is None:
+        base_year = existing["base_year"] if existing and not overwrite else datetime.now().year - 1
+    settings = {"seed": seed, "base_year": base_year, "shard_size": shard_size}
+    if existing and existing != settings and not overwrite:
+        raise ValueError(
+            f"{output_dir} holds a corpus generated with {existing}, not {settings}. "
+            "Use the same settings to resume it, --overwrite to regenerate it, or another --output."
+        )
+    return settings
+
+def generate_corpus(output_dir="data/insurance_docs", pairs=5, seed=0, base_year=None, workers=None,
+                    shard_size=1000, render=True, overwrite=False, batch_size=100):
+    """
+    Generate `pairs` year-over-year policy pairs across a process pool.
+
+    Each pair gets two PDFs and a ground-truth JSON per PDF, in the extraction model's field names and
+    formats, plus a pair JSON listing the designed changes (without `render`, only the JSON); `pairs.jsonl` indexes all pairs and `corpus.json` records the settings. Output is fully
+    determined by `seed`, `base_year` and `shard_size`, so re-runs reproduce the same corpus and an
+    interrupted or grown run resumes where it stopped.
+
+    Returns:
+        list: The pair records, ordered by pair id.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    settings = read_corpus_settings(output_dir, seed, base_year, shard_size, overwrite)
+    _write_json(os.path.join(output_dir, CORPUS_MANIFEST), settings)
+    start_time = time.perf_counter()
+    records = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(generate_pairs, output_dir, start, min(start + batch_size, pairs), seed,
+                            settings["base_year"], shard_size, render, overwrite)
+            for start in range(0, pairs, batch_size)
+        ]
+        for done, future in enumerate(as_completed(futures), start=1):
+            records.extend(future.result())
+            if done % 10 == 0 or done == len(futures):
+                elapsed = time.perf_counter() - start_time
+                print(f"{len(records)}/{pairs} pairs ({2 * len(records) / elapsed:.0f} documents/s)")
 
-        # Alternate between last year and current year
-        policy_year = last_year if i < count // 2 else current_year
+    records.sort(key=lambda record: record["pair_id"])
+    with open(os.path.join(output_dir, "pairs.jsonl"), "w") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+    print(f"{2 * len(records)} insurance documents generated in: {output_dir}")
+    return records
 
-        file_path = os.path.join(output_dir, f"insurance_policy_{i+1}.pdf")
-        generate_insurance_pdf(file_path, insured_name, carrier_name, address, premium, deductible, accidents, policy_year)
+def main():
+    parser = argparse.ArgumentParser(description="Generate a reproducible corpus of year-over-year insurance policy pairs.")
+    parser.add_argument("--output", default="data/insurance_docs")
+    parser.add_argument("--pairs", type=int, default=5, help="Number of policy pairs (two PDFs each).")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--base-year", type=int,
+                        help="Policy year of the prior policies (default: the existing corpus's, else last year).")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: CPU count).")
+    parser.add_argument("--shard-size", type=int, default=1000, help="Pairs per subdirectory; 0 for a flat folder.")
+    parser.add_argument("--batch-size", type=int, default=100, help="Pairs per worker task.")
+    parser.add_argument("--no-pdf", action="store_true", help="Write the ground-truth JSON only.")
+    parser.add_argument("--overwrite", action="store_true",
+                        help="Regenerate pairs that already exist, also with different settings.")
+    args = parser.parse_args()
 
-    print(f"{count} insurance documents generated in: {output_dir}")
+    try:
+        generate_corpus(args.output, args.pairs, seed=args.seed, base_year=args.base_year, workers=args.workers,
+                        shard_size=args.shard_size, render=not args.no_pdf, overwrite=args.overwrite,
+                        batch_size=args.batch_size)
+    except ValueError as error:
+        parser.error(str(error))
 
 # Run
-generate_sample_documents()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Compare many policy pairs at once, e.g. every renewed policy with last year's version.
+
+Pairs come from a pairing spec (JSON lines with "doc1"/"doc2" or "prior"/"renewal", such as the
+generator's `pairs.jsonl`) or are formed automatically from the documents in a folder by insured
+name and policy year. Reports are written per pair under `--output`, with `summary.json` and
+`summary.csv`; re-running the same command resumes an interrupted run.
+
+Usage:
+    python src/batch_compare_main.py --pairs data/insurance_docs/pairs.jsonl [--output data/batch_reports]
+    python src/batch_compare_main.py --documents data/insurance_docs [--json-sidecars] [--no-llm]
+"""
+import argparse
+import functools
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+import yaml
+from dotenv import load_dotenv, find_dotenv
+
+# Add src directory to sys.path
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+from get_custom_text.analysis_cache import configure_analysis_cache
+from chunking.chunk_and_embed import configure_chunker
+from chunking.onnx_encoder import configure_encoder
+from comparison.batch_compare import (
+    auto_pair, batch_compare, list_documents, load_document, read_pairing_spec, DEFAULT_QUERY,
+)
+from comparison.generation import configure_generation
+from comparison.context_packer import configure_context_packer
+from telemetry import configure_telemetry, telemetry
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--pairs", help="Pairing spec (JSON lines).")
+    source.add_argument("--documents", help="Folder of documents to pair by insured name and year.")
+    parser.add_argument("--output", help="Folder of the reports and summary (default: comparison.batch.output_dir).")
+    parser.add_argument("--query", default=DEFAULT_QUERY)
+    parser.add_argument("--json-sidecars", action="store_true",
+                        help="Read fields from a .json file next to each document instead of analyzing it.")
+    parser.add_argument("--no-llm", action="store_true", help="Skip the LLaMA explanations.")
+    parser.add_argument("--overwrite", action="store_true", help="Compare pairs that already have a report again.")
+    args = parser.parse_args()
+
+    with open('./config.yaml') as yaml_file:
+        config = yaml.safe_load(yaml_file)
+    load_dotenv(find_dotenv())
+    configure_generation(**(config.get('llm') or {}))
+    configure_context_packer(**((config.get('comparison') or {}).get('context') or {}))
+    configure_chunker(**(config.get('chunking') or {}))
+    configure_encoder(**(config.get('encoder') or {}))
+    configure_analysis_cache(**(config['doc_intelligence'].get('cache') or {}))
+    configure_telemetry(**(config.get('telemetry') or {}))
+    comparison_config = config.get('comparison') or {}
+    batch_config = comparison_config.get('batch') or {}
+
+    load = functools.partial(
+        load_document,
+        model_id=config['doc_intelligence']['custom_models']['custom_insurance_model_1'],
+        training_folder_path=os.getenv("training_folder_SAS_URI"),
+        use_json_sidecars=args.json_sidecars,
+    )
+    if args.pairs:
+        pairs = read_pairing_spec(args.pairs)
+    else:
+        paths = list_documents(args.documents, use_json_sidecars=args.json_sidecars)
+        print(f"Loading {len(paths)} documents to pair...")
+        with ThreadPoolExecutor(max_workers=batch_config.get('load_workers', 8)) as executor:
+            documents = {path: document for path, document in zip(paths, executor.map(load, paths))
+                         if document is not None}
+        pairs, unpaired = auto_pair(documents)
+        print(f"{len(pairs)} pairs found, {len(unpaired)} documents left unpaired.")
+        load = documents.get
+
+    summary = batch_compare(
+        pairs,
+        load,
+        args.output or batch_config.get('output_dir', './data/batch_reports'),
+        query=args.query,
+        use_llm=not args.no_llm,
+        structured_fields=comparison_config.get('structured_fields', True),
+        min_confidence=comparison_config.get('min_confidence', 0.8),
+        batch_size=batch_config.get('batch_size', 256),
+        generation_batch_size=batch_config.get('generation_batch_size', 8),
+        load_workers=batch_config.get('load_workers', 8),
+        overwrite=args.overwrite,
+    )
+    print(f"{summary['compared']} of {summary['pairs']} pairs compared, {summary['with_changes']} with changes, "
+          f"{summary['used_llm']} explained by the LLM.")
+    print("Telemetry:")
+    print(telemetry.format_snapshot())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import time
+from telemetry import telemetry
+
+def chunk_key(document_index, chunk_id):
+    """
+    Build the id under which a chunk is stored in Chroma and Azure Cognitive Search.
+    """
+    return f"doc_{document_index}_chunk_{chunk_id}"
+
+def get_collection(collection_name="insurance_docs", persist_directory="./data/chroma_db"):
+    """
+    Open (or create) a persistent Chroma collection.
+
+    Args:
+        collection_name (str): The name of the Chroma collection.
+        persist_directory (str): Directory where the Chroma database is persisted.
+
+    Returns:
+        chromadb.Collection: The collection handle.
+    """
+    import chromadb
+
+    client = chromadb.PersistentClient(path=persist_directory)
+    return client.get_or_create_collection(name=collection_name)
+
+def upsert_chunks(collection, all_chunks, batch_size=5000):
+    """
+    Write chunks and their precomputed embeddings to Chroma in large batches.
+
+    The text is stored as the document but never re-embedded: the vectors in `all_chunks`
+    are passed straight through.
+
+    Args:
+        collection (chromadb.Collection): Target collection.
+        all_chunks (list): Chunks with "document_index", "chunk_id", "chunk" and "embedding".
+        batch_size (int): Chunks per upsert call. Must not exceed the client's maximum batch size.
+
+    Returns:
+        dict: Number of chunks written, elapsed seconds and chunks per second.
+    """
+    start = time.perf_counter()
+    for offset in range(0, len(all_chunks), batch_size):
+        batch = all_chunks[offset:offset + batch_size]
+        with telemetry.span("chroma.upsert", chunks=len(batch)):
+            collection.upsert(
+                ids=[chunk_key(c["document_index"], c["chunk_id"]) for c in batch],
+                embeddings=[c["embedding"] for c in batch],
+                metadatas=[{"document_index": c["document_index"], "chunk_id": c["chunk_id"]} for c in batch],
+                documents=[c["chunk"] for c in batch],
+            )
+    elapsed = time.perf_counter() - start
+
+    stats = {
+        "chunks": len(all_chunks),
+        "seconds": elapsed,
+        "chunks_per_second": len(all_chunks) / elapsed if elapsed > 0 else float("inf"),
+    }
+    print(f"Upserted {stats['chunks']} chunks in {elapsed:.2f}s ({stats['chunks_per_second']:.1f} chunks/s).")
+    return stats
+
+def delete_chunks(collection, ids, batch_size=5000):
+    """
+    Delete chunks from Chroma by id.
+
+    Args:
+        collection (chromadb.Collection): Target collection.
+        ids (list): Chunk ids to delete.
+        batch_size (int): Ids per delete call.
+    """
+    for offset in range(0, len(ids), batch_size):
+        collection.delete(ids=ids[offset:offset + batch_size])
@@ -1,7 +1,37 @@
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.vectorstores import Chroma
-import json
+from chunking.embedding_engine import get_embedding_engine
+from chunking.embedding_cache import get_embedding_cache
+from chunking.chroma_store import get_collection, upsert_chunks
+from chunking.chunk_store import ChunkStore
+from chunking.token_chunker import get_token_chunker
+from telemetry import telemetry
+
+SPLITTERS = ("recursive_character", "token")
+
+# Splitter settings; recorded in the ingest manifest so a change triggers re-chunking
+CHUNKER_SETTINGS = {
+    "splitter": "recursive_character",
+    "chunk_size": 500,  # Maximum size of each chunk, in characters
+    "chunk_overlap": 50,  # Overlap between chunks to maintain context
+    "separators": ["\n\n", "\n", ".", " "],  # Hierarchical splitting
+    # token splitter: all-MiniLM-L6-v2 encodes at most 256 tokens including [CLS] and [SEP]
+    "chunk_tokens": 254,
+    "chunk_overlap_tokens": 32,
+}
+
+def configure_chunker(**settings):
+    """
+    Override the chunker settings (splitter, chunk_size, chunk_overlap, separators, chunk_tokens,
+    chunk_overlap_tokens), e.g. from config.yaml.
+    """
+    for key, value in settings.items():
+        if value is None:
+            continue
+        if key not in CHUNKER_SETTINGS:
+            raise ValueError(f"Unknown chunker setting '{key}'.")
+        if key == "splitter" and value not in SPLITTERS:
+            raise ValueError(f"Unknown splitter '{value}'. Expected one of {SPLITTERS}.")
+        CHUNKER_SETTINGS[key] = value
 
 def flatten_fields(doc):
     """
@@ -17,7 +47,89 @@ def flatten_fields(doc):
     text = "\n".join([f"{key.replace('_', ' ').title()}: {value['value']}" for key, value in fields.items()])
     return text
 
-def chunk_and_embed(parsed_output, collection_name="insurance_docs", persist_directory="./data/chroma_db"):
+def split_documents(parsed_output):
+    """
+    Flatten the fields of each parsed document and split them into chunks.
+
+    Documents carrying a "source_id" (set by the pipeline) keep it as their document index, so chunk
+    ids stay stable across runs; otherwise the position in `parsed_output` is used. With the
+    "token" splitter, chunks are sized in embedding-model tokens and keep their "token_ids" for
+    `embed_chunks`.
+
+    Args:
+        parsed_output (list): List of parsed documents with extracted fields.
+
+    Returns:
+        list: A list of dictionaries with the document index, chunk id and chunk text.
+    """
+    all_chunks = []
+    with telemetry.span("split", documents=len(parsed_output), splitter=CHUNKER_SETTINGS["splitter"]):
+        texts = [flatten_fields(doc) for doc in parsed_output]
+        if CHUNKER_SETTINGS["splitter"] == "token":
+            chunker = get_token_chunker(
+                chunk_tokens=CHUNKER_SETTINGS["chunk_tokens"],
+                overlap_tokens=CHUNKER_SETTINGS["chunk_overlap_tokens"],
+            )
+            split = chunker.split(texts)
+        else:
+            splitter = RecursiveCharacterTextSplitter(
+                chunk_size=CHUNKER_SETTINGS["chunk_size"],
+                chunk_overlap=CHUNKER_SETTINGS["chunk_overlap"],
+                separators=CHUNKER_SETTINGS["separators"],
+            )
+            split = [[(chunk, None) for chunk in splitter.split_text(text)] for text in texts]
+
+        # Store chunk with source info
+        for doc_index, (doc, chunks) in enumerate(zip(parsed_output, split)):
+            for i, (chunk, token_ids) in enumerate(chunks):
+                chunk_data = {
+                    "document_index": doc.get("source_id", doc_index),
+                    "chunk_id": i,
+                    "chunk": chunk,
+                }
+                if token_ids is not None:
+                    chunk_data["token_ids"] = token_ids
+                all_chunks.append(chunk_data)
+    telemetry.increment("documents_split", len(parsed_output))
+    telemetry.increment("chunks", len(all_chunks))
+    return all_chunks
+
+def embed_chunks(all_chunks, batch_size=64, num_threads=None, use_cache=True):
+    """
+    Embed all chunks of a run with a single model load, in batches.
+
+    Chunks carrying "token_ids" (token splitter) are encoded from those ids without tokenizing
+    their text again.
+
+    Args:
+        all_chunks (list): Chunks produced by `split_documents`.
+        batch_size (int): Number of chunks encoded per forward pass.
+        num_threads (int): Number of CPU threads used for encoding.
+        use_cache (bool): Serve unchanged chunk texts from the persistent embedding cache.
+
+    Returns:
+        list: The same chunks, each with an "embedding" list added.
+    """
+    cache = get_embedding_cache() if use_cache else None
+    engine = get_embedding_engine(batch_size=batch_size, num_threads=num_threads)
+    texts = [chunk_data["chunk"] for chunk_data in all_chunks]
+    # The cache counts over the process's lifetime, so the call's own hits and misses are the difference
+    before = cache.stats() if cache is not None else None
+    with telemetry.span("embed", chunks=len(all_chunks)):
+        if all_chunks and all("token_ids" in chunk_data for chunk_data in all_chunks):
+            embeddings = engine.embed_token_ids([chunk_data["token_ids"] for chunk_data in all_chunks], texts,
+                                                batch_size=batch_size, cache=cache)
+        else:
+            embeddings = engine.embed(texts, batch_size=batch_size, cache=cache)
+    if cache is not None:
+        after = cache.stats()
+        print(f"Embedding cache: {after['hits'] - before['hits']} hits, {after['misses'] - before['misses']} misses.")
+    for chunk_data, embedding in zip(all_chunks, embeddings):
+        chunk_data["embedding"] = embedding.tolist()
+    return all_chunks
+
+def chunk_and_embed(parsed_output, collection_name="insurance_docs", persist_directory="./data/chroma_db",
+                    batch_size=64, num_threads=None, use_cache=True, chunk_store_dir="./data/chunk_store"):
     """
     Chunk extracted document fields, embed the chunks, and store them in a Chroma vector database.
 
@@ -25,67 +137,32 @@ def chunk_and_embed(parsed_output, collection_name="insurance_docs", persist_dir
         parsed_output (list): List of parsed documents with extracted fields.
         collection_name (str): The name of the Chroma collection to store embeddings.
         persist_directory (str): Directory to persist the Chroma database.
+        batch_size (int): Number of chunks encoded per forward pass.
+        num_threads (int): Number of CPU threads used for encoding.
+        use_cache (bool): Serve unchanged chunk texts from the persistent embedding cache.
+        chunk_store_dir (str): Directory of the binary chunk store the chunks are appended to.
 
     Returns:
         list: A list of dictionaries containing chunk metadata and embeddings.
     """
-    all_chunks = []
-
     # Step 1: Flatten fields and chunk each document
     print("Flattening fields and chunking documents...")
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=500,  # Maximum size of each chunk
-        chunk_overlap=50,  # Overlap between chunks to maintain context
-        separators=["\n\n", "\n", ".", " "]  # Hierarchical splitting
-    )
-
-    for doc_index, doc in enumerate(parsed_output):
-        raw_text = flatten_fields(doc)
-        chunks = splitter.split_text(raw_text)
+    all_chunks = split_documents(parsed_output)
+    print(f"Document split into {len(all_chunks)} chunks.")
 
-        # Store chunk with source info
-        for i, chunk in enumerate(chunks):
-            all_chunks.append({
-                "document_index": doc_index,
-                "chunk_id": i,
-                "chunk": chunk,
-                "embedding": HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2").embed_query(chunk)
-            })
+    # Step 2: Embed every chunk of the run with one model load
+    print("Embedding chunks...")
+    embed_chunks(all_chunks, batch_size=batch_size, num_threads=num_threads, use_cache=use_cache)
 
-    print(f"Document split into {len(all_chunks)} chunks.")
-    
-    # Step 2: Initialize the embedding model
-    print("Loading embedding model...")
-    embedding_model = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-
-    # Step 3: Initialize the Chroma vectorstore
-    print("Initializing Chroma vectorstore...")
-    vectorstore = Chroma(
-        collection_name=collection_name,
-        persist_directory=persist_directory,
-        embedding_function=embedding_model
-    )
-
-    # Step 4: Add chunks and embeddings to the vectorstore
+    # Step 3: Bulk upsert the precomputed embeddings into Chroma
     print("Storing embeddings in Chroma...")
-    for chunk_data in all_chunks:
-        vectorstore.add_texts(
-            texts=[chunk_data["chunk"]],
-            metadatas=[{
-                "document_index": chunk_data["document_index"],
-                "chunk_id": chunk_data["chunk_id"]
-            }],
-            ids=[f"doc_{chunk_data['document_index']}_chunk_{chunk_data['chunk_id']}"]
-        )
-
-    # Persist the database to disk
-    vectorstore.persist()
+    collection = get_collection(collection_name, persist_directory)
+    upsert_chunks(collection, all_chunks)
     print(f"Successfully stored {len(all_chunks)} chunks in the Chroma collection '{collection_name}'.")
 
-    # Optional: Save chunks to JSON for debugging or future use
-    with open("parsed_chunks.json", "w") as f:
-        json.dump(all_chunks, f, indent=2)
-    print("✅ Chunks saved to 'parsed_chunks.json'.")
+    # Step 4: Append chunks to the binary chunk store for retrieval and comparison
+    ChunkStore(chunk_store_dir).append(all_chunks)
+    print(f"✅ Chunks saved to the chunk store in '{chunk_store_dir}'.")
     return all_chunks
 
 # Example usage
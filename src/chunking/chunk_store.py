@@ -0,0 +1,196 @@
+import glob
+import json
+import os
+import threading
+import numpy as np
+from chunking.chroma_store import chunk_key
+from telemetry import telemetry
+
+class ChunkStore:
+    """
+    Compact on-disk store for embedded chunks.
+
+    Embeddings are written as float32 `.npy` segments (one per append) that are memory-mapped on
+    load, and chunk metadata as one JSON line per chunk in `metadata.jsonl`. Appending never rewrites
+    existing data: a later record for the same chunk id supersedes the earlier one, and deletions
+    are recorded as tombstones. `compact` rewrites everything into a single segment; `delete` runs
+    it once superseded records and tombstones make up more than `compact_ratio` of the metadata.
+
+    Args:
+        directory (str): Directory holding the store.
+        compact_ratio (float): Share of dead metadata lines above which `delete` compacts the
+            store. Never compacts automatically if None.
+    """
+
+    METADATA_FILE = "metadata.jsonl"
+
+    def __init__(self, directory="./data/chunk_store", compact_ratio=0.5):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.compact_ratio = compact_ratio
+        self._segments = {}
+        self._lock = threading.RLock()
+        self._index = None
+        self._by_document = None
+        self._lines = 0
+
+    def _metadata_path(self):
+        return os.path.join(self.directory, self.METADATA_FILE)
+
+    def _segment_path(self, segment):
+        return os.path.join(self.directory, f"embeddings_{segment:05d}.npy")
+
+    def _segment_paths(self):
+        return glob.glob(os.path.join(self.directory, "embeddings_*.npy"))
+
+    def _next_segment(self):
+        segments = [int(os.path.basename(path)[len("embeddings_"):-len(".npy")]) for path in self._segment_paths()]
+        return max(segments, default=-1) + 1
+
+    def append(self, chunks):
+        """
+        Append embedded chunks as a new segment.
+
+        Args:
+            chunks (list): Chunks with "document_index", "chunk_id", "chunk" and "embedding".
+        """
+        if not chunks:
+            return
+        with self._lock, telemetry.span("chunk_store.append", chunks=len(chunks)):
+            segment = self._next_segment()
+            embeddings = np.asarray([chunk["embedding"] for chunk in chunks], dtype=np.float32)
+            np.save(self._segment_path(segment), embeddings)
+            with open(self._metadata_path(), "a") as f:
+                for row, chunk in enumerate(chunks):
+                    f.write(json.dumps({
+                        "id": chunk_key(chunk["document_index"], chunk["chunk_id"]),
+                        "document_index": chunk["document_index"],
+                        "chunk_id": chunk["chunk_id"],
+                        "chunk": chunk["chunk"],
+                        "segment": segment,
+                        "row": row,
+                    }) + "\n")
+            self._index = None
+
+    def delete(self, ids):
+        """
+        Record tombstones for chunk ids so they are no longer loaded, compacting the store once
+        dead records exceed `compact_ratio` of it.
+        """
+        if not ids:
+            return
+        with self._lock:
+            with open(self._metadata_path(), "a") as f:
+                for chunk_id in ids:
+                    f.write(json.dumps({"id": chunk_id, "deleted": True}) + "\n")
+            self._index = None
+            if self.compact_ratio is not None and self.dead_ratio() > self.compact_ratio:
+                self.compact()
+
+    def dead_ratio(self):
+        """
+        Return the share of metadata lines that are superseded records or tombstones.
+        """
+        with self._lock:
+            live = len(self.records())
+            return (self._lines - live) / self._lines if self._lines else 0.0
+
+    def records(self):
+        """
+        Return the live chunk records (metadata only, no embeddings), in insertion order.
+        """
+        with self._lock:
+            if self._index is None:
+                index = {}
+                self._lines = 0
+                if os.path.exists(self._metadata_path()):
+                    with open(self._metadata_path()) as f:
+                        for line in f:
+                            self._lines += 1
+                            record = json.loads(line)
+                            # Re-insert so a superseding record moves to the end
+                            index.pop(record["id"], None)
+                            if not record.get("deleted"):
+                                index[record["id"]] = record
+                self._index = index
+                self._by_document = {}
+                for record in index.values():
+                    self._by_document.setdefault(str(record["document_index"]), []).append(record)
+            return list(self._index.values())
+
+    def _segment(self, segment):
+        if segment not in self._segments:
+            self._segments[segment] = np.load(self._segment_path(segment), mmap_mode="r")
+        return self._segments[segment]
+
+    def embeddings(self, records):
+        """
+        Gather the embeddings of the given records into one float32 matrix.
+
+        When all records are the consecutive rows of a single segment, the memory-mapped slice is
+        returned without copying.
+        """
+        if not records:
+            return np.zeros((0, 0), dtype=np.float32)
+        first = records[0]
+        rows = [record["row"] for record in records]
+        single_segment = all(record["segment"] == first["segment"] for record in records)
+        if single_segment and rows == list(range(rows[0], rows[0] + len(rows))):
+            return self._segment(first["segment"])[rows[0]:rows[0] + len(rows)]
+        return np.stack([self._segment(record["segment"])[record["row"]] for record in records])
+
+    def load(self):
+        """
+        Load every live chunk.
+
+        Returns:
+            tuple: (records, embeddings matrix)
+        """
+        records = self.records()
+        return records, self.embeddings(records)
+
+    def load_document(self, document_index):
+        """
+        Load the chunks of one document.
+
+        Returns:
+            tuple: (records, embeddings matrix), ordered by chunk id.
+        """
+        self.records()
+        records = sorted(self._by_document.get(str(document_index), []), key=lambda record: int(record["chunk_id"]))
+        return records, self.embeddings(records)
+
+    def document_chunks(self, document_index):
+        """
+        Return the chunks of one document as chunk dictionaries with an "embedding" row each.
+        """
+        records, embeddings = self.load_document(document_index)
+        return [{**record, "embedding": embedding} for record, embedding in zip(records, embeddings)]
+
+    def compact(self):
+        """
+        Rewrite the live chunks into a single new segment and drop superseded records and tombstones.
+
+        The new segment and metadata are in place before the old segments are removed, so a crash
+        at any point leaves either the old or the new store intact (plus unreferenced segments,
+        removed by the next compaction).
+        """
+        with self._lock, telemetry.span("chunk_store.compact"):
+            records, embeddings = self.load()
+            embeddings = np.array(embeddings, dtype=np.float32)
+            old_segments = self._segment_paths()
+            segment = self._next_segment()
+            tmp_matrix = os.path.join(self.directory, "compact.npy.tmp")
+            tmp_metadata = self._metadata_path() + ".tmp"
+            with open(tmp_matrix, "wb") as f:
+                np.save(f, embeddings)
+            with open(tmp_metadata, "w") as f:
+                for row, record in enumerate(records):
+                    f.write(json.dumps({**record, "segment": segment, "row": row}) + "\n")
+            os.replace(tmp_matrix, self._segment_path(segment))
+            # The metadata switches to the new segment in one atomic step
+            os.replace(tmp_metadata, self._metadata_path())
+            self._segments = {}
+            self._index = None
+            for path in old_segments:
+                os.remove(path)
@@ -1,4 +1,10 @@
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+import os
+import sys
+
+# Add src directory to sys.path, ahead of this folder so `chunking` resolves to the package
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from chunking.token_chunker import get_token_chunker
 
 # Simulated document fields from Azure Doc Intelligence
 document = {
@@ -23,16 +29,12 @@ Address: {document['insured_address']}
 Number of Accidents in Current Year: {document['no_of_accidents']}
 """
 
-# Step 1: Initialize chunker
-text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size=500,
-    chunk_overlap=50,
-    separators=["\n\n", "\n", ".", " "]
-)
+# Step 1: Initialize chunker, sized in the embedding model's tokens so no chunk is truncated when encoded
+text_splitter = get_token_chunker(chunk_tokens=254, overlap_tokens=32)
 
-# Step 2: Create chunks
-chunks = text_splitter.split_text(text_representation)
+# Step 2: Create chunks, each with the token ids the encoder can use directly
+chunks = text_splitter.split([text_representation])[0]
 
 # Output for inspection
-for i, chunk in enumerate(chunks):
-    print(f"\n--- Chunk {i+1} ---\n{chunk}")
+for i, (chunk, token_ids) in enumerate(chunks):
+    print(f"\n--- Chunk {i+1} ({len(token_ids)} tokens) ---\n{chunk}")
@@ -0,0 +1,188 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import numpy as np
+
+def normalize_text(text):
+    """
+    Normalize chunk text so whitespace-only differences map to the same cache entry.
+    """
+    return re.sub(r"\s+", " ", text).strip()
+
+def text_hash(text):
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+class EmbeddingCache:
+    """
+    Disk-backed, content-addressed embedding cache.
+
+    Entries are keyed by (model name, SHA-256 of the normalized text). The index lives in SQLite
+    and the vectors in one memory-mapped float32 matrix per model with `max_entries` rows. When a
+    model's matrix is full, the least recently used entry is evicted and its row reused.
+
+    Args:
+        cache_dir (str): Directory holding the SQLite index and the embedding matrices.
+        max_entries (int): Maximum number of cached embeddings per model. The capacity is fixed
+            when a model's matrix is first created.
+    """
+
+    def __init__(self, cache_dir="./data/embedding_cache", max_entries=200_000):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._matrices = {}
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(cache_dir, "index.sqlite"), check_same_thread=False)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS models (
+                model TEXT PRIMARY KEY,
+                dim INTEGER NOT NULL,
+                capacity INTEGER NOT NULL,
+                file TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS entries (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                slot INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            );
+            CREATE INDEX IF NOT EXISTS entries_lru ON entries (model, last_used);
+        """)
+        self._db.commit()
+
+    def _matrix(self, model_name, dim=None):
+        """
+        Return the memory-mapped matrix for a model, creating it when `dim` is given.
+        """
+        matrix = self._matrices.get(model_name)
+        if matrix is not None:
+            return matrix
+
+        row = self._db.execute("SELECT dim, capacity, file FROM models WHERE model = ?", (model_name,)).fetchone()
+        if row is None:
+            if dim is None:
+                return None
+            file_name = hashlib.sha1(model_name.encode("utf-8")).hexdigest() + ".f32"
+            row = (dim, self.max_entries, file_name)
+            self._db.execute("INSERT INTO models (model, dim, capacity, file) VALUES (?, ?, ?, ?)", (model_name, *row))
+            self._db.commit()
+
+        path = os.path.join(self.cache_dir, row[2])
+        mode = "r+" if os.path.exists(path) else "w+"
+        matrix = np.memmap(path, dtype=np.float32, mode=mode, shape=(row[1], row[0]))
+        self._matrices[model_name] = matrix
+        return matrix
+
+    def get_many(self, model_name, texts):
+        """
+        Look up cached embeddings for a list of texts.
+
+        Args:
+            model_name (str): Name of the embedding model.
+            texts (list): Texts to look up.
+
+        Returns:
+            list: One float32 vector per text, or None where the text is not cached.
+        """
+        hashes = [text_hash(text) for text in texts]
+        results = [None] * len(texts)
+        with self._lock:
+            matrix = self._matrix(model_name)
+            if matrix is None:
+                self.misses += len(texts)
+                return results
+
+            now = time.time()
+            for i, key in enumerate(hashes):
+                row = self._db.execute(
+                    "SELECT slot FROM entries WHERE model = ? AND text_hash = ?", (model_name, key)
+                ).fetchone()
+                if row is None:
+                    continue
+                results[i] = np.array(matrix[row[0]])
+                self._db.execute(
+                    "UPDATE entries SET last_used = ? WHERE model = ? AND text_hash = ?", (now, model_name, key)
+                )
+            self._db.commit()
+
+            found = sum(vector is not None for vector in results)
+            self.hits += found
+            self.misses += len(texts) - found
+        return results
+
+    def put_many(self, model_name, texts, embeddings):
+        """
+        Store embeddings, evicting the least recently used entries when the model's matrix is full.
+
+        Args:
+            model_name (str): Name of the embedding model.
+            texts (list): Texts the embeddings were computed from.
+            embeddings (np.ndarray): float32 array of shape (len(texts), dim).
+        """
+        if len(texts) == 0:
+            return
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        with self._lock:
+            matrix = self._matrix(model_name, dim=embeddings.shape[1])
+            now = time.time()
+            for text, vector in zip(texts, embeddings):
+                key = text_hash(text)
+                row = self._db.execute(
+                    "SELECT slot FROM entries WHERE model = ? AND text_hash = ?", (model_name, key)
+                ).fetchone()
+                if row is not None:
+                    slot = row[0]
+                else:
+                    slot = self._free_slot(model_name)
+                matrix[slot] = vector
+                self._db.execute(
+                    "INSERT OR REPLACE INTO entries (model, text_hash, slot, last_used) VALUES (?, ?, ?, ?)",
+                    (model_name, key, slot, now),
+                )
+            matrix.flush()
+            self._db.commit()
+
+    def _free_slot(self, model_name):
+        """
+        Return an unused row of the model's matrix, evicting the LRU entry if none is left.
+        """
+        # Rows are only freed by eviction, which reuses them immediately, so used slots stay dense
+        count = self._db.execute("SELECT COUNT(*) FROM entries WHERE model = ?", (model_name,)).fetchone()[0]
+        if count < self._matrices[model_name].shape[0]:
+            return count
+
+        text_hash_lru, slot = self._db.execute(
+            "SELECT text_hash, slot FROM entries WHERE model = ? ORDER BY last_used LIMIT 1", (model_name,)
+        ).fetchone()
+        self._db.execute("DELETE FROM entries WHERE model = ? AND text_hash = ?", (model_name, text_hash_lru))
+        return slot
+
+    def stats(self):
+        """
+        Return the hit/miss counters of this cache instance.
+        """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_embedding_cache(cache_dir="./data/embedding_cache", max_entries=200_000):
+    """
+    Return the process-wide embedding cache, opening it on first use.
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = EmbeddingCache(cache_dir, max_entries=max_entries)
+        return _cache
@@ -0,0 +1,262 @@
+import threading
+import numpy as np
+from chunking.onnx_encoder import OnnxEncoder, encoder_settings, encoder_variant
+from telemetry import telemetry
+
+DEFAULT_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+DEFAULT_MAX_SEQ_LENGTH = 256  # Tokens all-MiniLM-L6-v2 encodes, special tokens included
+
+def special_token_ids(tokenizer):
+    """
+    Return the token ids the tokenizer adds before and after a single text (e.g. [CLS] and [SEP]).
+
+    Found by encoding a probe text with and without special tokens, which works on every tokenizer,
+    unlike `build_inputs_with_special_tokens` (gone from the fast tokenizers of transformers 5).
+    """
+    with_special = tokenizer("a")["input_ids"]
+    without = tokenizer("a", add_special_tokens=False)["input_ids"]
+    for start in range(len(with_special) - len(without) + 1):
+        if with_special[start:start + len(without)] == without:
+            return with_special[:start], with_special[start + len(without):]
+    raise ValueError("Could not locate the special tokens added by the tokenizer.")
+
+class EmbeddingEngine:
+    """
+    Batched sentence-transformer encoder that loads its model once and reuses it for every call.
+
+    Texts are sorted by length before batching so each batch is padded only to the length of its
+    longest member, then the embeddings are returned in the original order.
+
+    With the "onnx" backend the model runs on ONNX Runtime (`OnnxEncoder`, optionally int8) with
+    mean pooling and L2 normalization, the head of all-MiniLM-L6-v2, instead of PyTorch.
+
+    Args:
+        model_name (str): HuggingFace model name of the sentence-transformer.
+        batch_size (int): Default number of texts encoded per forward pass.
+        num_threads (int): Number of intra-op CPU threads used by torch, or by ONNX Runtime unless
+            `encoder.intra_op_threads` is set. Uses the runtime default if None.
+        cache (EmbeddingCache): Default persistent cache consulted before encoding. The shared
+            engines have none; callers pass theirs to `embed` so concurrent calls do not race.
+        backend (str): "torch" or "onnx". Defaults to the configured encoder backend.
+    """
+
+    def __init__(self, model_name=DEFAULT_MODEL_NAME, batch_size=64, num_threads=None, cache=None, backend=None):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.num_threads = num_threads
+        self.cache = cache
+        self.backend = backend or encoder_settings["backend"]
+        self._model = None
+        self._onnx = None
+        self._special_tokens = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        """
+        Load the sentence-transformer on first use.
+        """
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    import torch
+                    from sentence_transformers import SentenceTransformer
+
+                    if self.num_threads:
+                        torch.set_num_threads(self.num_threads)
+                    print(f"Loading embedding model '{self.model_name}'...")
+                    self._model = SentenceTransformer(self.model_name, device="cpu")
+        return self._model
+
+    @property
+    def onnx(self):
+        """
+        Create the ONNX Runtime encoder on first use.
+        """
+        if self._onnx is None:
+            with self._lock:
+                if self._onnx is None:
+                    self._onnx = OnnxEncoder(self.model_name, intra_op_threads=encoder_settings["intra_op_threads"]
+                                             or self.num_threads)
+        return self._onnx
+
+    @property
+    def cache_name(self):
+        """
+        Name the embeddings are cached under, distinguishing the backend producing them.
+        """
+        return encoder_variant(self.model_name, self.backend)
+
+    @property
+    def dimension(self):
+        if self.backend == "onnx":
+            return self.onnx.dimension
+        return self.model.get_sentence_embedding_dimension()
+
+    @property
+    def max_seq_length(self):
+        if self.backend == "onnx":
+            return DEFAULT_MAX_SEQ_LENGTH
+        return self.model.max_seq_length
+
+    def embed(self, texts, batch_size=None, cache=None):
+        """
+        Encode a list of texts, serving cached vectors first when a cache is given.
+
+        Args:
+            texts (list): Texts to encode.
+            batch_size (int): Texts per forward pass. Defaults to the engine's.
+            cache (EmbeddingCache): Cache consulted before encoding. Defaults to the engine's.
+
+        Returns:
+            np.ndarray: float32 array of shape (len(texts), dimension).
+        """
+        return self._embed_cached(texts, lambda indexes: self._encode([texts[i] for i in indexes], batch_size),
+                                  cache)
+
+    def embed_token_ids(self, token_ids, texts=None, batch_size=None, cache=None):
+        """
+        Encode texts that are already tokenized (e.g. by `TokenChunker`), skipping the tokenizer.
+
+        Args:
+            token_ids (list): Token ids of each text, without special tokens.
+            texts (list): The matching texts, used as cache keys. The cache is bypassed if None.
+            batch_size (int): Texts per forward pass. Defaults to the engine's.
+            cache (EmbeddingCache): Cache consulted before encoding. Defaults to the engine's.
+
+        Returns:
+            np.ndarray: float32 array of shape (len(token_ids), dimension).
+        """
+        if texts is None:
+            return self._encode_token_ids(token_ids, batch_size)
+        return self._embed_cached(
+            texts, lambda indexes: self._encode_token_ids([token_ids[i] for i in indexes], batch_size), cache)
+
+    def _embed_cached(self, texts, encode, cache=None):
+        """
+        Serve cached vectors for `texts` and call `encode(indexes)` for the rest.
+        """
+        cache = cache if cache is not None else self.cache
+        if cache is None:
+            return encode(range(len(texts)))
+
+        cached = cache.get_many(self.cache_name, texts)
+        missing = [i for i, vector in enumerate(cached) if vector is None]
+        telemetry.increment("embedding_cache.hits", len(texts) - len(missing))
+        telemetry.increment("embedding_cache.misses", len(missing))
+        if not missing:
+            return np.stack(cached) if cached else encode([])
+
+        encoded = encode(missing)
+        cache.put_many(self.cache_name, [texts[i] for i in missing], encoded)
+
+        embeddings = np.empty((len(texts), encoded.shape[1]), dtype=np.float32)
+        embeddings[missing] = encoded
+        for i, vector in enumerate(cached):
+            if vector is not None:
+                embeddings[i] = vector
+        return embeddings
+
+    def _encode(self, texts, batch_size=None):
+        """
+        Encode a list of texts in length-bucketed batches.
+        """
+        batch_size = batch_size or self.batch_size
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+
+        # Sort by length so each batch pads to a similar length
+        order = np.argsort([len(text) for text in texts], kind="stable")
+        embeddings = np.empty((len(texts), self.dimension), dtype=np.float32)
+
+        for start in range(0, len(texts), batch_size):
+            batch_idx = order[start:start + batch_size]
+            batch = [texts[i] for i in batch_idx]
+            if self.backend == "onnx":
+                embeddings[batch_idx] = self.onnx.embed(batch, max_length=self.max_seq_length, normalize=True)
+                continue
+
+            import torch
+
+            with torch.inference_mode():
+                vectors = self.model.encode(
+                    batch,
+                    batch_size=len(batch),
+                    convert_to_numpy=True,
+                    show_progress_bar=False,
+                )
+            embeddings[batch_idx] = vectors.astype(np.float32, copy=False)
+
+        return embeddings
+
+    def _encode_token_ids(self, token_ids, batch_size=None):
+        """
+        Encode pre-tokenized texts in length-bucketed batches, calling the model's forward pass directly.
+        """
+        batch_size = batch_size or self.batch_size
+        if not len(token_ids):
+            return np.zeros((0, self.dimension), dtype=np.float32)
+
+        tokenizer = self.onnx.tokenizer if self.backend == "onnx" else self.model.tokenizer
+        if self._special_tokens is None:
+            self._special_tokens = special_token_ids(tokenizer)
+        prefix, suffix = self._special_tokens
+        # Truncate like the tokenizer would, keeping the special tokens
+        max_tokens = self.max_seq_length - len(prefix) - len(suffix)
+        order = np.argsort([len(ids) for ids in token_ids], kind="stable")
+        embeddings = np.empty((len(token_ids), self.dimension), dtype=np.float32)
+
+        for start in range(0, len(token_ids), batch_size):
+            batch_idx = order[start:start + batch_size]
+            telemetry.increment("embedding.truncated", sum(len(token_ids[i]) > max_tokens for i in batch_idx))
+            inputs = [prefix + list(token_ids[i][:max_tokens]) + suffix for i in batch_idx]
+            if self.backend == "onnx":
+                embeddings[batch_idx] = self.onnx.embed_token_ids(inputs, normalize=True)
+                continue
+
+            import torch
+
+            features = tokenizer.pad({"input_ids": inputs}, return_tensors="pt")
+            with torch.inference_mode():
+                vectors = self.model(dict(features))["sentence_embedding"]
+            embeddings[batch_idx] = vectors.float().numpy()
+
+        return embeddings
+
+    # LangChain Embeddings interface, so the engine can be handed to Chroma directly
+    def embed_documents(self, texts):
+        return self.embed(list(texts)).tolist()
+
+    def embed_query(self, text):
+        return self.embed([text])[0].tolist()
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+def get_embedding_engine(model_name=DEFAULT_MODEL_NAME, batch_size=64, num_threads=None):
+    """
+    Return the shared EmbeddingEngine for a model, creating it on first use.
+
+    The engine is shared across threads, so it is never reconfigured per caller: pass the batch
+    size and cache of a call to `embed` instead.
+
+    Args:
+        model_name (str): HuggingFace model name of the sentence-transformer.
+        batch_size (int): Default number of texts encoded per forward pass of a new engine.
+        num_threads (int): Number of intra-op CPU threads used for encoding.
+
+    Returns:
+        EmbeddingEngine: The process-wide engine for `model_name`.
+    """
+    with _engines_lock:
+        engine = _engines.get(model_name)
+        if engine is None:
+            engine = EmbeddingEngine(model_name, batch_size=batch_size, num_threads=num_threads)
+            _engines[model_name] = engine
+        elif num_threads:
+            engine.num_threads = num_threads
+            if engine.backend == "torch":
+                import torch
+
+                torch.set_num_threads(num_threads)
+        return engine
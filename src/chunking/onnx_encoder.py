@@ -0,0 +1,194 @@
+import os
+import threading
+import numpy as np
+
+BACKENDS = ("torch", "onnx")
+
+encoder_settings = {
+    "backend": "torch",
+    "quantize": True,  # onnx: dynamic int8 quantization of the weights
+    "intra_op_threads": None,  # onnx: threads used within one operator; all cores if None
+    "inter_op_threads": None,  # onnx: threads used to run independent operators in parallel
+    "directory": "./data/onnx_models",  # Exported models, created on first use
+}
+
+def configure_encoder(**settings):
+    """
+    Override the encoder settings (backend, quantize, intra_op_threads, inter_op_threads, directory),
+    e.g. from config.yaml.
+    """
+    for key, value in settings.items():
+        if value is None:
+            continue
+        if key not in encoder_settings:
+            raise ValueError(f"Unknown encoder setting '{key}'.")
+        if key == "backend" and value not in BACKENDS:
+            raise ValueError(f"Unknown encoder backend '{value}'. Expected one of {BACKENDS}.")
+        encoder_settings[key] = value
+
+def encoder_variant(model_name, backend=None):
+    """
+    Identify a model as run by a backend (the configured one by default), e.g. for cache keys:
+    int8 ONNX embeddings differ slightly from PyTorch ones and must not be mixed with them.
+    """
+    if (backend or encoder_settings["backend"]) == "torch":
+        return model_name
+    return f"{model_name}@onnx" + ("-int8" if encoder_settings["quantize"] else "")
+
+def onnx_model_path(model_name, quantize=False, directory=None):
+    directory = directory or encoder_settings["directory"]
+    file_name = "model.int8.onnx" if quantize else "model.onnx"
+    return os.path.join(directory, model_name.replace("/", "__"), file_name)
+
+def export_onnx(model_name, quantize=False, directory=None, opset=17):
+    """
+    Export a HuggingFace encoder to ONNX (last hidden state output, dynamic batch and sequence
+    axes), then optionally quantize its weights to int8. Existing exports are reused.
+
+    Returns:
+        str: Path of the ONNX model.
+    """
+    fp32_path = onnx_model_path(model_name, directory=directory)
+    if not os.path.exists(fp32_path):
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        print(f"Exporting '{model_name}' to ONNX...")
+        os.makedirs(os.path.dirname(fp32_path), exist_ok=True)
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModel.from_pretrained(model_name).eval()
+        inputs = tokenizer(["Insured Name: Jane Doe", "Premium: $1,234.00"], return_tensors="pt", padding=True)
+        input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in inputs]
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]}
+
+        class LastHiddenState(torch.nn.Module):
+            # Positional inputs and a single tensor output, which the exporter traces cleanly
+            def __init__(self):
+                super().__init__()
+                self.model = model
+
+            def forward(self, *tensors):
+                return self.model(**dict(zip(input_names, tensors))).last_hidden_state
+
+        tmp_path = f"{fp32_path}.tmp"
+        with torch.no_grad():
+            torch.onnx.export(
+                LastHiddenState(),
+                tuple(inputs[name] for name in input_names),
+                tmp_path,
+                input_names=input_names,
+                output_names=["last_hidden_state"],
+                dynamic_axes=dynamic_axes,
+                opset_version=opset,
+                dynamo=False,  # The TorchScript exporter takes `dynamic_axes` and writes a single file
+            )
+        os.replace(tmp_path, fp32_path)
+    if not quantize:
+        return fp32_path
+
+    int8_path = onnx_model_path(model_name, quantize=True, directory=directory)
+    if not os.path.exists(int8_path):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        print(f"Quantizing '{model_name}' to int8...")
+        tmp_path = f"{int8_path}.tmp"
+        quantize_dynamic(fp32_path, tmp_path, weight_type=QuantType.QInt8)
+        os.replace(tmp_path, int8_path)
+    return int8_path
+
+class OnnxEncoder:
+    """
+    Transformer encoder run by ONNX Runtime on CPU, producing mean-pooled token embeddings.
+
+    The model is exported (and quantized) on first use and cached under `directory`; after that
+    only onnxruntime and the tokenizer are needed.
+
+    Args:
+        model_name (str): HuggingFace model name.
+        quantize (bool): Run the dynamically int8-quantized model.
+        intra_op_threads (int): Threads used within one operator. All cores if None.
+        inter_op_threads (int): Threads used across independent operators.
+        directory (str): Folder of the exported models.
+    """
+
+    def __init__(self, model_name, quantize=None, intra_op_threads=None, inter_op_threads=None, directory=None):
+        self.model_name = model_name
+        self.quantize = encoder_settings["quantize"] if quantize is None else quantize
+        self.intra_op_threads = intra_op_threads or encoder_settings["intra_op_threads"]
+        self.inter_op_threads = inter_op_threads or encoder_settings["inter_op_threads"]
+        self.directory = directory or encoder_settings["directory"]
+        self._session = None
+        self._tokenizer = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        """
+        Export the model if needed and open the inference session on first use.
+        """
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    import onnxruntime as ort
+
+                    path = export_onnx(self.model_name, quantize=self.quantize, directory=self.directory)
+                    options = ort.SessionOptions()
+                    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+                    if self.intra_op_threads:
+                        options.intra_op_num_threads = self.intra_op_threads
+                    if self.inter_op_threads:
+                        options.inter_op_num_threads = self.inter_op_threads
+                        options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+                    self._session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        return self._session
+
+    @property
+    def tokenizer(self):
+        if self._tokenizer is None:
+            with self._lock:
+                if self._tokenizer is None:
+                    from transformers import AutoTokenizer
+
+                    self._tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        return self._tokenizer
+
+    @property
+    def dimension(self):
+        return self.session.get_outputs()[0].shape[-1]
+
+    def embed(self, texts, max_length=512, normalize=False):
+        """
+        Tokenize and encode texts in one padded batch.
+
+        Returns:
+            np.ndarray: float32 array of shape (len(texts), dimension).
+        """
+        inputs = self.tokenizer(list(texts), padding=True, truncation=True, max_length=max_length, return_tensors="np")
+        return self._run(inputs["input_ids"], inputs["attention_mask"], normalize)
+
+    def embed_token_ids(self, inputs, normalize=False):
+        """
+        Encode texts already tokenized, special tokens included, in one padded batch.
+
+        Returns:
+            np.ndarray: float32 array of shape (len(inputs), dimension).
+        """
+        input_ids = np.full((len(inputs), max(len(ids) for ids in inputs)), self.tokenizer.pad_token_id, dtype=np.int64)
+        attention_mask = np.zeros_like(input_ids)
+        for row, ids in enumerate(inputs):
+            input_ids[row, :len(ids)] = ids
+            attention_mask[row, :len(ids)] = 1
+        return self._run(input_ids, attention_mask, normalize)
+
+    def _run(self, input_ids, attention_mask, normalize):
+        feeds = {"input_ids": input_ids.astype(np.int64), "attention_mask": attention_mask.astype(np.int64)}
+        if "token_type_ids" in {model_input.name for model_input in self.session.get_inputs()}:
+            feeds["token_type_ids"] = np.zeros_like(feeds["input_ids"])
+        hidden = self.session.run(["last_hidden_state"], feeds)[0]
+
+        # Mean pooling over real (non-padding) tokens, as sentence-transformers and `compute_similarity` do
+        mask = attention_mask[..., None].astype(np.float32)
+        embeddings = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        if normalize:
+            embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        return embeddings.astype(np.float32, copy=False)
@@ -0,0 +1,100 @@
+import threading
+from chunking.embedding_engine import DEFAULT_MODEL_NAME
+
+class TokenChunker:
+    """
+    Split texts into chunks measured in the embedding model's tokens.
+
+    Each text is tokenized once, with character offsets, in a single batched call. Texts that fit
+    in one chunk (most field-only documents) are emitted whole; longer texts are cut into windows of
+    `chunk_tokens` tokens that overlap by `overlap_tokens`, ending at a line break where one falls
+    in the second half of the window. Every chunk carries the token ids of its text, so the encoder
+    can skip tokenizing it again (`EmbeddingEngine.embed_token_ids`).
+
+    Args:
+        model_name (str): HuggingFace model whose (fast) tokenizer sizes the chunks.
+        chunk_tokens (int): Maximum tokens per chunk, excluding the special tokens the encoder adds.
+        overlap_tokens (int): Tokens shared by consecutive chunks of a text.
+    """
+
+    def __init__(self, model_name=DEFAULT_MODEL_NAME, chunk_tokens=254, overlap_tokens=32):
+        if overlap_tokens >= chunk_tokens:
+            raise ValueError("overlap_tokens must be smaller than chunk_tokens.")
+        self.model_name = model_name
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        self._tokenizer = None
+        self._lock = threading.Lock()
+
+    @property
+    def tokenizer(self):
+        """
+        Load the tokenizer on first use.
+        """
+        if self._tokenizer is None:
+            with self._lock:
+                if self._tokenizer is None:
+                    from transformers import AutoTokenizer
+
+                    self._tokenizer = AutoTokenizer.from_pretrained(self.model_name, use_fast=True)
+        return self._tokenizer
+
+    def split(self, texts):
+        """
+        Split texts into token-bounded chunks.
+
+        Args:
+            texts (list): Texts to split.
+
+        Returns:
+            list: For each text, a list of (chunk text, token ids) tuples.
+        """
+        if not texts:
+            return []
+        encoded = self.tokenizer(
+            list(texts),
+            add_special_tokens=False,
+            return_offsets_mapping=True,
+            return_attention_mask=False,
+            return_token_type_ids=False,
+        )
+        return [
+            self._windows(text, ids, offsets)
+            for text, ids, offsets in zip(texts, encoded["input_ids"], encoded["offset_mapping"])
+        ]
+
+    def _windows(self, text, ids, offsets):
+        # Fast path: the whole text fits in one chunk
+        if len(ids) <= self.chunk_tokens:
+            return [(text.strip(), ids)] if ids else []
+
+        chunks = []
+        start = 0
+        while start < len(ids):
+            end = min(start + self.chunk_tokens, len(ids))
+            if end < len(ids):
+                # Prefer to end before a token that starts a new line
+                for i in range(end, start + self.chunk_tokens // 2, -1):
+                    if "\n" in text[offsets[i - 1][1]:offsets[i][0]]:
+                        end = i
+                        break
+            chunks.append((text[offsets[start][0]:offsets[end - 1][1]], ids[start:end]))
+            if end == len(ids):
+                break
+            start = max(end - self.overlap_tokens, start + 1)
+        return chunks
+
+_chunkers = {}
+_chunkers_lock = threading.Lock()
+
+def get_token_chunker(model_name=DEFAULT_MODEL_NAME, chunk_tokens=254, overlap_tokens=32):
+    """
+    Return the shared TokenChunker for a model and chunk size, creating it on first use.
+    """
+    key = (model_name, chunk_tokens, overlap_tokens)
+    with _chunkers_lock:
+        chunker = _chunkers.get(key)
+        if chunker is None:
+            chunker = TokenChunker(model_name, chunk_tokens=chunk_tokens, overlap_tokens=overlap_tokens)
+            _chunkers[key] = chunker
+        return chunker
@@ -0,0 +1,132 @@
+import numpy as np
+from chunking.embedding_cache import normalize_text
+from comparison.similarity import similarity_matrix
+
+UNCHANGED = "unchanged"
+MODIFIED = "modified"
+ADDED = "added"
+REMOVED = "removed"
+
+def _chunk_text(chunk):
+    return chunk["chunk"] if isinstance(chunk, dict) else chunk
+
+def match_optimal(matrix):
+    """
+    Maximum-total-similarity one-to-one matching (Hungarian algorithm).
+
+    Falls back to greedy matching when scipy is not installed.
+
+    Returns:
+        list: (row, column) index pairs.
+    """
+    try:
+        from scipy.optimize import linear_sum_assignment
+    except ImportError:
+        return match_greedy(matrix)
+    rows, cols = linear_sum_assignment(-matrix)
+    return list(zip(rows.tolist(), cols.tolist()))
+
+def match_greedy(matrix):
+    """
+    Greedy one-to-one matching: repeatedly take the most similar pair whose chunks are both unmatched.
+
+    Returns:
+        list: (row, column) index pairs.
+    """
+    order = np.argsort(matrix, axis=None)[::-1]
+    used_rows, used_cols, pairs = set(), set(), []
+    for flat in order:
+        row, col = divmod(int(flat), matrix.shape[1])
+        if row in used_rows or col in used_cols:
+            continue
+        pairs.append((row, col))
+        used_rows.add(row)
+        used_cols.add(col)
+        if len(pairs) == min(matrix.shape):
+            break
+    return pairs
+
+def align_chunks(chunks1, chunks2, match_threshold=0.75, unchanged_threshold=0.99, method="optimal", matrix=None):
+    """
+    Align the chunks of two documents by embedding similarity and classify every pair.
+
+    Matched pairs whose normalized text is identical, or whose similarity reaches
+    `unchanged_threshold`, are "unchanged"; other matches above `match_threshold` are "modified".
+    Unmatched chunks of the first document are "removed" and those of the second are "added".
+
+    Args:
+        chunks1 (list): Chunks of the first document.
+        chunks2 (list): Chunks of the second document.
+        match_threshold (float): Minimum similarity for two chunks to be considered the same section.
+        unchanged_threshold (float): Similarity at which a matched pair is considered unchanged.
+        method (str): "optimal" (Hungarian) or "greedy" matching.
+        matrix (np.ndarray): Precomputed similarity matrix, computed if None.
+
+    Returns:
+        list: Dictionaries with "status", "doc1", "doc2" (chunk or None) and "score", in document order.
+    """
+    if matrix is None:
+        matrix = similarity_matrix(chunks1, chunks2)
+
+    pairs = []
+    if matrix.size:
+        pairs = match_optimal(matrix) if method == "optimal" else match_greedy(matrix)
+
+    ordered = []
+    matched1, matched2 = set(), set()
+    for i, j in pairs:
+        score = float(matrix[i, j])
+        if score < match_threshold:
+            continue
+        same_text = normalize_text(_chunk_text(chunks1[i])) == normalize_text(_chunk_text(chunks2[j]))
+        status = UNCHANGED if same_text or score >= unchanged_threshold else MODIFIED
+        ordered.append(((i, j), {"status": status, "doc1": chunks1[i], "doc2": chunks2[j], "score": score}))
+        matched1.add(i)
+        matched2.add(j)
+
+    for i, chunk in enumerate(chunks1):
+        if i not in matched1:
+            ordered.append(((i, len(chunks2)), {"status": REMOVED, "doc1": chunk, "doc2": None, "score": None}))
+    for j, chunk in enumerate(chunks2):
+        if j not in matched2:
+            ordered.append(((len(chunks1), j), {"status": ADDED, "doc1": None, "doc2": chunk, "score": None}))
+
+    # Keep the report in document order: by position in document 1, then document 2
+    ordered.sort(key=lambda entry: entry[0])
+    alignment = [item for _, item in ordered]
+    return alignment
+
+def align_fields(fields1, fields2):
+    """
+    Align the Document Intelligence fields of two documents by field name and classify each field.
+
+    Args:
+        fields1 (dict): Field name -> {"value", "confidence"} for the first document.
+        fields2 (dict): Field name -> {"value", "confidence"} for the second document.
+
+    Returns:
+        list: Dictionaries with "field", "status", "value1" and "value2".
+    """
+    alignment = []
+    for name in list(fields1) + [name for name in fields2 if name not in fields1]:
+        value1 = (fields1.get(name) or {}).get("value")
+        value2 = (fields2.get(name) or {}).get("value")
+        if name not in fields2:
+            status = REMOVED
+        elif name not in fields1:
+            status = ADDED
+        elif normalize_text(str(value1 or "")) == normalize_text(str(value2 or "")):
+            status = UNCHANGED
+        else:
+            status = MODIFIED
+        alignment.append({"field": name, "status": status, "value1": value1, "value2": value2})
+    return alignment
+
+def summarize_alignment(alignment):
+    """
+    Count the aligned items per status.
+    """
+    counts = {UNCHANGED: 0, MODIFIED: 0, ADDED: 0, REMOVED: 0}
+    for item in alignment:
+        counts[item["status"]] += 1
+    return counts
@@ -0,0 +1,410 @@
+import csv
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from comparison.alignment import align_chunks, summarize_alignment, UNCHANGED, MODIFIED, ADDED, REMOVED
+from comparison.field_comparator import compare_field_pairs, field_kind, normalize_name, parse_year, NAME, YEAR
+from comparison.similarity import document_similarity, normalize_rows
+from comparison.generation import generate_batch
+from retrieve_chunks_and_compare import (
+    build_comparison_prompt, comparison_key, format_report, COMPARISON_INSTRUCTIONS, PROMPT_VERSION
+)
+from telemetry import telemetry
+
+DEFAULT_QUERY = "Compare the renewed insurance policy with last year's version."
+
+# Documents analyzed with Document Intelligence; `.json` files hold already analyzed documents
+SUPPORTED_EXTENSIONS = {".pdf", ".jpg", ".jpeg", ".png", ".tif", ".tiff", ".bmp"}
+
+def as_fields(values):
+    """
+    Wrap plain field values (e.g. the generator's ground-truth JSON) as Document Intelligence fields.
+    """
+    return {
+        name: value if isinstance(value, dict) else {"value": value, "confidence": 1.0}
+        for name, value in values.items()
+    }
+
+def load_document(path, model_id=None, training_folder_path=None, use_json_sidecars=False):
+    """
+    Load the fields of one document.
+
+    `.json` files hold an analyzed document ({"fields": ...}) or a list of them. Other files are
+    analyzed with Document Intelligence, through the analysis cache, unless `use_json_sidecars` is
+    set and a `.json` file with the same stem exists next to them. When a file holds several
+    documents, their fields are merged.
+
+    Returns:
+        dict: {"source": path, "fields": {...}}, or None if the file holds no fields.
+    """
+    sidecar = os.path.splitext(path)[0] + ".json"
+    if use_json_sidecars and os.path.exists(sidecar):
+        path_to_read = sidecar
+    else:
+        path_to_read = path
+
+    if path_to_read.endswith(".json"):
+        with open(path_to_read) as f:
+            payload = json.load(f)
+        documents = payload if isinstance(payload, list) else [payload]
+    else:
+        from get_custom_text.analyze_custom_doc_main import main as analyze_documents
+
+        documents = analyze_documents(path_to_read, model_id, training_folder_path)
+
+    fields = {}
+    for doc in documents:
+        fields.update(as_fields(doc.get("fields") or {}))
+    return {"source": path, "fields": fields} if fields else None
+
+def list_documents(path, use_json_sidecars=False):
+    """
+    Return the documents in a folder: its `.json` documents when using sidecars, else the files to analyze.
+    """
+    extensions = {".json"} if use_json_sidecars else SUPPORTED_EXTENSIONS
+    return sorted(
+        os.path.join(root, name)
+        for root, _, names in os.walk(path)
+        for name in names
+        if os.path.splitext(name)[1].lower() in extensions and name != "pairs.jsonl"
+    )
+
+def read_pairing_spec(path):
+    """
+    Read a pairing spec: one JSON object per line with "doc1" and "doc2" (or "prior" and "renewal",
+    as in the generator's `pairs.jsonl`) and optionally "pair_id". Relative paths are resolved
+    against the spec's folder.
+
+    Returns:
+        list: {"pair_id", "doc1", "doc2"} dictionaries.
+    """
+    base = os.path.dirname(os.path.abspath(path))
+    pairs = []
+    with open(path) as f:
+        for number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            doc1 = record.get("doc1", record.get("prior"))
+            doc2 = record.get("doc2", record.get("renewal"))
+            if doc1 is None or doc2 is None:
+                raise ValueError(f"{path}:{number}: a pair needs 'doc1' and 'doc2' (or 'prior' and 'renewal').")
+            pairs.append({
+                "pair_id": str(record.get("pair_id", number)),
+                "doc1": os.path.join(base, doc1),
+                "doc2": os.path.join(base, doc2),
+            })
+    return pairs
+
+def _find_field(fields, kind, hint=None, name=None):
+    """
+    Return the name of the field `name` if present, else of the first field of `kind` (with `hint` in its name).
+    """
+    if name is not None:
+        return name if name in fields else None
+    for field_name, field in fields.items():
+        if (hint is None or hint in field_name) and field_kind(field_name, [field.get("value")]) == kind:
+            return field_name
+    return None
+
+def pairing_fields(fields, name_field=None, year_field=None):
+    """
+    Return the names of the fields that identify a policy across renewals, as used by `auto_pair`:
+    the insured name and the policy year. A renewal differs in year by design, so these are not
+    counted as changes.
+    """
+    keys = (_find_field(fields, NAME, hint="name", name=name_field), _find_field(fields, YEAR, name=year_field))
+    return {key for key in keys if key is not None}
+
+def auto_pair(documents, name_field=None, year_field=None):
+    """
+    Pair every document with the same insured's document from the previous year.
+
+    Documents are grouped by normalized insured name (the first name-like field with "name" in
+    its name, unless `name_field` is given) and policy year (the first year field, unless
+    `year_field` is given). Names with more than one document in the same year are ambiguous and
+    left unpaired.
+
+    Args:
+        documents (dict): Document id -> document with "fields".
+
+    Returns:
+        tuple: The {"pair_id", "doc1", "doc2"} pairs (last year first) and the unpaired document ids.
+    """
+    groups = {}
+    unpaired = []
+    for doc_id, doc in documents.items():
+        fields = doc["fields"]
+        name = _find_field(fields, NAME, hint="name", name=name_field)
+        name = fields[name].get("value") if name is not None else None
+        year = _find_field(fields, YEAR, name=year_field)
+        year = parse_year(fields[year].get("value")) if year is not None else None
+        if name is None or year is None:
+            unpaired.append(doc_id)
+            continue
+        groups.setdefault(normalize_name(name), {}).setdefault(year, []).append(doc_id)
+
+    pairs = []
+    for name, by_year in groups.items():
+        paired = set()
+        for year, doc_ids in sorted(by_year.items()):
+            previous = by_year.get(year - 1)
+            if previous and len(previous) == 1 and len(doc_ids) == 1:
+                pairs.append({"pair_id": f"{name}-{year}", "doc1": previous[0], "doc2": doc_ids[0]})
+                paired.update((previous[0], doc_ids[0]))
+        unpaired.extend(doc_id for doc_ids in by_year.values() for doc_id in doc_ids if doc_id not in paired)
+    return pairs, unpaired
+
+def report_path(output_dir, pair_id):
+    return os.path.join(output_dir, "reports", re.sub(r"[^A-Za-z0-9_.-]", "_", str(pair_id)) + ".json")
+
+def _is_current(path, settings_key):
+    """
+    Return True if the report at `path` exists and was produced with the settings identified by
+    `settings_key` (query, LLM use and models, comparison, chunker and prompt settings).
+    """
+    if not os.path.exists(path):
+        return False
+    try:
+        with open(path) as f:
+            report = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return report.get("settings_key") == settings_key
+
+def _write_json(path, payload):
+    # Write then rename, so an interrupted run never leaves a truncated report behind
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(payload, f, indent=2, default=str)
+    os.replace(tmp_path, path)
+
+class _DocumentPool:
+    """
+    Documents of the remaining pairs, each loaded (and chunked and embedded) at most once and
+    released after its last pair.
+    """
+
+    def __init__(self, pairs, load, workers):
+        self.load = load
+        self.workers = workers
+        self.documents = {}
+        self.references = {}
+        for pair in pairs:
+            for doc_id in (pair["doc1"], pair["doc2"]):
+                self.references[doc_id] = self.references.get(doc_id, 0) + 1
+
+    def fetch(self, doc_ids):
+        missing = list(dict.fromkeys(doc_id for doc_id in doc_ids if doc_id not in self.documents))
+        if missing:
+            with telemetry.span("batch.load", documents=len(missing)):
+                with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                    for doc_id, doc in zip(missing, executor.map(self._load, missing)):
+                        self.documents[doc_id] = doc
+        return [self.documents[doc_id] for doc_id in doc_ids]
+
+    def _load(self, doc_id):
+        try:
+            return self.load(doc_id)
+        except Exception as error:
+            print(f"Could not load {doc_id}: {type(error).__name__}: {error}")
+            telemetry.increment("batch.load_errors")
+            return None
+
+    def embed(self, doc_ids):
+        """
+        Chunk and embed, in one batch, the documents among `doc_ids` that have not been embedded yet.
+        """
+        pending = [doc_id for doc_id in dict.fromkeys(doc_ids)
+                   if self.documents[doc_id] is not None and "chunks" not in self.documents[doc_id]]
+        if not pending:
+            return
+        from chunking.chunk_and_embed import split_documents, embed_chunks
+
+        chunks = embed_chunks(split_documents([
+            {"source_id": doc_id, "fields": self.documents[doc_id]["fields"]} for doc_id in pending
+        ]))
+        for doc_id in pending:
+            self.documents[doc_id]["chunks"] = []
+        for chunk in chunks:
+            self.documents[chunk["document_index"]]["chunks"].append(chunk)
+        for doc_id in pending:
+            doc = self.documents[doc_id]
+            embeddings = [chunk["embedding"] for chunk in doc["chunks"]]
+            doc["normalized"] = normalize_rows(np.asarray(embeddings, dtype=np.float32))
+
+    def release(self, doc_ids):
+        for doc_id in doc_ids:
+            self.references[doc_id] -= 1
+            if self.references[doc_id] == 0:
+                del self.references[doc_id]
+                self.documents.pop(doc_id, None)
+
+def batch_compare(pairs, load, output_dir, query=DEFAULT_QUERY, use_llm=True, structured_fields=True,
+                  min_confidence=0.8, batch_size=256, generation_batch_size=8, load_workers=8, overwrite=False):
+    """
+    Compare many document pairs, e.g. every renewed policy with last year's version.
+
+    Pairs are processed `batch_size` at a time. Within a batch, documents are loaded concurrently,
+    typed fields of all pairs are compared in one vectorized call and, without `structured_fields`,
+    the documents are chunked and embedded together and their chunks aligned. The LLM prompts of all
+    pairs are generated in batches, identical prompts once. A document shared by several pairs is
+    loaded and embedded once.
+
+    Each pair's report is written to `<output_dir>/reports/<pair_id>.json` as soon as its batch
+    finishes. Pairs with a report produced with the same settings (query, `use_llm`,
+    `structured_fields`, `min_confidence`, models, chunker and prompt version) are skipped, so an
+    interrupted run resumes where it stopped and pairs whose documents could not be loaded are
+    retried. `summary.json` and `summary.csv` are rebuilt from all reports at the end. Changes to the
+    fields identifying a policy across renewals (`pairing_fields`) are reported separately and
+    not counted in "fields_changed".
+
+    Args:
+        pairs (list): {"pair_id", "doc1", "doc2"} dictionaries.
+        load (callable): Maps a document id to {"fields": ...}, or None if it cannot be compared.
+        output_dir (str): Folder of the per-pair reports and the summary.
+        query (str): The comparison request, used in the LLM prompts.
+        use_llm (bool): Explain modified sections and free-text or low-confidence field changes with LLaMA.
+        structured_fields (bool): Compare documents with fields by their fields only.
+        min_confidence (float): Field confidence below which a change is left to the LLM.
+        batch_size (int): Pairs compared together.
+        generation_batch_size (int): Prompts generated per forward pass.
+        load_workers (int): Documents loaded (analyzed) concurrently.
+        overwrite (bool): Compare pairs that already have a report again.
+
+    Returns:
+        dict: The summary.
+    """
+    os.makedirs(os.path.join(output_dir, "reports"), exist_ok=True)
+    # The settings part of the report cache key; the documents are identified by the pair
+    settings_key = comparison_key(None, None, query, use_llm, structured_fields, min_confidence)
+    todo = [pair for pair in pairs
+            if overwrite or not _is_current(report_path(output_dir, pair["pair_id"]), settings_key)]
+    print(f"{len(pairs) - len(todo)} of {len(pairs)} pairs already compared, {len(todo)} to go.")
+    pool = _DocumentPool(todo, load, load_workers)
+    start_time = time.perf_counter()
+
+    for start in range(0, len(todo), batch_size):
+        batch = todo[start:start + batch_size]
+        with telemetry.span("batch.compare", pairs=len(batch)):
+            documents = pool.fetch([doc_id for pair in batch for doc_id in (pair["doc1"], pair["doc2"])])
+            docs1, docs2 = documents[0::2], documents[1::2]
+            comparable = [i for i, (doc1, doc2) in enumerate(zip(docs1, docs2)) if doc1 and doc2]
+
+            # Typed fields of every pair in one vectorized comparison
+            with telemetry.span("compare_fields", pairs=len(comparable)):
+                field_comparisons = compare_field_pairs(
+                    [(docs1[i]["fields"], docs2[i]["fields"]) for i in comparable], min_confidence)
+            field_comparisons = dict(zip(comparable, field_comparisons))
+
+            # Chunk similarity for pairs not compared by their fields alone, each document embedded once
+            chunked = set() if structured_fields else set(comparable)
+            pool.embed([doc_id for i in chunked for doc_id in (batch[i]["doc1"], batch[i]["doc2"])])
+            results = {}
+            for i in comparable:
+                result = {"fields": field_comparisons[i], "alignment": None, "similarity": None}
+                if i in chunked:
+                    doc1, doc2 = docs1[i], docs2[i]
+                    matrix = doc1["normalized"] @ doc2["normalized"].T
+                    result["similarity"] = document_similarity(matrix)
+                    result["alignment"] = align_chunks(doc1["chunks"], doc2["chunks"], matrix=matrix)
+                result["report"] = format_report(result["fields"], result["alignment"], result["similarity"],
+                                                 min_confidence)
+                results[i] = result
+
+            # Only modified sections and free-text or low-confidence field changes go to the LLM
+            prompts = {}
+            if use_llm:
+                for i, result in results.items():
+                    modified_pairs = [item for item in result["alignment"] or [] if item["status"] == MODIFIED]
+                    llm_field_changes = [item for item in result["fields"]
+                                         if item["status"] != UNCHANGED and item["needs_llm"]]
+                    if modified_pairs or llm_field_changes:
+                        prompts[i] = build_comparison_prompt(query, modified_pairs, llm_field_changes)
+            if prompts:
+                unique_prompts = list(dict.fromkeys(prompts.values()))
+                completions = dict(zip(unique_prompts, generate_batch(
+                    unique_prompts, prefix=COMPARISON_INSTRUCTIONS, batch_size=generation_batch_size)))
+                for i, prompt in prompts.items():
+                    results[i]["report"] += f"Analysis:\n{completions[prompt]}\n"
+
+            for i, result in results.items():
+                pair = batch[i]
+                keys = pairing_fields(docs1[i]["fields"]) | pairing_fields(docs2[i]["fields"])
+                fields = [item for item in result["fields"] if item["field"] not in keys]
+                counts = summarize_alignment(fields)
+                _write_json(report_path(output_dir, pair["pair_id"]), {
+                    "pair_id": pair["pair_id"],
+                    "doc1": pair["doc1"],
+                    "doc2": pair["doc2"],
+                    "query": query,
+                    "prompt_version": PROMPT_VERSION,
+                    "settings_key": settings_key,
+                    "similarity": result["similarity"],
+                    "fields_changed": counts[MODIFIED] + counts[ADDED] + counts[REMOVED],
+                    "used_llm": i in prompts,
+                    "field_changes": [item for item in fields if item["status"] != UNCHANGED],
+                    "pairing_field_changes": [item for item in result["fields"]
+                                              if item["field"] in keys and item["status"] != UNCHANGED],
+                    "report": result["report"],
+                })
+            pool.release([doc_id for pair in batch for doc_id in (pair["doc1"], pair["doc2"])])
+        telemetry.increment("batch.pairs_compared", len(results))
+        telemetry.increment("batch.pairs_failed", len(batch) - len(results))
+        done = start + len(batch)
+        elapsed = time.perf_counter() - start_time
+        print(f"{done}/{len(todo)} pairs compared ({done / elapsed:.1f} pairs/s)")
+
+    return write_summary(pairs, output_dir)
+
+def write_summary(pairs, output_dir):
+    """
+    Summarize the reports of all pairs into `summary.json` (totals and per-field change statistics)
+    and `summary.csv` (one row per pair).
+
+    Returns:
+        dict: The summary.
+    """
+    rows = []
+    field_stats = {}
+    for pair in pairs:
+        path = report_path(output_dir, pair["pair_id"])
+        if not os.path.exists(path):
+            rows.append({"pair_id": pair["pair_id"], "doc1": pair["doc1"], "doc2": pair["doc2"], "status": "missing"})
+            continue
+        with open(path) as f:
+            report = json.load(f)
+        rows.append({key: report[key] for key in ("pair_id", "doc1", "doc2", "similarity", "fields_changed", "used_llm")})
+        rows[-1]["status"] = "compared"
+        rows[-1]["changed"] = ", ".join(item["field"] for item in report["field_changes"])
+        for item in report["field_changes"]:
+            stats = field_stats.setdefault(item["field"], {"changed": 0, "pct_changes": []})
+            stats["changed"] += 1
+            if item["pct_change"] is not None:
+                stats["pct_changes"].append(item["pct_change"])
+
+    statuses = [row["status"] for row in rows]
+    summary = {
+        "pairs": len(rows),
+        "compared": statuses.count("compared"),
+        "missing": statuses.count("missing"),
+        "with_changes": sum(1 for row in rows if row.get("fields_changed")),
+        "used_llm": sum(1 for row in rows if row.get("used_llm")),
+        "fields": {
+            name: {
+                "changed": stats["changed"],
+                "mean_pct_change": sum(stats["pct_changes"]) / len(stats["pct_changes"]) if stats["pct_changes"] else None,
+            }
+            for name, stats in sorted(field_stats.items())
+        },
+    }
+    _write_json(os.path.join(output_dir, "summary.json"), summary)
+    columns = ["pair_id", "doc1", "doc2", "status", "similarity", "fields_changed", "changed", "used_llm"]
+    with open(os.path.join(output_dir, "summary.csv"), "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=columns, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+    return summary
@@ -0,0 +1,148 @@
+from comparison.generation import count_tokens, truncate_tokens
+from comparison.similarity import chunk_embeddings, normalize_rows
+from telemetry import telemetry
+
+SIDES = ("doc1", "doc2")
+
+# Shortest remainder of a document's budget worth filling with a truncated section
+MIN_TRUNCATED_TOKENS = 16
+TRUNCATION_MARK = " [...]"
+
+packer_settings = {
+    "token_budget": 1024,  # Prompt tokens for the chunk text of both documents, split evenly; no limit if None
+    "near_duplicate_threshold": 0.95,  # Cosine similarity above which a chunk repeats one already packed
+    "min_overlap": 20,  # Shortest shared span, in characters, removed between chunks of a document
+}
+
+def configure_context_packer(**settings):
+    """
+    Override the context packer settings (token_budget, near_duplicate_threshold, min_overlap),
+    e.g. from config.yaml.
+    """
+    for key, value in settings.items():
+        if value is None:
+            continue
+        if key not in packer_settings:
+            raise ValueError(f"Unknown context packer setting '{key}'.")
+        packer_settings[key] = value
+
+def _chunk_text(chunk):
+    return chunk["chunk"] if isinstance(chunk, dict) else chunk
+
+def overlap_length(first, second, min_overlap):
+    """
+    Length of the longest suffix of `first` that is also a prefix of `second`, or 0 if shorter than `min_overlap`.
+    """
+    for length in range(min(len(first), len(second)), min_overlap - 1, -1):
+        if first.endswith(second[:length]):
+            return length
+    return 0
+
+def strip_overlaps(text, packed, min_overlap):
+    """
+    Remove from `text` the spans it shares with the start or end of already packed texts, as
+    produced by the splitter's chunk overlap.
+    """
+    for other in packed:
+        length = overlap_length(other, text, min_overlap)
+        if length:
+            text = text[length:]
+        length = overlap_length(text, other, min_overlap)
+        if length:
+            text = text[:-length]
+    return text.strip()
+
+def pack_context(pairs, token_budget=None, near_duplicate_threshold=None, min_overlap=None):
+    """
+    Choose the chunk text of the modified section pairs that goes into the comparison prompt.
+
+    Sections are taken most changed first (lowest alignment score). Within each document, a chunk
+    nearly identical to one already packed (cosine similarity at or above
+    `near_duplicate_threshold`, or contained in it) is replaced by a reference to that section,
+    and spans it shares with packed chunks through the splitter's overlap are removed. Each
+    document gets half of `token_budget` (counted with the LLaMA tokenizer). A section that does
+    not fit is truncated to the remaining budget, marked with "[...]"; once less than
+    `MIN_TRUNCATED_TOKENS` remain for a document, the remaining sections are left out.
+
+    Args:
+        pairs (list): Modified aligned pairs with "doc1", "doc2" (chunk dicts or strings) and "score".
+        token_budget (int): Tokens for the chunk text of both documents. Defaults to the configured budget.
+        near_duplicate_threshold (float): Defaults to the configured threshold.
+        min_overlap (int): Defaults to the configured minimum overlap.
+
+    Returns:
+        tuple: The packed sections, each a dict with "doc1" and "doc2" holding the text or, for a
+        near-duplicate, the number of the section it repeats; and statistics with "tokens_before",
+        "tokens_after", "tokens_saved" (removed as overlap or near-duplicates), "tokens_over_budget"
+        (cut by truncation or left out), "near_duplicates", "truncated" and "over_budget" (sections
+        left out). tokens_before = tokens_after + tokens_saved + tokens_over_budget.
+    """
+    token_budget = token_budget if token_budget is not None else packer_settings["token_budget"]
+    threshold = near_duplicate_threshold if near_duplicate_threshold is not None \
+        else packer_settings["near_duplicate_threshold"]
+    min_overlap = min_overlap if min_overlap is not None else packer_settings["min_overlap"]
+
+    texts = {side: [_chunk_text(pair[side]) for pair in pairs] for side in SIDES}
+    all_costs = count_tokens(texts["doc1"] + texts["doc2"])
+    original_costs = {"doc1": all_costs[:len(pairs)], "doc2": all_costs[len(pairs):]}
+    stats = {"tokens_before": sum(all_costs), "tokens_after": 0,
+             "tokens_saved": 0, "tokens_over_budget": 0, "near_duplicates": 0, "truncated": 0, "over_budget": 0}
+    embeddings = {}
+    if threshold is not None and len(pairs) > 1:
+        embeddings = {side: normalize_rows(chunk_embeddings([pair[side] for pair in pairs])) for side in SIDES}
+
+    side_budget = token_budget // 2 if token_budget else None
+    used = {side: 0 for side in SIDES}
+    packed = {side: [] for side in SIDES}  # (pair index, section number) of the chunks packed so far
+    sections = []
+    with telemetry.span("context.pack", sections=len(pairs)):
+        for i in sorted(range(len(pairs)), key=lambda i: pairs[i].get("score", 0.0)):
+            section, costs = {}, {}
+            for side in SIDES:
+                text = texts[side][i]
+                duplicate = None
+                for j, number in packed[side]:
+                    if text in texts[side][j] or (embeddings and float(embeddings[side][i] @ embeddings[side][j]) >= threshold):
+                        duplicate = number
+                        break
+                if duplicate is not None:
+                    section[side], costs[side] = duplicate, 0
+                else:
+                    section[side] = strip_overlaps(text, [texts[side][j] for j, _ in packed[side]], min_overlap)
+                    costs[side] = count_tokens([section[side]])[0]
+
+            for side in SIDES:
+                stats["tokens_saved"] += original_costs[side][i] - costs[side]
+
+            over = side_budget is not None and any(used[side] + costs[side] > side_budget for side in SIDES)
+            if over and any(used[side] + costs[side] > side_budget and side_budget - used[side] < MIN_TRUNCATED_TOKENS
+                            for side in SIDES):
+                # A document's budget is spent: leave the section out
+                stats["over_budget"] += 1
+                stats["tokens_over_budget"] += costs["doc1"] + costs["doc2"]
+                continue
+            if over:
+                stats["truncated"] += 1
+                for side in SIDES:
+                    remaining = side_budget - used[side]
+                    if costs[side] > remaining:
+                        text = truncate_tokens(section[side], remaining - count_tokens([TRUNCATION_MARK])[0])
+                        section[side] = text + TRUNCATION_MARK
+                        truncated_cost = count_tokens([section[side]])[0]
+                        stats["tokens_over_budget"] += costs[side] - truncated_cost
+                        costs[side] = truncated_cost
+
+            number = len(sections) + 1
+            for side in SIDES:
+                used[side] += costs[side]
+                if isinstance(section[side], int):
+                    stats["near_duplicates"] += 1
+                else:
+                    packed[side].append((i, number))
+            sections.append(section)
+
+    stats["tokens_after"] = used["doc1"] + used["doc2"]
+    telemetry.increment("prompt.tokens_saved", stats["tokens_saved"])
+    telemetry.increment("prompt.tokens_over_budget", stats["tokens_over_budget"])
+    telemetry.increment("prompt.sections_truncated", stats["truncated"])
+    return sections, stats
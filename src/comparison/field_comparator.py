@@ -0,0 +1,215 @@
+import re
+from datetime import datetime
+import numpy as np
+from chunking.embedding_cache import normalize_text
+from comparison.alignment import UNCHANGED, MODIFIED, ADDED, REMOVED
+
+# Field kinds
+MONEY = "money"
+COUNT = "count"
+YEAR = "year"
+DATE = "date"
+NAME = "name"
+IDENTIFIER = "identifier"
+TEXT = "text"
+
+NUMERIC_KINDS = (MONEY, COUNT, YEAR, DATE)
+
+# Field-name hints, matched against whole words of a field name (or their plural with a trailing
+# "s"). The last word with a match decides, as it names what the field holds ("coverage_limit" is
+# money, "policy_number" an identifier, "number_of_accidents" a count).
+NAME_HINTS = [
+    (IDENTIFIER, ("number", "id", "identifier", "reference")),
+    (YEAR, ("year",)),
+    (DATE, ("date", "effective", "expiration", "expiry", "expires")),
+    (MONEY, ("premium", "deductible", "amount", "cost", "price", "fee", "limit", "total", "payment")),
+    (COUNT, ("accident", "claim", "count", "num")),
+    (NAME, ("name", "carrier", "insurer", "company", "insured", "agent")),
+    (TEXT, ("address", "description", "note", "comment", "term", "condition", "coverage")),
+]
+
+DATE_FORMATS = ("%Y-%m-%d", "%m/%d/%Y", "%m/%d/%y", "%d.%m.%Y", "%B %d, %Y", "%b %d, %Y", "%d %B %Y", "%d %b %Y")
+
+_MONEY_RE = re.compile(r"\(?\s*-?\s*(?:[$€£]|USD|EUR|GBP)?\s*-?\d[\d,]*(?:\.\d+)?\s*(?:USD|EUR|GBP)?\s*\)?", re.IGNORECASE)
+_CURRENCY_RE = re.compile(r"[$€£]|USD|EUR|GBP", re.IGNORECASE)
+_COUNT_RE = re.compile(r"-?\d[\d,]*")
+_YEAR_RE = re.compile(r"(?:19|20)\d{2}")
+
+def parse_money(value):
+    """
+    Parse an amount such as "$1,234.50", "1234.5 USD" or "($200.00)" into a float, or None.
+    """
+    text = str(value).strip()
+    if not _MONEY_RE.fullmatch(text):
+        return None
+    negative = text.startswith("(") and text.endswith(")") or "-" in text
+    digits = re.sub(r"[^\d.]", "", _CURRENCY_RE.sub("", text))
+    try:
+        amount = float(digits)
+    except ValueError:
+        return None
+    return -amount if negative else amount
+
+def parse_count(value):
+    text = str(value).strip()
+    return int(text.replace(",", "")) if _COUNT_RE.fullmatch(text) else None
+
+def parse_year(value):
+    text = str(value).strip()
+    return int(text) if _YEAR_RE.fullmatch(text) else None
+
+def parse_date(value):
+    """
+    Parse a date in one of `DATE_FORMATS` into its proleptic Gregorian ordinal (days), or None.
+    """
+    text = str(value).strip()
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format).toordinal()
+        except ValueError:
+            continue
+    return None
+
+def normalize_name(value):
+    """
+    Normalize a person or company name so case, punctuation and "Last, First" order do not matter.
+    """
+    tokens = re.sub(r"[^\w\s]", " ", str(value)).casefold().split()
+    return " ".join(sorted(tokens))
+
+def normalize_identifier(value):
+    """
+    Normalize an identifier such as a policy number so case, spaces and dashes do not matter.
+    """
+    return re.sub(r"[\s-]", "", str(value)).casefold()
+
+def name_words(name):
+    """
+    Split a field name such as "policy_number" or "PolicyNumber" into casefolded words.
+    """
+    return re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", name).replace("_", " ").replace("-", " ").casefold().split()
+
+PARSERS = {MONEY: parse_money, COUNT: parse_count, YEAR: parse_year, DATE: parse_date}
+
+def field_kind(name, values=()):
+    """
+    Decide how a field is compared: from its name, else from the first value that parses.
+    """
+    for word in reversed(name_words(name)):
+        for kind, hints in NAME_HINTS:
+            if word in hints or (word.endswith("s") and word[:-1] in hints):
+                return kind
+    for value in values:
+        if value is None:
+            continue
+        text = str(value)
+        if _CURRENCY_RE.search(text) and parse_money(text) is not None:
+            return MONEY
+        for kind in (YEAR, COUNT, DATE):
+            if PARSERS[kind](text) is not None:
+                return kind
+        break
+    return TEXT
+
+def _column(pairs, side, name):
+    fields = [pair[side] or {} for pair in pairs]
+    present = np.array([name in f for f in fields], dtype=bool)
+    values = [(f.get(name) or {}).get("value") for f in fields]
+    confidence = np.array([(f.get(name) or {}).get("confidence") for f in fields], dtype=np.float64)
+    return present, values, confidence
+
+def _parse_column(parse, values):
+    parsed = [None if value is None else parse(value) for value in values]
+    return np.array([np.nan if number is None else number for number in parsed], dtype=np.float64)
+
+def compare_field_pairs(pairs, min_confidence=0.8):
+    """
+    Compare the typed fields of many document pairs at once.
+
+    Money, counts, years and dates are parsed and their deltas and percent changes are computed as
+    one array operation per field across all pairs; names and identifiers are compared after
+    normalization.
+    A change needs the LLM only if the field is free text, a value does not parse, or either
+    side's confidence is below `min_confidence`.
+
+    Args:
+        pairs (list): (fields1, fields2) tuples, each a field name -> {"value", "confidence"} dict.
+        min_confidence (float): Confidence below which a change is left to the LLM.
+
+    Returns:
+        list: For each pair, a list of dictionaries with "field", "kind", "status", "value1",
+        "value2", "delta", "pct_change", "confidence" and "needs_llm".
+    """
+    names = list(dict.fromkeys(name for pair in pairs for fields in pair for name in (fields or {})))
+    results = [[] for _ in pairs]
+
+    for name in names:
+        present1, values1, confidence1 = _column(pairs, 0, name)
+        present2, values2, confidence2 = _column(pairs, 1, name)
+        kind = field_kind(name, [value for value in values1 + values2 if value is not None])
+
+        delta = pct_change = None
+        if kind in NUMERIC_KINDS:
+            parsed1 = _parse_column(PARSERS[kind], values1)
+            parsed2 = _parse_column(PARSERS[kind], values2)
+            unparsed = (present1 & np.isnan(parsed1)) | (present2 & np.isnan(parsed2))
+            equal = parsed1 == parsed2
+            delta = parsed2 - parsed1
+            if kind in (MONEY, COUNT):
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    pct_change = np.where(parsed1 != 0, delta / np.abs(parsed1) * 100, np.nan)
+        else:
+            normalize = {NAME: normalize_name, IDENTIFIER: normalize_identifier}.get(
+                kind, lambda value: normalize_text(str(value)))
+            normalized1 = [None if value is None else normalize(value) for value in values1]
+            normalized2 = [None if value is None else normalize(value) for value in values2]
+            unparsed = np.zeros(len(pairs), dtype=bool)
+            equal = np.array([a == b for a, b in zip(normalized1, normalized2)], dtype=bool)
+
+        # A missing side does not lower the confidence
+        confidence = np.fmin(confidence1, confidence2)
+        status = np.where(present1 & ~present2, REMOVED,
+                          np.where(~present1 & present2, ADDED,
+                                   np.where(equal, UNCHANGED, MODIFIED)))
+        needs_llm = (status == MODIFIED) & ((kind == TEXT) | unparsed | (confidence < min_confidence))
+
+        for i in np.flatnonzero(present1 | present2):
+            results[i].append({
+                "field": name,
+                "kind": kind,
+                "status": str(status[i]),
+                "value1": values1[i],
+                "value2": values2[i],
+                "delta": None if delta is None or np.isnan(delta[i]) else float(delta[i]),
+                "pct_change": None if pct_change is None or np.isnan(pct_change[i]) else float(pct_change[i]),
+                "confidence": None if np.isnan(confidence[i]) else float(confidence[i]),
+                "needs_llm": bool(needs_llm[i]),
+            })
+    return results
+
+def compare_fields(fields1, fields2, min_confidence=0.8):
+    """
+    Compare the typed fields of two documents; see `compare_field_pairs`.
+    """
+    return compare_field_pairs([(fields1, fields2)], min_confidence)[0]
+
+def format_field_change(item, min_confidence=0.8):
+    """
+    Describe one field comparison as a report line, e.g. "- Premium (modified): $1,000.00 -> $1,200.00 (+200.00, +20.0%)".
+    """
+    line = f"- {item['field']} ({item['status']}): {item['value1']} -> {item['value2']}"
+    if item["delta"] is not None and item["status"] == MODIFIED:
+        if item["kind"] == MONEY:
+            detail = f"{item['delta']:+,.2f}"
+        elif item["kind"] == DATE:
+            detail = f"{item['delta']:+.0f} days"
+        elif item["kind"] == YEAR:
+            detail = f"{item['delta']:+.0f} years"
+        else:
+            detail = f"{item['delta']:+.0f}"
+        if item["pct_change"] is not None:
+            detail += f", {item['pct_change']:+.1f}%"
+        line += f" ({detail})"
+    if item["confidence"] is not None and item["confidence"] < min_confidence:
+        line += f" [low confidence {item['confidence']:.2f}]"
+    return line
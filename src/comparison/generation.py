@@ -0,0 +1,266 @@
+import contextvars
+import copy
+import threading
+from model_registry import registry
+from telemetry import telemetry
+
+LLAMA_MODEL_PATH = "/home/~/.llama/checkpoints/Llama-2-7B"  # Correct absolute path
+
+# CPU inference modes: full precision, bfloat16 weights, or dynamic int8 quantized linear layers
+INFERENCE_MODES = ("fp32", "bf16", "int8")
+
+generation_settings = {
+    "model_path": LLAMA_MODEL_PATH,
+    "mode": "fp32",
+    "max_new_tokens": 256,
+}
+
+def configure_generation(**settings):
+    """
+    Override the generation settings (model_path, mode, max_new_tokens), e.g. from config.yaml.
+
+    Changing `model_path` unloads the models and prefix caches of the previous one.
+    """
+    for key, value in settings.items():
+        if value is None:
+            continue
+        if key not in generation_settings:
+            raise ValueError(f"Unknown generation setting '{key}'.")
+        if key == "mode" and value not in INFERENCE_MODES:
+            raise ValueError(f"Unknown inference mode '{value}'. Expected one of {INFERENCE_MODES}.")
+        if key == "model_path" and value != generation_settings["model_path"]:
+            for mode in INFERENCE_MODES:
+                registry.unload(llama_key(mode))
+            with _prefix_lock:
+                _prefix_caches.clear()
+        generation_settings[key] = value
+
+def load_llama(mode="fp32"):
+    """
+    Load the LLaMA model and tokenizer for CPU inference in the given mode.
+
+    Args:
+        mode (str): "fp32", "bf16" (bfloat16 weights) or "int8" (dynamic int8 quantization of linear layers).
+
+    Returns:
+        tuple: (tokenizer, model)
+    """
+    import torch
+    from transformers import AutoTokenizer, AutoModelForCausalLM
+
+    model_path = generation_settings["model_path"]
+    tokenizer = AutoTokenizer.from_pretrained(model_path, local_files_only=True)
+    model = AutoModelForCausalLM.from_pretrained(
+        model_path,
+        torch_dtype=torch.bfloat16 if mode == "bf16" else torch.float32,
+        device_map=None,  # CPU only
+        low_cpu_mem_usage=True,
+        local_files_only=True,
+    ).to("cpu")
+    if mode == "int8":
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    model.eval()
+    return tokenizer, model
+
+def llama_key(mode):
+    return f"llama-{mode}"
+
+registry.register(llama_key("fp32"), lambda: load_llama("fp32"), estimated_bytes=28 * 2**30)
+registry.register(llama_key("bf16"), lambda: load_llama("bf16"), estimated_bytes=14 * 2**30)
+registry.register(llama_key("int8"), lambda: load_llama("int8"), estimated_bytes=8 * 2**30)
+
+_tokenizers = {}
+_tokenizers_lock = threading.Lock()
+
+def _tokenizer():
+    """
+    Load the LLaMA tokenizer alone, once per model path.
+    """
+    model_path = generation_settings["model_path"]
+    with _tokenizers_lock:
+        tokenizer = _tokenizers.get(model_path)
+        if tokenizer is None:
+            from transformers import AutoTokenizer
+
+            tokenizer = AutoTokenizer.from_pretrained(model_path, local_files_only=True)
+            _tokenizers[model_path] = tokenizer
+    return tokenizer
+
+def count_tokens(texts):
+    """
+    Count the LLaMA tokens of each text, without special tokens. Only the tokenizer is loaded.
+    """
+    if not texts:
+        return []
+    return [len(ids) for ids in _tokenizer()(list(texts), add_special_tokens=False)["input_ids"]]
+
+def truncate_tokens(text, max_tokens):
+    """
+    Cut a text to its first `max_tokens` LLaMA tokens.
+    """
+    tokenizer = _tokenizer()
+    ids = tokenizer(text, add_special_tokens=False)["input_ids"]
+    if len(ids) <= max_tokens:
+        return text
+    return tokenizer.decode(ids[:max(max_tokens, 0)], skip_special_tokens=True).rstrip()
+
+_prefix_caches = {}
+_prefix_lock = threading.Lock()
+
+def _prefix_cache(mode, tokenizer, model, prefix):
+    """
+    Return the token ids and KV cache of a fixed prompt prefix, computing them once per model and mode.
+    """
+    import torch
+
+    key = (generation_settings["model_path"], mode, prefix)
+    with _prefix_lock:
+        if key not in _prefix_caches:
+            prefix_ids = tokenizer(prefix, return_tensors="pt")["input_ids"]
+            with torch.no_grad():
+                past_key_values = model(input_ids=prefix_ids, use_cache=True).past_key_values
+            _prefix_caches[key] = (prefix_ids, past_key_values)
+        return _prefix_caches[key]
+
+def _cancel_criteria(cancel):
+    """
+    Stopping criteria that end generation once `cancel` is set.
+    """
+    import torch
+    from transformers import StoppingCriteria, StoppingCriteriaList
+
+    class CancelCriteria(StoppingCriteria):
+        def __call__(self, input_ids, scores, **kwargs):
+            return torch.full((input_ids.shape[0],), cancel.is_set(), dtype=torch.bool)
+
+    return StoppingCriteriaList([CancelCriteria()])
+
+def stream_generate(prompt, prefix="", mode=None, max_new_tokens=None, cancel=None):
+    """
+    Generate a completion with LLaMA on CPU, yielding text pieces as they are produced.
+
+    When `prefix` is given, its KV cache is computed once and reused by every call with the
+    same prefix, so only the prompt-specific suffix is prefilled. Generation stops after the
+    current token when `cancel` is set or the consumer closes the stream.
+
+    Args:
+        prompt (str): The prompt text following the prefix.
+        prefix (str): Fixed instruction text shared across calls.
+        mode (str): Inference mode; defaults to the configured mode.
+        max_new_tokens (int): Maximum number of tokens to generate; defaults to the configured value.
+        cancel (threading.Event): Optional event that stops generation when set.
+
+    Yields:
+        str: Decoded text pieces of the completion.
+    """
+    import torch
+    from transformers import TextIteratorStreamer
+
+    mode = mode or generation_settings["mode"]
+    max_new_tokens = max_new_tokens or generation_settings["max_new_tokens"]
+    cancel = cancel or threading.Event()
+    tokenizer, model = registry.get(llama_key(mode))
+
+    if prefix:
+        prefix_ids, past_key_values = _prefix_cache(mode, tokenizer, model, prefix)
+        # Tokenize the suffix separately so the prefix tokens match the cached ones exactly
+        suffix_ids = tokenizer(prompt, add_special_tokens=False, return_tensors="pt")["input_ids"]
+        input_ids = torch.cat([prefix_ids, suffix_ids], dim=1)
+        past_key_values = copy.deepcopy(past_key_values)
+    else:
+        input_ids = tokenizer(prompt, return_tensors="pt")["input_ids"]
+        past_key_values = None
+
+    streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+    generate_kwargs = {
+        "input_ids": input_ids,
+        "attention_mask": torch.ones_like(input_ids),
+        "max_new_tokens": max_new_tokens,
+        "do_sample": False,
+        "streamer": streamer,
+        "stopping_criteria": _cancel_criteria(cancel),
+    }
+    if past_key_values is not None:
+        generate_kwargs["past_key_values"] = past_key_values
+
+    errors = []
+
+    def run():
+        # The span lives in the generating thread: this generator may be resumed from a different
+        # thread and context at every yield (e.g. by the Gradio app), so it cannot hold one open
+        try:
+            with telemetry.span("llm.generate", mode=mode, prompt_tokens=int(input_ids.shape[1])), torch.no_grad():
+                model.generate(**generate_kwargs)
+        except Exception as error:
+            errors.append(error)
+            streamer.end()
+
+    pieces = []
+    thread = threading.Thread(target=contextvars.copy_context().run, args=(run,), daemon=True)
+    thread.start()
+    try:
+        for text in streamer:
+            pieces.append(text)
+            yield text
+    finally:
+        # Also reached when the consumer abandons the stream: stop generating instead of
+        # running to max_new_tokens in the background
+        cancel.set()
+        thread.join()
+    telemetry.increment("llm.tokens_generated", len(tokenizer("".join(pieces), add_special_tokens=False)["input_ids"]))
+    if errors:
+        raise errors[0]
+
+def generate(prompt, prefix="", mode=None, max_new_tokens=None):
+    """
+    Generate a full completion; see `stream_generate`.
+    """
+    return "".join(stream_generate(prompt, prefix=prefix, mode=mode, max_new_tokens=max_new_tokens)).strip()
+
+def generate_batch(prompts, prefix="", mode=None, max_new_tokens=None, batch_size=8):
+    """
+    Generate full completions for many prompts, `batch_size` prompts per forward pass.
+
+    Prompts are sorted by length and left-padded to the longest in their batch. The prefix is
+    prefilled as part of every batch rather than served from the cache used by `stream_generate`.
+
+    Args:
+        prompts (list): Prompt texts following the prefix.
+        prefix (str): Fixed instruction text shared by all prompts.
+        mode (str): Inference mode; defaults to the configured mode.
+        max_new_tokens (int): Maximum number of tokens to generate per prompt; defaults to the configured value.
+        batch_size (int): Number of prompts generated together.
+
+    Returns:
+        list: The completions, in the order of `prompts`.
+    """
+    import torch
+
+    mode = mode or generation_settings["mode"]
+    max_new_tokens = max_new_tokens or generation_settings["max_new_tokens"]
+    tokenizer, model = registry.get(llama_key(mode))
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    # The tokenizer is shared, so its padding side is restored for other callers afterwards
+    padding_side = tokenizer.padding_side
+    tokenizer.padding_side = "left"
+
+    texts = [prefix + prompt for prompt in prompts]
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    completions = [None] * len(texts)
+    try:
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            inputs = tokenizer([texts[i] for i in batch], return_tensors="pt", padding=True)
+            with telemetry.span("llm.generate_batch", mode=mode, prompts=len(batch),
+                                prompt_tokens=int(inputs["attention_mask"].sum())):
+                with torch.no_grad():
+                    output_ids = model.generate(**inputs, max_new_tokens=max_new_tokens, do_sample=False,
+                                                pad_token_id=tokenizer.pad_token_id)
+            new_ids = output_ids[:, inputs["input_ids"].shape[1]:]
+            telemetry.increment("llm.tokens_generated", int((new_ids != tokenizer.pad_token_id).sum()))
+            for i, text in zip(batch, tokenizer.batch_decode(new_ids, skip_special_tokens=True)):
+                completions[i] = text.strip()
+    finally:
+        tokenizer.padding_side = padding_side
+    return completions
@@ -0,0 +1,188 @@
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+from telemetry import telemetry
+
+def normalize_query(query):
+    """
+    Normalize a comparison request so trivially different spellings share a cache entry.
+    """
+    return " ".join(query.lower().split())
+
+def content_hash(chunks, fields=None):
+    """
+    Hash the comparison inputs of one document (chunk texts and extracted fields).
+    """
+    texts = [chunk["chunk"] if isinstance(chunk, dict) else chunk for chunk in chunks or []]
+    values = {name: field.get("value") for name, field in (fields or {}).items()}
+    payload = json.dumps({"chunks": texts, "fields": values}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class ReportCache:
+    """
+    Persistent cache of finished comparison reports and their intermediate artifacts.
+
+    Entries are keyed by (content hashes of both documents, normalized query, model, prompt version)
+    and hold the report, the retrieved chunk texts and the chunk similarity matrix. Entries older
+    than `ttl_seconds` are ignored and removed; when the total stored size exceeds `max_bytes`, the
+    least recently used entries are evicted.
+
+    Args:
+        directory (str): Directory holding the cache database.
+        ttl_seconds (float): Maximum age of an entry. No expiry if None.
+        max_bytes (int): Maximum total size of the cached entries.
+    """
+
+    def __init__(self, directory="./data/report_cache", ttl_seconds=30 * 24 * 3600, max_bytes=256 * 2**20):
+        os.makedirs(directory, exist_ok=True)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(directory, "reports.sqlite"), check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS reports (
+                key TEXT PRIMARY KEY,
+                doc1 TEXT NOT NULL,
+                doc2 TEXT NOT NULL,
+                report TEXT NOT NULL,
+                chunks TEXT NOT NULL,
+                matrix BLOB,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._db.commit()
+
+    @staticmethod
+    def make_key(doc1_hash, doc2_hash, query, model, prompt_version):
+        payload = json.dumps([doc1_hash, doc2_hash, normalize_query(query), model, prompt_version])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """
+        Return the cached entry for a key, or None on a miss or expired entry.
+
+        Returns:
+            dict: {"report", "chunks_doc1", "chunks_doc2", "matrix"}
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT report, chunks, matrix, created_at FROM reports WHERE key = ?", (key,)
+            ).fetchone()
+            now = time.time()
+            if row is not None and self.ttl_seconds is not None and now - row[3] > self.ttl_seconds:
+                self._db.execute("DELETE FROM reports WHERE key = ?", (key,))
+                self._db.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                telemetry.increment("report_cache.misses")
+                return None
+            telemetry.increment("report_cache.hits")
+            self._db.execute("UPDATE reports SET last_access = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            self.hits += 1
+        report, chunks, matrix, _ = row
+        chunks = json.loads(chunks)
+        return {
+            "report": report,
+            "chunks_doc1": chunks[0],
+            "chunks_doc2": chunks[1],
+            "matrix": np.load(io.BytesIO(matrix)) if matrix is not None else None,
+        }
+
+    def put(self, key, doc1_hash, doc2_hash, report, chunks_doc1, chunks_doc2, matrix=None):
+        """
+        Store a finished report with its retrieved chunk texts and similarity matrix, evicting
+        least recently used entries beyond the size limit.
+        """
+        chunks = json.dumps([list(chunks_doc1), list(chunks_doc2)])
+        blob = None
+        if matrix is not None:
+            buffer = io.BytesIO()
+            np.save(buffer, np.asarray(matrix, dtype=np.float32))
+            blob = buffer.getvalue()
+        size = len(report) + len(chunks) + (len(blob) if blob is not None else 0)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO reports (key, doc1, doc2, report, chunks, matrix, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, doc1_hash, doc2_hash, report, chunks, blob, size, now, now),
+            )
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM reports").fetchone()[0]
+            if self.max_bytes is not None and total > self.max_bytes:
+                for old_key, old_size in self._db.execute(
+                    "SELECT key, size FROM reports WHERE key != ? ORDER BY last_access", (key,)
+                ).fetchall():
+                    self._db.execute("DELETE FROM reports WHERE key = ?", (old_key,))
+                    total -= old_size
+                    if total <= self.max_bytes:
+                        break
+            self._db.commit()
+
+    def invalidate(self, key=None):
+        """
+        Remove one entry, or every entry if no key is given.
+        """
+        with self._lock:
+            if key is None:
+                self._db.execute("DELETE FROM reports")
+            else:
+                self._db.execute("DELETE FROM reports WHERE key = ?", (key,))
+            self._db.commit()
+
+    def invalidate_document(self, document_hash):
+        """
+        Remove every entry comparing a document with the given content hash.
+        """
+        with self._lock:
+            self._db.execute("DELETE FROM reports WHERE doc1 = ? OR doc2 = ?", (document_hash, document_hash))
+            self._db.commit()
+
+cache_settings = {
+    "enabled": True,
+    "directory": "./data/report_cache",
+    "ttl_days": 30,
+    "max_mb": 256,
+}
+
+def configure_report_cache(**settings):
+    """
+    Override the report cache settings (enabled, directory, ttl_days, max_mb), e.g. from config.yaml.
+    """
+    for key, value in settings.items():
+        if value is None:
+            continue
+        if key not in cache_settings:
+            raise ValueError(f"Unknown report cache setting '{key}'.")
+        cache_settings[key] = value
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_report_cache():
+    """
+    Return the process-wide report cache, opening it with the current settings on first use,
+    or None if the cache is disabled.
+    """
+    global _cache
+    if not cache_settings["enabled"]:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            ttl_days = cache_settings["ttl_days"]
+            _cache = ReportCache(
+                cache_settings["directory"],
+                ttl_seconds=ttl_days * 24 * 3600 if ttl_days else None,
+                max_bytes=int(cache_settings["max_mb"] * 2**20) if cache_settings["max_mb"] else None,
+            )
+        return _cache
@@ -0,0 +1,72 @@
+import numpy as np
+from chunking.embedding_engine import get_embedding_engine
+
+def chunk_embeddings(chunks):
+    """
+    Collect the embeddings of a list of chunks into one float32 matrix.
+
+    Chunks that already carry an "embedding" (as written by `chunk_and_embed`) are reused as is;
+    the remaining ones, and plain strings, are encoded together in a single batched call.
+
+    Args:
+        chunks (list): Chunk dictionaries with "chunk" and optionally "embedding", or plain strings.
+
+    Returns:
+        np.ndarray: float32 array of shape (len(chunks), dim).
+    """
+    vectors = [None] * len(chunks)
+    missing_idx, missing_text = [], []
+    for i, chunk in enumerate(chunks):
+        if isinstance(chunk, dict) and chunk.get("embedding") is not None:
+            vectors[i] = np.asarray(chunk["embedding"], dtype=np.float32)
+        else:
+            missing_idx.append(i)
+            missing_text.append(chunk["chunk"] if isinstance(chunk, dict) else chunk)
+
+    if missing_text:
+        encoded = get_embedding_engine().embed(missing_text)
+        for i, vector in zip(missing_idx, encoded):
+            vectors[i] = vector
+
+    if not vectors:
+        return np.zeros((0, get_embedding_engine().dimension), dtype=np.float32)
+    return np.stack(vectors).astype(np.float32, copy=False)
+
+def normalize_rows(matrix):
+    """
+    L2-normalize each row, leaving all-zero rows untouched.
+    """
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+def similarity_matrix(chunks1, chunks2):
+    """
+    Compute the full cosine similarity matrix between the chunks of two documents.
+
+    Args:
+        chunks1 (list): Chunks of the first document.
+        chunks2 (list): Chunks of the second document.
+
+    Returns:
+        np.ndarray: float32 array of shape (len(chunks1), len(chunks2)).
+    """
+    a = normalize_rows(chunk_embeddings(chunks1))
+    b = normalize_rows(chunk_embeddings(chunks2))
+    return a @ b.T
+
+def document_similarity(matrix):
+    """
+    Summarize a chunk similarity matrix as one document-level score.
+
+    Every chunk is matched to its most similar counterpart in the other document, and the mean
+    best-match scores of both directions are averaged.
+
+    Args:
+        matrix (np.ndarray): Similarity matrix from `similarity_matrix`.
+
+    Returns:
+        float: Document similarity in [-1, 1], or 0.0 if either document has no chunks.
+    """
+    if matrix.size == 0:
+        return 0.0
+    return float((matrix.max(axis=1).mean() + matrix.max(axis=0).mean()) / 2)
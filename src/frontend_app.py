@@ -1,40 +1,206 @@
+import asyncio
 import gradio as gr
 import os
+import shutil
+import tempfile
+import time
+import yaml
 from pathlib import Path
-from retrieve_chunks_and_compare import compare_documents  # Import the comparison function
+from dotenv import find_dotenv, load_dotenv
+from get_custom_text.analyze_custom_doc_main import main as analyze_documents
+from get_custom_text.analysis_cache import configure_analysis_cache
+from chunking.chunk_and_embed import split_documents, embed_chunks, configure_chunker
+from chunking.onnx_encoder import configure_encoder
+from comparison.generation import configure_generation
+from comparison.context_packer import configure_context_packer
+from comparison.report_cache import configure_report_cache, get_report_cache
+from indexing.manifest import file_sha256
+from retrieve_chunks_and_compare import iter_compare_documents, comparison_key  # Import the comparison function
+from telemetry import configure_telemetry, telemetry
 
-# Define paths to store uploaded documents
-UPLOAD_DIR = "./uploaded_documents"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+# Load the config file and apply the LLM (e.g. the CPU inference mode) and cache settings
+with open('./config.yaml') as yaml_file:
+    config = yaml.safe_load(yaml_file)
+configure_generation(**(config.get('llm') or {}))
+configure_context_packer(**((config.get('comparison') or {}).get('context') or {}))
+configure_chunker(**(config.get('chunking') or {}))
+configure_encoder(**(config.get('encoder') or {}))
+configure_analysis_cache(**(config['doc_intelligence'].get('cache') or {}))
+configure_report_cache(**((config.get('comparison') or {}).get('cache') or {}))
+configure_telemetry(**(config.get('telemetry') or {}))
+load_dotenv(find_dotenv())
 
-def process_documents(doc1, doc2):
+app_config = config.get('app') or {}
+
+# Every request gets its own working directory under UPLOAD_DIR, so concurrent users never share files.
+# The path is absolute: the analysis resolves relative paths against its own package, not the working directory.
+UPLOAD_DIR = Path(app_config.get('upload_dir', "./uploaded_documents")).resolve()
+UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+REQUEST_DIR_TTL = app_config.get('request_dir_ttl_hours', 24) * 3600
+
+def prune_request_dirs(max_age=REQUEST_DIR_TTL):
+    """
+    Remove request working directories (and the reports offered for download in them) older than `max_age` seconds.
+    """
+    cutoff = time.time() - max_age
+    for path in UPLOAD_DIR.glob("request_*"):
+        try:
+            if path.is_dir() and path.stat().st_mtime < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+        except FileNotFoundError:
+            pass  # Pruned by a concurrent request
+
+def save_upload(upload, path):
+    """
+    Copy an uploaded file (a path, or a tempfile wrapper with a `.name`) to `path`.
+    """
+    shutil.copyfile(getattr(upload, "name", upload), path)
+    return str(path)
+
+def merge_fields(documents):
+    """
+    Merge the extracted fields of all documents found in one upload.
+    """
+    fields = {}
+    for doc in documents:
+        fields.update(doc.get("fields") or {})
+    return fields
+
+def embed_upload(documents, request_id, number):
+    """
+    Chunk and embed the documents of one upload under request-scoped document ids.
+    """
+    for doc in documents:
+        doc["source_id"] = f"{request_id}_{number}_{doc['document_index']}"
+    embedding_config = config.get('embedding') or {}
+    return embed_chunks(
+        split_documents(documents),
+        batch_size=embedding_config.get('batch_size', 64),
+        num_threads=embedding_config.get('num_threads'),
+        use_cache=embedding_config.get('use_cache', True),
+    )
+
+async def iterate_in_thread(iterator):
+    """
+    Consume a blocking iterator from a worker thread, yielding its items on the event loop.
+    """
+    done = object()
+    while True:
+        item = await asyncio.to_thread(next, iterator, done)
+        if item is done:
+            return
+        yield item
+
+async def process_documents(doc1, doc2):
     """
-    Process the uploaded documents and perform comparison.
+    Process the uploaded documents and perform comparison, streaming progress and the report as it is generated.
+
+    The blocking analysis, embedding and generation run in worker threads so the event loop keeps
+    serving other requests.
     """
-    # Save the uploaded documents locally
-    doc1_path = Path(UPLOAD_DIR) / "document_1.pdf"
-    doc2_path = Path(UPLOAD_DIR) / "document_2.pdf"
-    with open(doc1_path, "wb") as f:
-        f.write(doc1.read())
-    with open(doc2_path, "wb") as f:
-        f.write(doc2.read())
+    if doc1 is None or doc2 is None:
+        yield "Please upload two documents.", None
+        return
+
+    await asyncio.to_thread(prune_request_dirs)
+    work_dir = Path(tempfile.mkdtemp(prefix="request_", dir=UPLOAD_DIR))
+    completed = False
+    try:
+        async for update in compare_uploads(doc1, doc2, work_dir):
+            yield update
+        completed = True
+    finally:
+        # The report stays for download (until pruned); the uploads go, and so does everything on error
+        if completed:
+            for path in work_dir.glob("document_*"):
+                path.unlink(missing_ok=True)
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
 
-    # Call the backend pipeline to analyze and compare the documents
-    # (Update the backend pipeline to handle two documents)
+async def compare_uploads(doc1, doc2, work_dir):
+    """
+    Compare two uploaded documents in the request's working directory `work_dir`, yielding
+    (progress or report text, report path) updates.
+    """
+    request_id = work_dir.name
+    start = time.perf_counter()
+
+    def progress(message):
+        return f"[{time.perf_counter() - start:.1f}s] {message}"
+
+    # Save the uploaded documents in the request's working directory
+    doc1_path = save_upload(doc1, work_dir / ("document_1" + Path(getattr(doc1, "name", doc1)).suffix))
+    doc2_path = save_upload(doc2, work_dir / ("document_2" + Path(getattr(doc2, "name", doc2)).suffix))
+
+    query = "Compare the two uploaded documents and highlight the differences."
+    model_id = config['doc_intelligence']['custom_models']['custom_insurance_model_1']
+    report_path = work_dir / "comparison_report.txt"
+
+    # A pair of documents already compared with the same query and models is answered from the report cache
+    report_cache = get_report_cache()
+    document_hashes = tuple(
+        f"{model_id}:{digest}" for digest in await asyncio.gather(
+            asyncio.to_thread(file_sha256, doc1_path), asyncio.to_thread(file_sha256, doc2_path))
+    )
+    comparison_config = config.get('comparison') or {}
+    structured_fields = comparison_config.get('structured_fields', True)
+    min_confidence = comparison_config.get('min_confidence', 0.8)
+    if report_cache is not None:
+        cached = await asyncio.to_thread(report_cache.get, comparison_key(
+            *document_hashes, query, structured_fields=structured_fields, min_confidence=min_confidence))
+        if cached is not None:
+            with open(report_path, "w") as f:
+                f.write(cached["report"])
+            yield cached["report"], str(report_path)
+            return
+
+    # Stage 1: analyze both documents concurrently (repeat documents come from the analysis cache)
+    yield progress("Analyzing documents..."), None
+    training_folder_path = os.getenv("training_folder_SAS_URI")
+    with telemetry.span("app.analyze"):
+        documents1, documents2 = await asyncio.gather(
+            asyncio.to_thread(analyze_documents, doc1_path, model_id, training_folder_path),
+            asyncio.to_thread(analyze_documents, doc2_path, model_id, training_folder_path),
+        )
+
+    # Stage 2: chunk and embed, unless the typed fields alone are compared
+    fields_doc1, fields_doc2 = merge_fields(documents1), merge_fields(documents2)
+    chunks_doc1 = chunks_doc2 = None
+    if not (structured_fields and fields_doc1 and fields_doc2):
+        yield progress("Chunking and embedding documents..."), None
+        with telemetry.span("app.embed"):
+            chunks_doc1 = await asyncio.to_thread(embed_upload, documents1, request_id, 1)
+            chunks_doc2 = await asyncio.to_thread(embed_upload, documents2, request_id, 2)
+
+    # Stage 3: compare, updating the textbox as tokens arrive
+    yield progress("Comparing documents..."), None
     service_endpoint = os.getenv("AZURE_SEARCH_ENDPOINT")
     api_key = os.getenv("AZURE_SEARCH_API_KEY")
     index_name = "insurance-docs-index"
-
-    # Generate the comparison report
-    query = "Compare the two uploaded documents and highlight the differences."
-    comparison_result = compare_documents(query, service_endpoint, api_key, index_name)
+    comparison_result = ""
+    report = iter_compare_documents(query, service_endpoint, api_key, index_name,
+                                    chunks_doc1=chunks_doc1, chunks_doc2=chunks_doc2,
+                                    fields_doc1=fields_doc1, fields_doc2=fields_doc2,
+                                    report_cache=report_cache, document_hashes=document_hashes,
+                                    structured_fields=structured_fields,
+                                    min_confidence=min_confidence)
+    # Timed by hand: a span cannot stay open across yields resumed in other contexts
+    compare_start = time.perf_counter()
+    try:
+        async for comparison_result in iterate_in_thread(report):
+            yield comparison_result, None
+    except Exception as error:
+        telemetry.record_span("app.compare", time.perf_counter() - compare_start,
+                              error=f"{type(error).__name__}: {error}")
+        raise
+    telemetry.record_span("app.compare", time.perf_counter() - compare_start)
+    telemetry.increment("app.requests")
 
     # Save the comparison result as a report
-    report_path = Path(UPLOAD_DIR) / "comparison_report.txt"
     with open(report_path, "w") as f:
         f.write(comparison_result)
 
-    return comparison_result, str(report_path)
+    yield comparison_result, str(report_path)
 
 # Define the Gradio interface
 with gr.Blocks() as demo:
@@ -42,8 +208,8 @@ with gr.Blocks() as demo:
     gr.Markdown("Upload two documents to compare their content and generate a report.")
 
     with gr.Row():
-        doc1 = gr.File(label="Upload Document 1")
-        doc2 = gr.File(label="Upload Document 2")
+        doc1 = gr.File(label="Upload Document 1", type="filepath")
+        doc2 = gr.File(label="Upload Document 2", type="filepath")
 
     compare_button = gr.Button("Compare Documents")
     output_text = gr.Textbox(label="Comparison Result", lines=10)
@@ -53,7 +219,15 @@ with gr.Blocks() as demo:
         process_documents,
         inputs=[doc1, doc2],
         outputs=[output_text, download_link],
+        api_name="process_documents",
     )
 
+# Bound the number of comparisons running at once and the number waiting in line
+demo.queue(
+    default_concurrency_limit=app_config.get('concurrency_limit', 2),
+    max_size=app_config.get('max_queue_size', 16),
+)
+
 # Launch the Gradio app
-demo.launch()
\ No newline at end of file
+if __name__ == "__main__":
+    demo.launch()
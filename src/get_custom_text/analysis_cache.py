@@ -0,0 +1,226 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import urllib.request
+from urllib.parse import urlparse
+from indexing.manifest import file_sha256
+from telemetry import telemetry
+
+# Document Intelligence REST API version the analysis results are produced with
+DEFAULT_API_VERSION = "2024-11-30"
+
+def url_etag(url, timeout=10):
+    """
+    Return the ETag of a remote document (e.g. a blob SAS URL), or None if it cannot be determined.
+    """
+    try:
+        request = urllib.request.Request(url, method="HEAD")
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.headers.get("ETag")
+    except Exception:
+        return None
+
+_etags = {}  # Blob URL -> (ETag, time it was fetched)
+_etags_lock = threading.Lock()
+
+def content_id(path_to_id_document, url_ttl_seconds=None):
+    """
+    Identify a document's content: the SHA-256 of a local file's bytes or the ETag of a URL.
+
+    A URL's ETag is fetched with a HEAD request at most once per `url_ttl_seconds`. If the server
+    gives no ETag (or the request fails), the URL itself identifies the content for the current
+    `url_ttl_seconds` window, so a changed document is analyzed again after at most that long.
+
+    Args:
+        path_to_id_document (str): Local path or URL of the document.
+        url_ttl_seconds (float): How long a URL's ETag, or the URL alone, is trusted. Defaults to
+            the `url_ttl_minutes` setting; with 0, URLs without an ETag are not cached.
+
+    Returns:
+        str: The content id, or None if the content cannot be identified (unreadable file, or URL
+        without ETag and no TTL).
+    """
+    parsed = urlparse(path_to_id_document)
+    if parsed.scheme:
+        if url_ttl_seconds is None:
+            url_ttl_seconds = (cache_settings["url_ttl_minutes"] or 0) * 60
+        # The SAS query string changes between tokens; the blob path and ETag identify the content
+        blob = f"{parsed.netloc}{parsed.path}"
+        now = time.time()
+        with _etags_lock:
+            etag, fetched_at = _etags.get(blob, (None, None))
+        if etag is None or now - fetched_at >= url_ttl_seconds:
+            etag = url_etag(path_to_id_document)
+            if etag is not None:
+                with _etags_lock:
+                    _etags[blob] = (etag, now)
+        if etag is not None:
+            return f"etag:{blob}:{etag}"
+        if not url_ttl_seconds:
+            return None
+        telemetry.increment("analysis_cache.url_fallbacks")
+        return f"url:{blob}:{int(now // url_ttl_seconds)}"
+    try:
+        return f"sha256:{file_sha256(path_to_id_document)}"
+    except OSError:
+        # Left to the analysis itself to report
+        return None
+
+class AnalysisCache:
+    """
+    Persistent cache of normalized Document Intelligence results.
+
+    Entries are keyed by (document content id, model id, API version) and stored as JSON in SQLite.
+    Entries older than `ttl_seconds` are ignored and removed; when the total stored size exceeds
+    `max_bytes`, the least recently used entries are evicted.
+
+    Args:
+        directory (str): Directory holding the cache database.
+        ttl_seconds (float): Maximum age of an entry. No expiry if None.
+        max_bytes (int): Maximum total size of the cached results.
+    """
+
+    def __init__(self, directory="./data/analysis_cache", ttl_seconds=30 * 24 * 3600, max_bytes=256 * 2**20):
+        os.makedirs(directory, exist_ok=True)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(directory, "analysis.sqlite"), check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._db.commit()
+
+    @staticmethod
+    def make_key(document_content_id, model_id, api_version=DEFAULT_API_VERSION):
+        return hashlib.sha256(f"{document_content_id}|{model_id}|{api_version}".encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """
+        Return the cached analyzed documents for a key, or None on a miss or expired entry.
+        """
+        with self._lock:
+            row = self._db.execute("SELECT value, created_at FROM results WHERE key = ?", (key,)).fetchone()
+            now = time.time()
+            if row is not None and self.ttl_seconds is not None and now - row[1] > self.ttl_seconds:
+                self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+                self._db.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                telemetry.increment("analysis_cache.misses")
+                return None
+            telemetry.increment("analysis_cache.hits")
+            self._db.execute("UPDATE results SET last_access = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            self.hits += 1
+            return json.loads(row[0])
+
+    def put(self, key, analyzed_documents):
+        """
+        Store analyzed documents and evict least recently used entries beyond the size limit.
+        """
+        value = json.dumps(analyzed_documents)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO results (key, value, size, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value), now, now),
+            )
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+            if self.max_bytes is not None and total > self.max_bytes:
+                for old_key, size in self._db.execute(
+                    "SELECT key, size FROM results WHERE key != ? ORDER BY last_access", (key,)
+                ).fetchall():
+                    self._db.execute("DELETE FROM results WHERE key = ?", (old_key,))
+                    total -= size
+                    if total <= self.max_bytes:
+                        break
+            self._db.commit()
+
+    def invalidate(self, key=None):
+        """
+        Remove one entry, or every entry if no key is given.
+        """
+        with self._lock:
+            if key is None:
+                self._db.execute("DELETE FROM results")
+            else:
+                self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+            self._db.commit()
+
+cache_settings = {
+    "enabled": True,
+    "directory": "./data/analysis_cache",
+    "ttl_days": 30,
+    "max_mb": 256,
+    "api_version": DEFAULT_API_VERSION,
+    "url_ttl_minutes": 60,
+}
+
+def configure_analysis_cache(**settings):
+    """
+    Override the analysis cache settings (enabled, directory, ttl_days, max_mb, api_version,
+    url_ttl_minutes), e.g. from config.yaml.
+    """
+    for key, value in settings.items():
+        if value is None:
+            continue
+        if key not in cache_settings:
+            raise ValueError(f"Unknown analysis cache setting '{key}'.")
+        cache_settings[key] = value
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def cached_analysis(model_id, path_to_id_document, analyze):
+    """
+    Return the analyzed documents of a document from the analysis cache, calling `analyze()` and
+    storing its result on a miss. The cache is bypassed when disabled or when the document's
+    content cannot be identified.
+
+    Args:
+        model_id (str): Document Intelligence model the document is analyzed with.
+        path_to_id_document (str): Resolved local path or URL of the document.
+        analyze (callable): Zero-argument function analyzing the document.
+
+    Returns:
+        list: The analyzed documents.
+    """
+    if not cache_settings["enabled"]:
+        return analyze()
+    document_content_id = content_id(path_to_id_document)
+    if document_content_id is None:
+        return analyze()
+    cache_key = AnalysisCache.make_key(document_content_id, model_id, cache_settings["api_version"])
+    documents = get_analysis_cache().get(cache_key)
+    if documents is None:
+        documents = analyze()
+        get_analysis_cache().put(cache_key, documents)
+    return documents
+
+def get_analysis_cache():
+    """
+    Return the process-wide analysis cache, opening it with the current settings on first use.
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            ttl_days = cache_settings["ttl_days"]
+            _cache = AnalysisCache(
+                cache_settings["directory"],
+                ttl_seconds=ttl_days * 24 * 3600 if ttl_days else None,
+                max_bytes=int(cache_settings["max_mb"] * 2**20) if cache_settings["max_mb"] else None,
+            )
+        return _cache
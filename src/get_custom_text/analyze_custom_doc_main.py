@@ -6,7 +6,8 @@ from urllib.parse import urlparse
 from typing import Optional
 from dotenv import find_dotenv, load_dotenv
 from get_custom_text.buildCustomModel import build_model as build
-from get_custom_text.extract_custom_doc import analyze_custom_documents as analyze
+from get_custom_text.extract_custom_doc import analyze_custom_documents as analyze, resolve_document_path
+from get_custom_text.analysis_cache import cached_analysis, configure_analysis_cache
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)-15s %(message)s")
 logger = logging.getLogger()
@@ -26,9 +27,11 @@ def main(path_to_id_document:str, model_id:Optional[str], training_folder_path:O
                 raise error
             model_id = build(training_folder_path)
 
-        # Analyze documents using the created or provided model
+        # Analyze documents using the created or provided model, unless the cache has this
+        # document's results for the model
         logger.info('Extract text based on the custom model')
-        doc_info = analyze(model_id, path_to_id_document)
+        doc_info = cached_analysis(model_id, resolve_document_path(path_to_id_document),
+                                   lambda: analyze(model_id, path_to_id_document))
 
     except HttpResponseError as error:
         # Handle error responses with code-specific details
@@ -53,5 +56,6 @@ if __name__ == "__main__":
     load_dotenv(find_dotenv())
     training_folder_path = os.getenv('training_folder_SAS_URI')
     path_to_id_document = os.getenv("file_path_to_doc")  # SAS URL or local path
+    configure_analysis_cache(**(config['doc_intelligence'].get('cache') or {}))
     main(path_to_id_document, model_id, training_folder_path)
     
\ No newline at end of file
@@ -1,35 +1,41 @@
 import os
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from urllib.parse import urlparse
 from azure.core.credentials import AzureKeyCredential
+from azure.core.exceptions import HttpResponseError
 from azure.ai.documentintelligence import DocumentIntelligenceClient
 from azure.ai.documentintelligence.models import AnalyzeResult, AnalyzeDocumentRequest
+from get_custom_text.analysis_cache import cached_analysis
+from telemetry import telemetry
 
-def analyze_custom_documents(custom_model_id, path_to_id_document):
-    # Load environment variables
-    endpoint = os.environ["DOCUMENTINTELLIGENCE_ENDPOINT"]
-    key = os.environ["DOCUMENTINTELLIGENCE_API_KEY"]
-    # model_id = os.getenv("CUSTOM_BUILT_MODEL_ID", custom_model_id)
+logger = logging.getLogger(__name__)
 
-    # Create client
-    client = DocumentIntelligenceClient(endpoint=endpoint, credential=AzureKeyCredential(key))
+_client = None
+_client_lock = threading.Lock()
 
-    # Check if path_to_id_document is a URL or a local file path
-    if bool(urlparse(path_to_id_document).scheme):  # If it's a URL
-        poller = client.begin_analyze_document(
-            model_id, 
-            AnalyzeDocumentRequest(url_source=path_to_id_document)
-        )
-    else:  # Treat as a local file
-        path_to_sample_documents = os.path.abspath(os.path.join(os.path.abspath(__file__), "..", path_to_id_document))
-        with open(path_to_sample_documents, "rb") as f:
-            poller = client.begin_analyze_document(
-                model_id=custom_model_id,
-                analyze_request=f,
-                content_type="application/octet-stream"
-            )
+def get_client():
+    """
+    Return the shared DocumentIntelligenceClient, creating it on first use.
 
-    result: AnalyzeResult = poller.result()
+    The client is thread-safe and keeps one connection pool for every analysis in the process.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            # Load environment variables
+            endpoint = os.environ["DOCUMENTINTELLIGENCE_ENDPOINT"]
+            key = os.environ["DOCUMENTINTELLIGENCE_API_KEY"]
+            _client = DocumentIntelligenceClient(endpoint=endpoint, credential=AzureKeyCredential(key))
+        return _client
 
+def normalize_result(result):
+    """
+    Convert an AnalyzeResult into the list of analyzed documents used by the rest of the pipeline.
+    """
     # Initialize the list to store results
     analyzed_documents = []
 
@@ -59,8 +65,124 @@ def analyze_custom_documents(custom_model_id, path_to_id_document):
 
     return analyzed_documents
 
+def resolve_document_path(path_to_id_document):
+    """
+    Resolve a local document path the way the analysis does (relative to this package); URLs are returned unchanged.
+    """
+    if bool(urlparse(path_to_id_document).scheme):
+        return path_to_id_document
+    return os.path.abspath(os.path.join(os.path.abspath(__file__), "..", path_to_id_document))
+
+def _analyze(client, custom_model_id, path_to_id_document):
+    # Check if path_to_id_document is a URL or a local file path
+    if bool(urlparse(path_to_id_document).scheme):  # If it's a URL
+        poller = client.begin_analyze_document(
+            custom_model_id,
+            AnalyzeDocumentRequest(url_source=path_to_id_document)
+        )
+    else:  # Treat as a local file
+        path_to_sample_documents = resolve_document_path(path_to_id_document)
+        with open(path_to_sample_documents, "rb") as f:
+            poller = client.begin_analyze_document(
+                model_id=custom_model_id,
+                analyze_request=f,
+                content_type="application/octet-stream"
+            )
+
+    result: AnalyzeResult = poller.result()
+    return normalize_result(result)
+
+def _analyze_traced(client, custom_model_id, path_to_id_document):
+    with telemetry.span("document_intelligence.analyze", model_id=custom_model_id):
+        documents = _analyze(client, custom_model_id, path_to_id_document)
+    telemetry.increment("documents_analyzed", len(documents))
+    return documents
+
+def analyze_custom_documents(custom_model_id, path_to_id_document, client=None):
+    """
+    Analyze one document (local path or URL) with a custom Document Intelligence model.
+
+    Args:
+        custom_model_id (str): ID of the custom model.
+        path_to_id_document (str): Local file path or SAS URL of the document.
+        client (DocumentIntelligenceClient): Client to use; the shared client if None.
+
+    Returns:
+        list: Analyzed documents with their extracted fields and confidence scores.
+    """
+    return _analyze_traced(client or get_client(), custom_model_id, path_to_id_document)
+
+def _retry_after_seconds(error, attempt, base_delay, max_delay):
+    """
+    Delay before retrying a throttled request: the service's Retry-After if given, else exponential backoff.
+    """
+    headers = getattr(error.response, "headers", None) or {}
+    retry_after = headers.get("Retry-After") or headers.get("retry-after")
+    if retry_after:
+        try:
+            return min(float(retry_after), max_delay)
+        except ValueError:
+            pass
+    return min(base_delay * 2 ** attempt, max_delay) * (0.5 + random.random() / 2)
+
+def _analyze_with_retry(client, custom_model_id, path_to_id_document, max_retries, base_delay, max_delay):
+    for attempt in range(max_retries + 1):
+        try:
+            return _analyze_traced(client, custom_model_id, path_to_id_document)
+        except HttpResponseError as error:
+            if error.status_code != 429 or attempt == max_retries:
+                raise
+            telemetry.increment("document_intelligence.retries")
+            delay = _retry_after_seconds(error, attempt, base_delay, max_delay)
+            logger.info(f"Throttled analyzing '{path_to_id_document}', retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+def _analyze_cached(client, custom_model_id, path_to_id_document, max_retries, base_delay, max_delay, use_cache):
+    def analyze():
+        return _analyze_with_retry(client, custom_model_id, path_to_id_document, max_retries, base_delay, max_delay)
+
+    if not use_cache:
+        return analyze()
+    return cached_analysis(custom_model_id, resolve_document_path(path_to_id_document), analyze)
+
+def analyze_documents_batch(custom_model_id, paths, max_concurrency=4, max_retries=5, base_delay=1.0,
+                            max_delay=60.0, client=None, use_cache=True):
+    """
+    Analyze many documents concurrently with one shared client, yielding results as they complete.
+
+    Documents already in the analysis cache are served from it. Throttled requests (HTTP 429) are
+    retried with the service's Retry-After delay or exponential backoff. Other failures are
+    reported in the result instead of stopping the batch.
+
+    Args:
+        custom_model_id (str): ID of the custom model.
+        paths (list): Local file paths and/or SAS URLs.
+        max_concurrency (int): Maximum number of analyses in flight.
+        max_retries (int): Maximum retries per document after a 429.
+        base_delay (float): Initial backoff delay in seconds.
+        max_delay (float): Maximum backoff delay in seconds.
+        client (DocumentIntelligenceClient): Client to use; the shared client if None.
+        use_cache (bool): Consult the analysis cache (if enabled in its settings).
+
+    Yields:
+        dict: {"path", "documents", "error"} for each input, in completion order.
+    """
+    client = client or get_client()
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        futures = {
+            executor.submit(_analyze_cached, client, custom_model_id, path, max_retries, base_delay, max_delay,
+                            use_cache): path
+            for path in paths
+        }
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                yield {"path": path, "documents": future.result(), "error": None}
+            except Exception as error:
+                logger.info(f"Analysis failed for '{path}': {error}")
+                yield {"path": path, "documents": None, "error": error}
+
 if __name__ == "__main__":
-    from azure.core.exceptions import HttpResponseError
     from dotenv import find_dotenv, load_dotenv
     import logging
     import yaml
@@ -1,5 +1,10 @@
-import os
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from azure.core.credentials import AzureKeyCredential
+from azure.core.exceptions import HttpResponseError
 from azure.search.documents import SearchClient
 from azure.search.documents.indexes import SearchIndexClient
 from azure.search.documents.indexes.models import (
@@ -10,6 +15,17 @@ from azure.search.documents.indexes.models import (
     VectorSearchProfile,
     SearchIndex
 )
+from chunking.chroma_store import chunk_key
+from telemetry import telemetry
+
+# Per-request service limits for document uploads
+MAX_BATCH_DOCS = 1000
+MAX_BATCH_BYTES = 16 * 2**20
+# Statuses worth retrying: conflicts, throttling and transient service errors
+RETRYABLE_STATUS_CODES = {409, 422, 429, 500, 503}
+
+_search_clients = {}
+_search_clients_lock = threading.Lock()
 
 def create_index(service_endpoint, api_key, index_name, vector_dim):
     """
@@ -58,21 +74,165 @@ def create_index(service_endpoint, api_key, index_name, vector_dim):
     result = index_client.create_or_update_index(index)
     print(f"✅ Index '{result.name}' created successfully.")
 
-def index_documents(service_endpoint, api_key, index_name, documents):
+def get_search_client(service_endpoint, api_key, index_name):
+    """
+    Return a shared SearchClient for an index, so every call reuses one connection pool.
+    """
+    key = (service_endpoint, index_name, api_key)
+    with _search_clients_lock:
+        if key not in _search_clients:
+            _search_clients[key] = SearchClient(
+                endpoint=service_endpoint, index_name=index_name, credential=AzureKeyCredential(api_key)
+            )
+        return _search_clients[key]
+
+def split_batches(documents, max_docs=MAX_BATCH_DOCS, max_bytes=MAX_BATCH_BYTES):
+    """
+    Split documents into batches that respect the per-request document count and payload size limits.
+
+    Args:
+        documents (list): Documents to upload.
+        max_docs (int): Maximum documents per batch.
+        max_bytes (int): Maximum approximate JSON payload size per batch in bytes.
+
+    Returns:
+        list: A list of document batches.
+    """
+    batches, batch, batch_bytes = [], [], 0
+    for document in documents:
+        size = len(json.dumps(document, separators=(",", ":")))
+        if batch and (len(batch) >= max_docs or batch_bytes + size > max_bytes):
+            batches.append(batch)
+            batch, batch_bytes = [], 0
+        batch.append(document)
+        batch_bytes += size
+    if batch:
+        batches.append(batch)
+    return batches
+
+def _upload_batch(search_client, batch, key_field, max_retries, base_delay):
+    """
+    Merge-or-upload one batch, retrying only the keys that failed with a retryable status.
+
+    Returns:
+        tuple: (number of documents indexed, list of (key, status_code, error_message) that failed)
+    """
+    pending = batch
+    succeeded = 0
+    failed = []
+    for attempt in range(max_retries + 1):
+        try:
+            with telemetry.span("azure_search.upload", documents=len(pending), attempt=attempt):
+                results = search_client.merge_or_upload_documents(documents=pending)
+        except HttpResponseError as error:
+            if error.status_code not in RETRYABLE_STATUS_CODES or attempt == max_retries:
+                raise
+            telemetry.increment("azure_search.retries")
+            time.sleep(base_delay * 2 ** attempt * (0.5 + random.random() / 2))
+            continue
+
+        # A 207 response reports per-key status: keep only the retryable failures for the next attempt
+        retry_keys = set()
+        for result in results:
+            if result.succeeded:
+                succeeded += 1
+            elif result.status_code in RETRYABLE_STATUS_CODES and attempt < max_retries:
+                retry_keys.add(result.key)
+            else:
+                failed.append((result.key, result.status_code, result.error_message))
+        if not retry_keys:
+            break
+        pending = [document for document in pending if document[key_field] in retry_keys]
+        telemetry.increment("azure_search.retried_documents", len(pending))
+        time.sleep(base_delay * 2 ** attempt * (0.5 + random.random() / 2))
+    return succeeded, failed
+
+def index_documents(service_endpoint, api_key, index_name, documents, max_in_flight=4,
+                    max_batch_docs=MAX_BATCH_DOCS, max_batch_bytes=MAX_BATCH_BYTES, max_retries=5,
+                    base_delay=1.0, key_field="id"):
     """
     Index documents into Azure Cognitive Search.
 
+    Documents are split into batches by count and payload size and uploaded concurrently with
+    merge-or-upload, so re-running the same upload is idempotent. Keys that fail with a retryable
+    status in a partial (207) response are retried with exponential backoff.
+
     Args:
         service_endpoint (str): Azure Cognitive Search service endpoint.
         api_key (str): Azure Cognitive Search API key.
         index_name (str): Name of the index to upload documents to.
         documents (list): List of documents to index. Each document should include precomputed embeddings.
+        max_in_flight (int): Maximum number of batches uploaded concurrently.
+        max_batch_docs (int): Maximum documents per batch.
+        max_batch_bytes (int): Maximum payload size per batch in bytes.
+        max_retries (int): Maximum retries per batch for retryable failures.
+        base_delay (float): Initial backoff delay in seconds.
+        key_field (str): Name of the index key field.
 
     Returns:
-        None
+        dict: Counts of indexed and failed documents, the failures, elapsed seconds and documents per second.
+    """
+    search_client = get_search_client(service_endpoint, api_key, index_name)
+    batches = split_batches(documents, max_batch_docs, max_batch_bytes)
+
+    start = time.perf_counter()
+    succeeded = 0
+    failed = []
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        futures = [
+            executor.submit(_upload_batch, search_client, batch, key_field, max_retries, base_delay)
+            for batch in batches
+        ]
+        for future in as_completed(futures):
+            batch_succeeded, batch_failed = future.result()
+            succeeded += batch_succeeded
+            failed.extend(batch_failed)
+    elapsed = time.perf_counter() - start
+    telemetry.increment("documents_indexed", succeeded)
+    telemetry.increment("documents_index_failed", len(failed))
+
+    stats = {
+        "indexed": succeeded,
+        "failed": len(failed),
+        "failures": failed,
+        "seconds": elapsed,
+        "docs_per_second": succeeded / elapsed if elapsed > 0 else float("inf"),
+    }
+    print(f"✅ Indexed {succeeded} documents in {len(batches)} batches "
+          f"({stats['docs_per_second']:.1f} docs/s), {len(failed)} failed.")
+    return stats
+
+def chunks_to_documents(chunks):
+    """
+    Convert embedded chunks into documents for the search index.
+
+    Args:
+        chunks (list): Chunks with "document_index", "chunk_id", "chunk" and "embedding".
+
+    Returns:
+        list: Search documents keyed by chunk id.
+    """
+    return [{
+        "id": chunk_key(chunk["document_index"], chunk["chunk_id"]),
+        "document_index": str(chunk["document_index"]),  # Convert to string
+        "chunk_id": str(chunk["chunk_id"]),  # Convert to string
+        "chunk_text": chunk["chunk"],
+        "text_vector": chunk["embedding"]
+    } for chunk in chunks]
+
+def delete_documents(service_endpoint, api_key, index_name, ids, max_batch_docs=MAX_BATCH_DOCS, key_field="id"):
     """
-    search_client = SearchClient(endpoint=service_endpoint, index_name=index_name, credential=AzureKeyCredential(api_key))
+    Delete documents from the index by key.
 
-    # Upload documents
-    result = search_client.upload_documents(documents=documents)
-    print(f"✅ Indexed {len(result)} documents successfully.")
\ No newline at end of file
+    Args:
+        service_endpoint (str): Azure Cognitive Search service endpoint.
+        api_key (str): Azure Cognitive Search API key.
+        index_name (str): Name of the index.
+        ids (list): Keys of the documents to delete.
+        max_batch_docs (int): Maximum keys per request.
+        key_field (str): Name of the index key field.
+    """
+    search_client = get_search_client(service_endpoint, api_key, index_name)
+    for offset in range(0, len(ids), max_batch_docs):
+        search_client.delete_documents(documents=[{key_field: key} for key in ids[offset:offset + max_batch_docs]])
+    print(f"🗑️ Deleted {len(ids)} documents from index '{index_name}'.")
@@ -0,0 +1,95 @@
+import hashlib
+import json
+import os
+import re
+
+def file_sha256(path, block_size=1 << 20):
+    """
+    Compute the SHA-256 of a file's bytes.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def source_id(path):
+    """
+    Build a stable, index-key-safe id for a source document from its path.
+    """
+    stem = re.sub(r"[^A-Za-z0-9_-]", "_", os.path.splitext(os.path.basename(path))[0])
+    return f"{stem}-{hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()[:8]}"
+
+class IngestManifest:
+    """
+    Record of what has been ingested for each source document.
+
+    For every source, keyed by its absolute path, it stores a fingerprint (file hash, Document
+    Intelligence model id, chunker settings and embedding model) and the chunk ids it produced, so
+    re-runs can skip unchanged documents and delete chunks that are no longer produced.
+
+    Args:
+        path (str): JSON file holding the manifest.
+    """
+
+    def __init__(self, path="./data/ingest_manifest.json"):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                # Older manifests were keyed by the path as given on the command line
+                self.entries = {os.path.abspath(source): entry for source, entry in json.load(f).items()}
+
+    @staticmethod
+    def fingerprint(file_hash, model_id, chunker_settings, embedding_model):
+        return {
+            "file_hash": file_hash,
+            "model_id": model_id,
+            "chunker": chunker_settings,
+            "embedding_model": embedding_model,
+        }
+
+    def is_current(self, source, fingerprint):
+        """
+        Return True if the source was already ingested with exactly this fingerprint.
+        """
+        entry = self.entries.get(os.path.abspath(source))
+        return entry is not None and entry["fingerprint"] == fingerprint
+
+    def chunk_ids(self, source):
+        return list((self.entries.get(os.path.abspath(source)) or {}).get("chunk_ids", []))
+
+    def stale_chunk_ids(self, source, new_chunk_ids):
+        """
+        Return the chunk ids recorded for a source that the new ingest no longer produces.
+        """
+        new_chunk_ids = set(new_chunk_ids)
+        return [chunk_id for chunk_id in self.chunk_ids(source) if chunk_id not in new_chunk_ids]
+
+    def removed_sources(self, current_sources, root):
+        """
+        Return the recorded sources in the scanned folder `root` that are not in the current set of
+        sources. Sources elsewhere were simply not scanned this run; a file `root` removes nothing.
+        """
+        if not os.path.isdir(root):
+            return []
+        root = os.path.abspath(root)
+        current_sources = {os.path.abspath(source) for source in current_sources}
+        return [source for source in self.entries
+                if os.path.dirname(source) == root and source not in current_sources]
+
+    def record(self, source, fingerprint, chunk_ids):
+        self.entries[os.path.abspath(source)] = {"fingerprint": fingerprint, "chunk_ids": list(chunk_ids)}
+
+    def remove(self, source):
+        self.entries.pop(os.path.abspath(source), None)
+
+    def save(self):
+        """
+        Write the manifest atomically.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.entries, f, indent=2)
+        os.replace(tmp_path, self.path)
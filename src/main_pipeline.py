@@ -7,10 +7,26 @@ from dotenv import load_dotenv, find_dotenv
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), 'src')))
 
 # Import functions from custom modules
-from get_custom_text.analyze_custom_doc_main import main as analyze_documents
-from chunking.chunk_and_embed import chunk_and_embed
-from indexing.index_to_azure import create_index, index_documents
+from get_custom_text.buildCustomModel import build_model
+from get_custom_text.extract_custom_doc import analyze_documents_batch
+from get_custom_text.analysis_cache import configure_analysis_cache
+from chunking.chunk_and_embed import chunk_and_embed, split_documents, embed_chunks, configure_chunker, CHUNKER_SETTINGS
+from chunking.chroma_store import chunk_key, get_collection, upsert_chunks, delete_chunks
+from chunking.chunk_store import ChunkStore
+from chunking.embedding_engine import DEFAULT_MODEL_NAME
+from chunking.onnx_encoder import configure_encoder, encoder_variant
+from indexing.index_to_azure import create_index, index_documents, chunks_to_documents, delete_documents
+from indexing.manifest import IngestManifest, file_sha256, source_id
 from retrieve_chunks_and_compare import compare_documents
+from comparison.generation import configure_generation
+from comparison.context_packer import configure_context_packer
+from comparison.report_cache import configure_report_cache, get_report_cache
+from model_registry import registry
+from streaming_pipeline import StreamingPipeline, Stage
+from telemetry import configure_telemetry, telemetry
+
+# Document types accepted when `file_path_to_doc` points to a folder
+SUPPORTED_EXTENSIONS = {".pdf", ".jpg", ".jpeg", ".png", ".tif", ".tiff", ".bmp"}
 
 def load_config_and_env():
     """
@@ -24,25 +40,212 @@ def load_config_and_env():
     load_dotenv(find_dotenv())
     return config
 
+def list_sources(path):
+    """
+    Return the absolute paths of the documents to ingest: the file itself, or the supported files in a folder.
+    """
+    path = os.path.abspath(path)
+    if os.path.isdir(path):
+        return sorted(
+            os.path.join(path, name) for name in os.listdir(path)
+            if os.path.splitext(name)[1].lower() in SUPPORTED_EXTENSIONS
+        )
+    return [path]
+
+def analyze_sources(sources, model_id, training_folder_path, config):
+    """
+    Analyze the source documents concurrently with `analyze_documents_batch`, serving unchanged
+    documents from the analysis cache and retrying throttled requests.
+
+    Concurrency and retries come from `doc_intelligence.max_concurrency` and `max_retries` in
+    config.yaml. A custom model is built first if no model id is configured.
+
+    Yields:
+        dict: {"path", "documents", "error"} for each source, in completion order.
+    """
+    analysis_config = config.get('doc_intelligence') or {}
+    if model_id is None:
+        if training_folder_path is None:
+            raise ValueError("No custom model id is configured and the training folder path to build one is missing.")
+        model_id = build_model(training_folder_path)
+    return analyze_documents_batch(model_id, sources,
+                                   max_concurrency=analysis_config.get('max_concurrency', 4),
+                                   max_retries=analysis_config.get('max_retries', 5))
+
+def tag_documents(source, documents):
+    """
+    Tag each analyzed document of a source with a stable source id.
+    """
+    for doc in documents:
+        doc["source_id"] = f"{source_id(source)}_{doc['document_index']}"
+    return documents
+
+def failed_sources(chunks, index_stats):
+    """
+    Return the sources with at least one chunk that `index_documents` failed to index for good.
+    """
+    failed_keys = {key for key, _, _ in index_stats["failures"]}
+    return list(dict.fromkeys(chunk_data["source"] for chunk_data in chunks
+                              if chunk_key(chunk_data["document_index"], chunk_data["chunk_id"]) in failed_keys))
+
+def ingest_batch(sources, model_id, training_folder_path, config, service_endpoint, api_key, index_name):
+    """
+    Analyze, chunk, embed, and index the sources one stage at a time.
+
+    Returns:
+        tuple: The indexed chunks, each tagged with its "source", and the sources that failed to
+        be analyzed or whose chunks could not all be indexed. Other failures are raised.
+    """
+    # Analyze documents
+    print("Analyzing documents...")
+    document_results = []
+    source_of = {}
+    failed = []
+    with telemetry.span("analyze", documents=len(sources)):
+        for result in analyze_sources(sources, model_id, training_folder_path, config):
+            if result["error"] is not None:
+                failed.append(result["path"])
+                continue
+            for doc in tag_documents(result["path"], result["documents"]):
+                source_of[doc["source_id"]] = result["path"]
+                document_results.append(doc)
+    print(f"Document analysis completed. Results: {document_results}")
+
+    # Chunk, embed, and store in Chroma
+    print("Chunking, embedding, and storing in Chroma...")
+    embedding_config = config.get('embedding') or {}
+    chunks = chunk_and_embed(
+        document_results,
+        batch_size=embedding_config.get('batch_size', 64),
+        num_threads=embedding_config.get('num_threads'),
+        use_cache=embedding_config.get('use_cache', True),
+    )  # Get the chunks with metadata and embeddings
+
+    # Index embeddings into Azure AI Search
+    print("Indexing embeddings into Azure AI Search...")
+    stats = index_documents(service_endpoint, api_key, index_name, chunks_to_documents(chunks))
+
+    for chunk in chunks:
+        chunk["source"] = source_of[chunk["document_index"]]
+    failed += failed_sources(chunks, stats)
+    if failed:
+        print(f"{len(failed)} documents failed to ingest and will be retried on the next run: {failed}")
+    return [chunk for chunk in chunks if chunk["source"] not in failed], failed
+
+def ingest_streaming(sources, model_id, training_folder_path, config, service_endpoint, api_key, index_name):
+    """
+    Analyze, chunk, embed, and index the sources with all stages running concurrently.
+
+    Sources are analyzed concurrently by `analyze_sources`, then flow through chunk -> embed -> index in micro-batches of
+    up to `pipeline.batch_size` documents (or whatever arrived within `pipeline.batch_wait_ms`),
+    connected by bounded queues, so Document Intelligence calls, embedding and index uploads
+    overlap while embedding and the bulk writes still run on batches. Worker counts and queue
+    sizes also come from `pipeline` in config.yaml.
+
+    Returns:
+        tuple: The indexed chunks (without their text and embedding), each tagged with its
+        "source", and the sources that failed.
+    """
+    pipeline_config = config.get('pipeline') or {}
+    workers = pipeline_config.get('workers') or {}
+    queue_size = pipeline_config.get('queue_size', 8)
+    batching = {
+        "batch_size": pipeline_config.get('batch_size', 16),
+        "batch_wait": pipeline_config.get('batch_wait_ms', 200) / 1000,
+    }
+    embedding_config = config.get('embedding') or {}
+    collection = get_collection()
+    chunk_store = ChunkStore()
+
+    def analyze(result):
+        # Analysis failures are raised here so the stage records them like any other error
+        if result["error"] is not None:
+            raise result["error"]
+        return result["path"], tag_documents(result["path"], result["documents"])
+
+    def chunk(items):
+        chunks = split_documents([doc for _, documents in items for doc in documents])
+        source_of = {doc["source_id"]: source for source, documents in items for doc in documents}
+        for chunk_data in chunks:
+            chunk_data["source"] = source_of[chunk_data["document_index"]]
+        return [chunks]
+
+    def embed(batches):
+        chunks = [chunk_data for chunks in batches for chunk_data in chunks]
+        embed_chunks(
+            chunks,
+            batch_size=embedding_config.get('batch_size', 64),
+            num_threads=embedding_config.get('num_threads'),
+            use_cache=embedding_config.get('use_cache', True),
+        )
+        return [chunks]
+
+    def index(batches):
+        chunks = [chunk_data for chunks in batches for chunk_data in chunks]
+        upsert_chunks(collection, chunks)
+        chunk_store.append(chunks)
+        stats = index_documents(service_endpoint, api_key, index_name, chunks_to_documents(chunks))
+        failed = set(failed_sources(chunks, stats))
+        # Only the ids leave the pipeline, so finished embeddings are not held until the end
+        return [[{"source": chunk_data["source"], "document_index": chunk_data["document_index"],
+                  "chunk_id": chunk_data["chunk_id"], "failed": chunk_data["source"] in failed}
+                 for chunk_data in chunks]]
+
+    pipeline = StreamingPipeline([
+        Stage("analyze", analyze, workers=1, queue_size=queue_size),
+        Stage("chunk", chunk, workers=workers.get('chunk', 1), queue_size=queue_size, **batching),
+        Stage("embed", embed, workers=workers.get('embed', 1), queue_size=queue_size, **batching),
+        Stage("index", index, workers=workers.get('index', 2), queue_size=queue_size, **batching),
+    ], report_interval=pipeline_config.get('report_interval'), output_queue_size=queue_size)
+    results = analyze_sources(sources, model_id, training_folder_path, config)
+    indexed = [chunk_data for chunks in pipeline.iter_run(results) for chunk_data in chunks]
+    print(pipeline.format_stats())
+
+    failed = []
+    for stage in pipeline.stages:
+        for item, _ in stage.errors:
+            if isinstance(item, dict):
+                failed.append(item["path"])  # analyze: the analysis result of the source
+            elif isinstance(item, tuple):
+                failed.append(item[0])  # chunk: (source, documents)
+            else:
+                failed += [chunk_data["source"] for chunk_data in item]  # embed, index: a batch of chunks
+    # Sources with chunks rejected for good by the index (e.g. in a 207 response)
+    failed += [chunk_data["source"] for chunk_data in indexed if chunk_data["failed"]]
+    failed = list(dict.fromkeys(failed))
+    if failed:
+        print(f"{len(failed)} documents failed to ingest and will be retried on the next run: {failed}")
+    return [chunk_data for chunk_data in indexed if chunk_data["source"] not in failed], failed
+
 def main_pipeline():
     """
     Main pipeline to analyze documents, chunk, embed, and store in Chroma.
+
+    Only new or changed documents (per the ingest manifest) are re-analyzed, re-embedded and
+    re-indexed; chunks no longer produced by a document are deleted from Chroma and the index, as
+    are the chunks of documents removed from the scanned folder.
     """
     # Step 1: Load configuration and environment variables
     print("Loading configuration and environment variables...")
     config = load_config_and_env()
+    memory_budget_gb = (config.get('models') or {}).get('memory_budget_gb')
+    if memory_budget_gb:
+        registry.memory_budget_bytes = int(memory_budget_gb * 2**30)
+    configure_generation(**(config.get('llm') or {}))
+    configure_context_packer(**((config.get('comparison') or {}).get('context') or {}))
+    configure_chunker(**(config.get('chunking') or {}))
+    configure_encoder(**(config.get('encoder') or {}))
+    configure_analysis_cache(**(config['doc_intelligence'].get('cache') or {}))
+    configure_report_cache(**((config.get('comparison') or {}).get('cache') or {}))
+    configure_telemetry(**(config.get('telemetry') or {}))
 
-    # Step 2: Create the index
-    print("Creating the Azure Cognitive Search index...")
     service_endpoint = os.getenv("AZURE_SEARCH_ENDPOINT")
     api_key = os.getenv("AZURE_SEARCH_API_KEY")
     index_name = "insurance-docs-index"
     vector_dim = 384  # Adjust this to match your embedding dimensions
 
-    create_index(service_endpoint, api_key, index_name, vector_dim)
-
-    # Step 3: Analyze documents
-    print("Analyzing documents...")
+    # Step 2: Find new or changed documents
+    print("Checking documents against the ingest manifest...")
     model_id = config['doc_intelligence']['custom_models']['custom_insurance_model_1']
     training_folder_path = os.getenv("training_folder_SAS_URI")
     path_to_id_document = os.getenv("file_path_to_doc")
@@ -50,39 +253,80 @@ def main_pipeline():
     if not os.path.exists(path_to_id_document):
         raise FileNotFoundError(f"The file at path '{path_to_id_document}' does not exist. Please check the file path.")
 
-    # Analyze the document and get results
-    document_results = analyze_documents(path_to_id_document, model_id, training_folder_path)
-    print(f"Document analysis completed. Results: {document_results}")
+    pipeline_config = config.get('pipeline') or {}
+    manifest = IngestManifest(pipeline_config.get('manifest_path', './data/ingest_manifest.json'))
+    sources = list_sources(path_to_id_document)
+    fingerprints = {
+        source: IngestManifest.fingerprint(file_sha256(source), model_id, CHUNKER_SETTINGS,
+                                             encoder_variant(DEFAULT_MODEL_NAME))
+        for source in sources
+    }
+    changed = [source for source in sources if not manifest.is_current(source, fingerprints[source])]
+    removed = manifest.removed_sources(sources, path_to_id_document)
+    print(f"{len(changed)} new or changed, {len(sources) - len(changed)} unchanged, {len(removed)} removed documents.")
+    telemetry.increment("documents_changed", len(changed))
+    telemetry.increment("documents_removed", len(removed))
 
-    # Step 4: Chunk, embed, and store in Chroma
-    print("Chunking, embedding, and storing in Chroma...")
-    chunks = chunk_and_embed(document_results)  # Get the chunks with metadata and embeddings
+    if changed or removed:
+        # Step 3: Create the index
+        print("Creating the Azure Cognitive Search index...")
+        create_index(service_endpoint, api_key, index_name, vector_dim)
 
-    # Step 5: Index embeddings into Azure AI Search
-    print("Indexing embeddings into Azure AI Search...")
+        # Steps 4-6: Analyze, chunk, embed, and index the changed documents
+        with telemetry.span("ingest", documents=len(changed)):
+            if pipeline_config.get('streaming', False):
+                print("Analyzing, embedding, and indexing documents as a streaming pipeline...")
+                chunks, failed = ingest_streaming(changed, model_id, training_folder_path, config,
+                                                  service_endpoint, api_key, index_name)
+            else:
+                chunks, failed = ingest_batch(changed, model_id, training_folder_path, config,
+                                              service_endpoint, api_key, index_name)
+        telemetry.increment("documents_failed", len(failed))
 
-    # Prepare documents for indexing
-    documents = []
-    for chunk in chunks:
-        documents.append({
-            "id": f"doc_{chunk['document_index']}_chunk_{chunk['chunk_id']}",
-            "document_index": str(chunk["document_index"]),  # Convert to string
-            "chunk_id": str(chunk["chunk_id"]),  # Convert to string
-            "chunk_text": chunk["chunk"],
-            "text_vector": chunk["embedding"]
-        })
+        # Step 7: Delete chunks that changed or removed documents no longer produce
+        changed = [source for source in changed if source not in failed]
+        new_chunk_ids = {source: [] for source in changed}
+        for chunk in chunks:
+            new_chunk_ids[chunk["source"]].append(chunk_key(chunk["document_index"], chunk["chunk_id"]))
+        stale = [chunk_id for source in changed for chunk_id in manifest.stale_chunk_ids(source, new_chunk_ids[source])]
+        stale += [chunk_id for source in removed for chunk_id in manifest.chunk_ids(source)]
+        # Never delete what this run just wrote, e.g. a document that moved within the folder
+        written = {chunk_id for chunk_ids in new_chunk_ids.values() for chunk_id in chunk_ids}
+        stale = [chunk_id for chunk_id in dict.fromkeys(stale) if chunk_id not in written]
+        if stale:
+            print(f"Deleting {len(stale)} stale chunks...")
+            with telemetry.span("delete_stale", chunks=len(stale)):
+                delete_chunks(get_collection(), stale)
+                ChunkStore().delete(stale)
+                delete_documents(service_endpoint, api_key, index_name, stale)
 
-    # Index the documents
-    index_documents(service_endpoint, api_key, index_name, documents)
+        for source in changed:
+            manifest.record(source, fingerprints[source], new_chunk_ids[source])
+        for source in removed:
+            manifest.remove(source)
+        manifest.save()
+    else:
+        print("All documents are up to date, skipping ingestion.")
 
     print("Pipeline completed successfully.")
 
-    # Step 6: Compare documents using LLaMA
+    # Step 8: Compare documents using LLaMA
     print("Comparing documents using LLaMA...")
     query = "Compare the insurance policies for premium and deductible changes."
-    response = compare_documents(query, service_endpoint, api_key, index_name)
+    comparison_config = config.get('comparison') or {}
+    embedding_config = config.get('embedding') or {}
+    # The first document found in each of the first two sources, as tagged by `tag_documents`
+    document_ids = [f"{source_id(source)}_1" for source in sources[:2]] if len(sources) >= 2 else None
+    with telemetry.span("compare"):
+        response = compare_documents(query, service_endpoint, api_key, index_name, report_cache=get_report_cache(),
+                                     document_ids=document_ids, top_k=comparison_config.get('top_k', 10),
+                                     rerank=comparison_config.get('rerank'),
+                                     use_embedding_cache=embedding_config.get('use_cache', True))
     print("Comparison Results:")
     print(response)
 
+    print("Telemetry:")
+    print(telemetry.format_snapshot())
+
 if __name__ == "__main__":
-    main_pipeline()
\ No newline at end of file
+    main_pipeline()
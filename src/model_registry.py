@@ -0,0 +1,132 @@
+import gc
+import threading
+import time
+
+class ModelRegistry:
+    """
+    Registry of lazily-loaded model singletons.
+
+    Models are registered with a loader function and only loaded on first `get`. When a memory
+    budget is set, least recently used models are unloaded before a new one is loaded so the
+    estimated total stays under the budget.
+
+    Each model loads under its own lock, so a slow load does not block `get` of other (loaded)
+    models; concurrent `get` calls for the same model wait for the one load.
+
+    Args:
+        memory_budget_bytes (int): Maximum estimated memory for all loaded models. No limit if None.
+    """
+
+    def __init__(self, memory_budget_bytes=None):
+        self.memory_budget_bytes = memory_budget_bytes
+        self._loaders = {}
+        self._estimates = {}
+        self._models = {}
+        self._sizes = {}
+        self._last_used = {}
+        self._reserved = {}  # Estimated bytes of the models being loaded
+        self._load_locks = {}
+        self._lock = threading.RLock()
+
+    def register(self, name, loader, estimated_bytes=None):
+        """
+        Register a model loader under a name without loading it.
+
+        Args:
+            name (str): Name used to fetch the model.
+            loader (callable): Zero-argument function that loads and returns the model object(s).
+            estimated_bytes (int): Expected memory footprint, used for budgeting before the first load.
+        """
+        with self._lock:
+            self._loaders[name] = loader
+            self._estimates[name] = estimated_bytes
+
+    def get(self, name):
+        """
+        Return the loaded model, loading it on first use.
+        """
+        with self._lock:
+            if name in self._models:
+                return self._touch(name)
+            if name not in self._loaders:
+                raise KeyError(f"No model registered under '{name}'.")
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                # Loaded by another thread while this one waited
+                if name in self._models:
+                    return self._touch(name)
+                estimate = self._estimates.get(name) or 0
+                self._make_room(estimate, keep=name)
+                self._reserved[name] = estimate
+                loader = self._loaders[name]
+
+            print(f"Loading model '{name}'...")
+            start = time.perf_counter()
+            try:
+                model = loader()
+            finally:
+                with self._lock:
+                    self._reserved.pop(name, None)
+            with self._lock:
+                self._models[name] = model
+                self._sizes[name] = estimate_size(model) or estimate
+                print(f"Loaded model '{name}' in {time.perf_counter() - start:.1f}s "
+                      f"(~{self._sizes[name] / 2**30:.2f} GiB).")
+                return self._touch(name)
+
+    def _touch(self, name):
+        self._last_used[name] = time.monotonic()
+        return self._models[name]
+
+    def warmup(self, *names):
+        """
+        Load the given models (all registered models if none are given) ahead of the first request.
+        """
+        for name in names or list(self._loaders):
+            self.get(name)
+
+    def unload(self, name):
+        """
+        Drop a loaded model so its memory can be reclaimed.
+        """
+        with self._lock:
+            if self._models.pop(name, None) is not None:
+                self._sizes.pop(name, None)
+                self._last_used.pop(name, None)
+                gc.collect()
+                print(f"Unloaded model '{name}'.")
+
+    def is_loaded(self, name):
+        return name in self._models
+
+    def loaded_bytes(self):
+        return sum(self._sizes.values())
+
+    def _make_room(self, needed_bytes, keep):
+        """
+        Unload least recently used models until `needed_bytes` fits in the memory budget, next to
+        the models already being loaded.
+        """
+        if self.memory_budget_bytes is None:
+            return
+        needed_bytes += sum(self._reserved.values())
+        for name in sorted(self._last_used, key=self._last_used.get):
+            if self.loaded_bytes() + needed_bytes <= self.memory_budget_bytes:
+                break
+            if name != keep:
+                self.unload(name)
+
+def estimate_size(obj):
+    """
+    Estimate the memory held by a torch module (or a tuple/list containing modules) in bytes.
+    """
+    if isinstance(obj, (tuple, list)):
+        return sum(estimate_size(item) for item in obj)
+    if hasattr(obj, "parameters") and hasattr(obj, "buffers"):
+        tensors = list(obj.parameters()) + list(obj.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+    return 0
+
+registry = ModelRegistry()
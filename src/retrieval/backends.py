@@ -0,0 +1,219 @@
+import abc
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from telemetry import telemetry
+
+class VectorSearchBackend(abc.ABC):
+    """
+    Interface for vector search over indexed chunks.
+
+    `search` returns chunk dictionaries shaped like the output of `chunk_and_embed`
+    ("id", "document_index", "chunk_id", "chunk", plus "score" and, where available, "embedding"),
+    best match first.
+    """
+
+    @abc.abstractmethod
+    def search(self, query_embedding, top_k=5, document_index=None):
+        """
+        Find the chunks most similar to a query embedding.
+
+        Args:
+            query_embedding (list): Embedding vector for the query.
+            top_k (int): Number of results to return.
+            document_index (str): Only search the chunks of this document, if given.
+
+        Returns:
+            list: Matching chunks, best first.
+        """
+
+    def search_documents(self, query_embedding, document_indexes, top_k=5, max_concurrency=8):
+        """
+        Run one filtered search per document concurrently, so the latency is about that of a single query.
+
+        Args:
+            query_embedding (list): Embedding vector for the query.
+            document_indexes (list): Documents to search.
+            top_k (int): Number of results per document.
+            max_concurrency (int): Maximum number of searches in flight.
+
+        Returns:
+            dict: Matching chunks for each document index, best first.
+        """
+        document_indexes = list(dict.fromkeys(str(document_index) for document_index in document_indexes))
+        if not document_indexes:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(max_concurrency, len(document_indexes))) as executor:
+            results = executor.map(lambda document_index: self.search(query_embedding, top_k, document_index),
+                                   document_indexes)
+            return dict(zip(document_indexes, results))
+
+def odata_string(value):
+    """
+    Quote a value as an OData string literal, doubling embedded single quotes.
+    """
+    return "'" + str(value).replace("'", "''") + "'"
+
+def _records_from_chunks(chunks):
+    return [{
+        "id": chunk.get("id", f"doc_{chunk['document_index']}_chunk_{chunk['chunk_id']}"),
+        "document_index": str(chunk["document_index"]),
+        "chunk_id": str(chunk["chunk_id"]),
+        "chunk": chunk["chunk"],
+    } for chunk in chunks]
+
+class NumpySearchBackend(VectorSearchBackend):
+    """
+    Exact in-process cosine search over a (possibly memory-mapped) float32 embedding matrix.
+
+    Args:
+        embeddings (np.ndarray): Matrix of shape (n, dim), one row per record.
+        records (list): Chunk metadata, one dictionary per row.
+    """
+
+    def __init__(self, embeddings, records):
+        self.embeddings = embeddings
+        self.records = records
+        # Row norms are precomputed so the matrix itself can stay read-only and memory-mapped
+        self.norms = np.maximum(np.linalg.norm(embeddings, axis=1), 1e-12).astype(np.float32)
+        self.rows_by_document = {}
+        for row, record in enumerate(records):
+            self.rows_by_document.setdefault(record["document_index"], []).append(row)
+        self.rows_by_document = {key: np.asarray(rows) for key, rows in self.rows_by_document.items()}
+
+    @classmethod
+    def from_chunks(cls, chunks):
+        embeddings = np.asarray([chunk["embedding"] for chunk in chunks], dtype=np.float32)
+        return cls(embeddings, _records_from_chunks(chunks))
+
+    @classmethod
+    def from_chunk_store(cls, store="./data/chunk_store"):
+        """
+        Load the live chunks written by `chunk_and_embed` and the pipeline to a `ChunkStore` (or its
+        directory); a compacted store is searched without copying its memory-mapped matrix.
+        """
+        from chunking.chunk_store import ChunkStore
+
+        if not isinstance(store, ChunkStore):
+            store = ChunkStore(store)
+        records, embeddings = store.load()
+        return cls(embeddings, _records_from_chunks(records))
+
+    @classmethod
+    def from_chroma(cls, collection_name="insurance_docs", persist_directory="./data/chroma_db"):
+        """
+        Load every chunk and embedding from the persistent Chroma collection.
+        """
+        from chunking.chroma_store import get_collection
+
+        data = get_collection(collection_name, persist_directory).get(include=["embeddings", "documents", "metadatas"])
+        records = [{
+            "id": chunk_id,
+            "document_index": str(metadata["document_index"]),
+            "chunk_id": str(metadata["chunk_id"]),
+            "chunk": document,
+        } for chunk_id, document, metadata in zip(data["ids"], data["documents"], data["metadatas"])]
+        return cls(np.asarray(data["embeddings"], dtype=np.float32), records)
+
+    def _result(self, row, score):
+        return {**self.records[row], "score": float(score), "embedding": np.asarray(self.embeddings[row])}
+
+    def search(self, query_embedding, top_k=5, document_index=None):
+        if not self.records:
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+        if document_index is None:
+            rows = None
+            scores = (self.embeddings @ query) / self.norms
+        else:
+            rows = self.rows_by_document.get(str(document_index))
+            if rows is None:
+                return []
+            scores = (self.embeddings[rows] @ query) / self.norms[rows]
+
+        k = min(top_k, len(scores))
+        if k == 0:
+            return []
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [self._result(rows[i] if rows is not None else i, scores[i]) for i in best]
+
+class HnswSearchBackend(NumpySearchBackend):
+    """
+    Approximate nearest-neighbour search with an in-process HNSW graph (requires `hnswlib`).
+
+    Args:
+        embeddings (np.ndarray): Matrix of shape (n, dim), one row per record.
+        records (list): Chunk metadata, one dictionary per row.
+        m (int): Graph connectivity.
+        ef_construction (int): Candidate list size while building the graph.
+        ef_search (int): Candidate list size while searching; higher is slower but more accurate.
+    """
+
+    def __init__(self, embeddings, records, m=16, ef_construction=200, ef_search=64):
+        import hnswlib
+
+        super().__init__(embeddings, records)
+        self.index = hnswlib.Index(space="cosine", dim=embeddings.shape[1])
+        self.index.init_index(max_elements=max(len(records), 1), M=m, ef_construction=ef_construction)
+        if len(records):
+            self.index.add_items(np.asarray(embeddings, dtype=np.float32), np.arange(len(records)))
+        self.index.set_ef(ef_search)
+
+    def search(self, query_embedding, top_k=5, document_index=None):
+        if document_index is None:
+            count, allowed = len(self.records), None
+        else:
+            rows = self.rows_by_document.get(str(document_index))
+            if rows is None:
+                return []
+            count, allowed = len(rows), set(rows.tolist())
+        k = min(top_k, count)
+        if k == 0:
+            return []
+        labels, distances = self.index.knn_query(
+            np.asarray(query_embedding, dtype=np.float32),
+            k=k,
+            filter=(lambda label: label in allowed) if allowed is not None else None,
+        )
+        return [self._result(int(label), 1.0 - distance) for label, distance in zip(labels[0], distances[0])]
+
+class AzureSearchBackend(VectorSearchBackend):
+    """
+    Vector search in Azure Cognitive Search through the pooled SearchClient of the index.
+
+    Args:
+        service_endpoint (str): Azure Cognitive Search service endpoint.
+        api_key (str): Azure Cognitive Search API key.
+        index_name (str): Name of the Azure Cognitive Search index.
+    """
+
+    def __init__(self, service_endpoint, api_key, index_name):
+        from indexing.index_to_azure import get_search_client
+
+        self.search_client = get_search_client(service_endpoint, api_key, index_name)
+
+    def search(self, query_embedding, top_k=5, document_index=None):
+        from azure.search.documents.models import VectorizedQuery
+
+        with telemetry.span("azure_search.query", top_k=top_k):
+            results = list(self.search_client.search(
+                search_text=None,  # Pure vector search
+                vector_queries=[VectorizedQuery(
+                    vector=[float(value) for value in query_embedding],
+                    k_nearest_neighbors=top_k,
+                    fields="text_vector",  # Field containing the embeddings
+                )],
+                filter=f"document_index eq {odata_string(document_index)}" if document_index is not None else None,
+                select=["id", "document_index", "chunk_id", "chunk_text", "text_vector"],
+                top=top_k,
+            ))
+        return [{
+            "id": result["id"],
+            "document_index": result["document_index"],
+            "chunk_id": result["chunk_id"],
+            "chunk": result["chunk_text"],
+            "score": result["@search.score"],
+            "embedding": result.get("text_vector"),
+        } for result in results]
@@ -0,0 +1,65 @@
+import numpy as np
+from model_registry import registry
+
+CROSS_ENCODER_MODEL_NAME = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+def load_cross_encoder():
+    """
+    Load the small cross-encoder used to rerank retrieved chunks.
+    """
+    from sentence_transformers import CrossEncoder
+
+    return CrossEncoder(CROSS_ENCODER_MODEL_NAME, device="cpu")
+
+registry.register("cross-encoder", load_cross_encoder, estimated_bytes=90 * 2**20)
+
+def mmr(query_embedding, results, top_k=5, diversity=0.3):
+    """
+    Rerank search results with maximal marginal relevance.
+
+    Each pick maximizes similarity to the query minus similarity to the chunks already picked, so
+    near-duplicate chunks do not crowd out other relevant sections. Results without embeddings
+    (e.g. from an index whose vector field is not retrievable) cannot be compared, so they are kept
+    in their search order instead.
+
+    Args:
+        query_embedding (list): Embedding vector for the query.
+        results (list): Search results with an "embedding" each.
+        top_k (int): Number of results to keep.
+        diversity (float): Weight of the redundancy penalty, from 0 (pure relevance) to 1.
+
+    Returns:
+        list: The selected results, in selection order.
+    """
+    if len(results) <= 1 or any(result.get("embedding") is None for result in results):
+        return list(results[:top_k])
+    embeddings = np.asarray([result["embedding"] for result in results], dtype=np.float32)
+    embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+    query = np.asarray(query_embedding, dtype=np.float32)
+    relevance = embeddings @ (query / max(float(np.linalg.norm(query)), 1e-12))
+    pairwise = embeddings @ embeddings.T
+
+    selected = []
+    redundancy = np.full(len(results), -np.inf, dtype=np.float32)
+    available = np.ones(len(results), dtype=bool)
+    for _ in range(min(top_k, len(results))):
+        scores = (1 - diversity) * relevance - diversity * (redundancy if selected else 0.0)
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, pairwise[best])
+    return [results[i] for i in selected]
+
+def cross_encoder_rerank(query, results, top_k=5):
+    """
+    Rerank search results by scoring each (query, chunk) pair with the cross-encoder in one batch.
+
+    Returns:
+        list: The best `top_k` results, each with its "rerank_score".
+    """
+    if not results:
+        return []
+    scores = registry.get("cross-encoder").predict([(query, result["chunk"]) for result in results])
+    ranked = sorted(zip(results, scores), key=lambda pair: -pair[1])[:top_k]
+    return [{**result, "rerank_score": float(score)} for result, score in ranked]
@@ -1,27 +1,63 @@
-from transformers import AutoTokenizer, AutoModelForCausalLM, AutoModel
-from azure.search.documents import SearchClient
-import torch
-import bitsandbytes as bnb
-from sklearn.metrics.pairwise import cosine_similarity
-
-# Load the LLaMA model and tokenizer
-model_name = "/home/~/.llama/checkpoints/Llama-2-7B"  # Correct absolute path
-tokenizer = AutoTokenizer.from_pretrained(model_name, local_files_only=True)
-model = AutoModelForCausalLM.from_pretrained(
-    model_name,
-    torch_dtype=torch.float32,  # Use float32 for CPU
-    # load_in_8bit=True,  # Enable 8-bit quantization
-    device_map=None,  # Disable GPU mapping
-).to("cpu")  # Explicitly move the model to CPU
-
-# Load BERT model and tokenizer for similarity scoring
+import json
+import logging
+from chunking.embedding_engine import get_embedding_engine
+from chunking.embedding_cache import get_embedding_cache
+from comparison.similarity import similarity_matrix, document_similarity
+from comparison.alignment import (
+    align_chunks,
+    summarize_alignment,
+    UNCHANGED,
+    MODIFIED,
+    ADDED,
+    REMOVED,
+)
+from comparison.field_comparator import compare_fields, format_field_change
+from comparison.context_packer import pack_context, packer_settings
+from comparison.generation import generate, stream_generate, generation_settings
+from comparison.report_cache import content_hash, ReportCache
+from chunking.embedding_engine import DEFAULT_MODEL_NAME
+from chunking.onnx_encoder import OnnxEncoder, encoder_settings, encoder_variant
+from model_registry import registry
+from retrieval.backends import AzureSearchBackend
+from retrieval.rerank import mmr, cross_encoder_rerank
+from telemetry import telemetry
+
+logger = logging.getLogger(__name__)
+
+# Models are registered here and only loaded on first use through the registry
 bert_model_name = "bert-base-uncased"
-bert_tokenizer = AutoTokenizer.from_pretrained(bert_model_name)
-bert_model = AutoModel.from_pretrained(bert_model_name)
 
-def retrieve_relevant_chunks(service_endpoint, api_key, index_name, query_embedding, top_k=5):
+def load_bert():
+    """
+    Load the BERT model and tokenizer used for similarity scoring.
+    """
+    from transformers import AutoTokenizer, AutoModel
+
+    bert_tokenizer = AutoTokenizer.from_pretrained(bert_model_name)
+    bert_model = AutoModel.from_pretrained(bert_model_name)
+    bert_model.eval()
+    return bert_tokenizer, bert_model
+
+registry.register("bert", load_bert, estimated_bytes=440 * 2**20)
+registry.register("bert-onnx", lambda: OnnxEncoder(bert_model_name), estimated_bytes=440 * 2**20)
+
+def embed_query(query, use_cache=True):
     """
-    Retrieve relevant chunks from Azure Cognitive Search using query embeddings.
+    Embed a search query with the same model used for the chunks.
+
+    Args:
+        query (str): The query text.
+        use_cache (bool): Serve the query from the persistent embedding cache (`embedding.use_cache`).
+
+    Returns:
+        list: Embedding vector for the query.
+    """
+    cache = get_embedding_cache() if use_cache else None
+    return get_embedding_engine().embed([query], cache=cache)[0].tolist()
+
+def retrieve_relevant_chunks(service_endpoint, api_key, index_name, query_embedding, top_k=5, backend=None):
+    """
+    Retrieve relevant chunks from a vector search backend using query embeddings.
 
     Args:
         service_endpoint (str): Azure Cognitive Search service endpoint.
@@ -29,59 +65,337 @@ def retrieve_relevant_chunks(service_endpoint, api_key, index_name, query_embedd
         index_name (str): Name of the Azure Cognitive Search index.
         query_embedding (list): Embedding vector for the query.
         top_k (int): Number of top results to retrieve.
+        backend (VectorSearchBackend): Backend to search, e.g. an in-process `NumpySearchBackend`.
+            Defaults to Azure Cognitive Search.
 
     Returns:
-        list: List of relevant chunks retrieved from Azure Cognitive Search.
+        list: List of relevant chunk texts.
     """
-    search_client = SearchClient(endpoint=service_endpoint, index_name=index_name, credential=AzureKeyCredential(api_key))
-
-    # Perform vector search
-    results = search_client.search(
-        search_text="",  # Empty because we're using vector search
-        vector=query_embedding,
-        top=top_k,
-        vector_fields="text_vector",  # Field containing the embeddings
-    )
+    if backend is None:
+        backend = AzureSearchBackend(service_endpoint, api_key, index_name)
 
-    # Extract the chunks from the results
-    relevant_chunks = [result["chunk_text"] for result in results]
+    # Perform vector search and extract the chunks from the results
+    relevant_chunks = [result["chunk"] for result in backend.search(query_embedding, top_k=top_k)]
     return relevant_chunks
 
+def rerank_method(rerank):
+    """
+    Validate a rerank method, reading "none" or an empty string (e.g. "None" in a YAML config) as None.
+    """
+    if isinstance(rerank, str) and rerank.strip().casefold() in ("", "none"):
+        rerank = None
+    if rerank not in (None, "mmr", "cross_encoder"):
+        raise ValueError(f"Unknown rerank method '{rerank}'. Expected None, 'mmr' or 'cross_encoder'.")
+    return rerank
+
+def retrieve_document_chunks(service_endpoint, api_key, index_name, query_embedding, document_ids, top_k=5,
+                             backend=None, rerank=None, query=None, fetch_k=None, max_concurrency=8):
+    """
+    Retrieve the most relevant chunks of each of several documents.
+
+    One vector query filtered on `document_index` runs per document, all concurrently. Results are
+    deduplicated (by chunk id and, within a document, by text) and optionally reranked.
+
+    Args:
+        service_endpoint (str): Azure Cognitive Search service endpoint.
+        api_key (str): Azure Cognitive Search API key.
+        index_name (str): Name of the Azure Cognitive Search index.
+        query_embedding (list): Embedding vector for the query.
+        document_ids (list): Document indexes to retrieve chunks for.
+        top_k (int): Number of chunks to return per document.
+        backend (VectorSearchBackend): Backend to search. Defaults to Azure Cognitive Search.
+        rerank (str): None (or "none"), "mmr" (maximal marginal relevance) or "cross_encoder" (requires `query`).
+        query (str): The query text, used by the cross-encoder.
+        fetch_k (int): Candidates fetched per document before deduplication and reranking. Defaults to
+            2 * top_k, or 3 * top_k when reranking.
+        max_concurrency (int): Maximum number of searches in flight.
+
+    Returns:
+        dict: The retrieved chunk dictionaries for each document id, best first.
+    """
+    rerank = rerank_method(rerank)
+    if rerank == "cross_encoder" and query is None:
+        raise ValueError("The cross-encoder needs the query text.")
+    if backend is None:
+        backend = AzureSearchBackend(service_endpoint, api_key, index_name)
+    fetch_k = fetch_k or (3 * top_k if rerank else 2 * top_k)
+
+    with telemetry.span("retrieve", documents=len(document_ids), top_k=fetch_k):
+        results = backend.search_documents(query_embedding, document_ids, top_k=fetch_k,
+                                           max_concurrency=max_concurrency)
+
+    seen_ids = set()
+    retrieved = {}
+    for document_id in (str(document_id) for document_id in document_ids):
+        seen_texts = set()
+        candidates = []
+        for result in results.get(document_id, []):
+            if result["id"] in seen_ids or result["chunk"] in seen_texts:
+                continue
+            seen_ids.add(result["id"])
+            seen_texts.add(result["chunk"])
+            candidates.append(result)
+
+        if rerank == "mmr":
+            candidates = mmr(query_embedding, candidates, top_k=top_k)
+        elif rerank == "cross_encoder":
+            candidates = cross_encoder_rerank(query, candidates, top_k=top_k)
+        retrieved[document_id] = candidates[:top_k]
+    return retrieved
+
 def compute_similarity(text1, text2):
     """
     Compute similarity between two texts using BERT embeddings.
+
+    Both texts are encoded in one padded forward pass, with PyTorch or, when the encoder backend
+    is "onnx", ONNX Runtime. For chunk-level comparison of whole documents use
+    `comparison.similarity.similarity_matrix` instead.
     """
-    # Tokenize and encode the texts
-    inputs1 = bert_tokenizer(text1, return_tensors="pt", truncation=True, max_length=512)
-    inputs2 = bert_tokenizer(text2, return_tensors="pt", truncation=True, max_length=512)
+    if encoder_settings["backend"] == "onnx":
+        embeddings = registry.get("bert-onnx").embed([text1, text2], max_length=512, normalize=True)
+        return float(embeddings[0] @ embeddings[1])
 
-    # Generate embeddings
+    import torch
+
+    bert_tokenizer, bert_model = registry.get("bert")
+
+    # Tokenize and encode both texts as one batch
+    inputs = bert_tokenizer([text1, text2], return_tensors="pt", padding=True, truncation=True, max_length=512)
+
+    # Generate embeddings, mean-pooling over real (non-padding) tokens only
     with torch.no_grad():
-        embeddings1 = bert_model(**inputs1).last_hidden_state.mean(dim=1)
-        embeddings2 = bert_model(**inputs2).last_hidden_state.mean(dim=1)
+        hidden = bert_model(**inputs).last_hidden_state
+    mask = inputs["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+    embeddings = (hidden * mask).sum(dim=1) / mask.sum(dim=1)
 
     # Compute cosine similarity
-    similarity = cosine_similarity(embeddings1.numpy(), embeddings2.numpy())
-    return similarity[0][0]
+    similarity = torch.nn.functional.cosine_similarity(embeddings[0:1], embeddings[1:2])
+    return similarity[0].item()
+
+def chunk_text(chunk):
+    return chunk["chunk"] if isinstance(chunk, dict) else chunk
 
-def compare_documents(query, service_endpoint, api_key, index_name):
+# Fixed instruction prefix of every comparison prompt; its KV cache is computed once and reused
+COMPARISON_INSTRUCTIONS = (
+    "You are comparing two versions of an insurance policy. "
+    "Explain the differences below concisely.\n\n"
+)
+
+# Bump whenever the instructions, prompt layout or report format change, so cached reports are not reused
+PROMPT_VERSION = 3
+
+def generate_text(prompt, max_new_tokens=None):
+    """
+    Generate a completion for a comparison prompt with the LLaMA model.
+
+    Args:
+        prompt (str): The prompt, without the fixed instruction prefix.
+        max_new_tokens (int): Maximum number of tokens to generate.
+
+    Returns:
+        str: The generated text, without the prompt.
+    """
+    return generate(prompt, prefix=COMPARISON_INSTRUCTIONS, max_new_tokens=max_new_tokens)
+
+def build_comparison_prompt(query, modified_pairs, field_changes, token_budget=None):
+    """
+    Build the LLM prompt from the modified chunk pairs and the field changes that need the LLM only.
+
+    The chunk text is packed by `pack_context`: most changed sections first, without the overlap
+    between chunks or near-duplicate chunks, within the token budget. The prompt follows
+    `COMPARISON_INSTRUCTIONS`, which is passed to the model separately as a cached prefix.
+    """
+    prompt = f"Request: {query}\n\n"
+    if field_changes:
+        prompt += "Changed fields:\n"
+        for item in field_changes:
+            prompt += f"- {item['field']}: {item['value1']} -> {item['value2']}\n"
+        prompt += "\n"
+    sections, stats = pack_context(modified_pairs, token_budget=token_budget) if modified_pairs else ([], None)
+    if stats is not None:
+        # Called once per pair in batch mode; the telemetry counters hold the totals
+        logger.debug("Context packing: %d of %d prompt tokens kept, %d saved (%d near-duplicate chunks), "
+                     "%d over budget (%d sections truncated, %d left out).", stats["tokens_after"],
+                     stats["tokens_before"], stats["tokens_saved"], stats["near_duplicates"],
+                     stats["tokens_over_budget"], stats["truncated"], stats["over_budget"])
+    for n, section in enumerate(sections, start=1):
+        for number, side in ((1, "doc1"), (2, "doc2")):
+            text = section[side]
+            if isinstance(text, int):
+                text = f"(same as Section {text}, Document {number})"
+            prompt += f"Section {n}, Document {number}:\n{text}\n"
+        prompt += "\n"
+    prompt += "Differences:\n"
+    return prompt
+
+def format_report(field_comparison, alignment=None, similarity_score=None, min_confidence=0.8):
+    """
+    Format the comparison report from the field comparison and, unless the comparison was fields-only
+    (`alignment` is None), the chunk alignment and document similarity. The LLM analysis, if any,
+    is appended by the caller.
+    """
+    field_changes = [item for item in field_comparison if item["status"] != UNCHANGED]
+    if alignment is None:
+        field_counts = summarize_alignment(field_comparison)
+        report = f"Fields: {field_counts[UNCHANGED]} of {len(field_comparison)} unchanged\n\n"
+        alignment = []
+    else:
+        counts = summarize_alignment(alignment)
+        report = f"Similarity Score: {similarity_score:.2f}\n\n"
+        report += (f"Sections: {counts[UNCHANGED]} unchanged, {counts[MODIFIED]} modified, "
+                   f"{counts[ADDED]} added, {counts[REMOVED]} removed\n\n")
+
+    if field_changes:
+        report += "Field changes:\n"
+        for item in field_changes:
+            report += format_field_change(item, min_confidence) + "\n"
+        report += "\n"
+
+    for item in alignment:
+        if item["status"] == MODIFIED:
+            report += (f"Modified (similarity {item['score']:.2f}):\n"
+                       f"Document 1:\n{chunk_text(item['doc1'])}\nDocument 2:\n{chunk_text(item['doc2'])}\n\n")
+        elif item["status"] == REMOVED:
+            report += f"Only in Document 1:\n{chunk_text(item['doc1'])}\n\n"
+        elif item["status"] == ADDED:
+            report += f"Only in Document 2:\n{chunk_text(item['doc2'])}\n\n"
+
+    if not field_changes and all(item["status"] == UNCHANGED for item in alignment):
+        report += "No differences found.\n"
+    return report
+
+def comparison_key(doc1_hash, doc2_hash, query, use_llm=True, structured_fields=True, min_confidence=0.8,
+                   top_k=10, rerank=None):
     """
-    Compare two documents using Azure Cognitive Search and BERT similarity.
+    Build the report cache key of a comparison from the document content hashes, the query, the
+    models and settings producing the report (comparison options, chunker and context packing)
+    and the prompt version.
     """
-    # Retrieve relevant chunks for both documents (update this logic as needed)
-    # For simplicity, assume `retrieved_chunks_doc1` and `retrieved_chunks_doc2` are retrieved
-    retrieved_chunks_doc1 = ["Sample text from Document 1"]
-    retrieved_chunks_doc2 = ["Sample text from Document 2"]
+    from chunking.chunk_and_embed import CHUNKER_SETTINGS
+
+    model = encoder_variant(DEFAULT_MODEL_NAME)
+    if use_llm:
+        model += f"|{generation_settings['model_path']}|{generation_settings['mode']}|{generation_settings['max_new_tokens']}"
+        model += f"|{json.dumps(packer_settings, sort_keys=True)}"
+    model += (f"|structured_fields={bool(structured_fields)}|min_confidence={min_confidence}|top_k={top_k}"
+              f"|rerank={rerank_method(rerank)}|{json.dumps(CHUNKER_SETTINGS, sort_keys=True)}")
+    return ReportCache.make_key(doc1_hash, doc2_hash, query, model, PROMPT_VERSION)
+
+def compare_documents(query, service_endpoint, api_key, index_name, chunks_doc1=None, chunks_doc2=None,
+                      fields_doc1=None, fields_doc2=None, use_llm=True, report_cache=None, document_hashes=None,
+                      document_ids=None, top_k=10, rerank=None, backend=None, structured_fields=True,
+                      min_confidence=0.8, use_embedding_cache=True):
+    """
+    Compare two documents and return the full report; see `iter_compare_documents`.
+    """
+    report = ""
+    for report in iter_compare_documents(query, service_endpoint, api_key, index_name, chunks_doc1, chunks_doc2,
+                                         fields_doc1, fields_doc2, use_llm, report_cache, document_hashes,
+                                         document_ids, top_k, rerank, backend, structured_fields, min_confidence,
+                                         use_embedding_cache):
+        pass
+    return report
+
+def iter_compare_documents(query, service_endpoint, api_key, index_name, chunks_doc1=None, chunks_doc2=None,
+                           fields_doc1=None, fields_doc2=None, use_llm=True, report_cache=None,
+                           document_hashes=None, document_ids=None, top_k=10, rerank=None, backend=None,
+                           structured_fields=True, min_confidence=0.8, use_embedding_cache=True):
+    """
+    Compare two documents by aligning their chunks and sending only the modified sections to the LLM.
+
+    Typed fields (money, counts, years, dates, names) are compared exactly, with deltas and percent
+    changes; only free-text or low-confidence field changes go to the LLM. When both documents have
+    fields and `structured_fields` is set, the fields are the whole comparison and the chunk
+    retrieval, embedding and alignment are skipped. Otherwise, if either document has no chunks,
+    the report only states that no content was retrieved and is not cached.
+
+    The report is yielded progressively: first the alignment summary, then again after every
+    piece of streamed LLM output.
+
+    Args:
+        query (str): The comparison request.
+        service_endpoint (str): Azure Cognitive Search service endpoint.
+        api_key (str): Azure Cognitive Search API key.
+        index_name (str): Name of the Azure Cognitive Search index.
+        chunks_doc1 (list): Chunks of the first document (dicts from `chunk_and_embed` or strings).
+        chunks_doc2 (list): Chunks of the second document.
+        fields_doc1 (dict): Document Intelligence fields of the first document, if available.
+        fields_doc2 (dict): Document Intelligence fields of the second document, if available.
+        use_llm (bool): Generate an explanation of the modified sections with LLaMA.
+        report_cache (ReportCache): Serve a finished report for the same documents and query from
+            this cache, and store new reports in it.
+        document_hashes (tuple): Content hashes of the two documents (e.g. file hashes). Defaults to
+            hashes of the chunk texts and fields.
+        document_ids (tuple): Document indexes of the two documents in the search index. When given and
+            no chunks are passed, each document's most relevant chunks are retrieved concurrently.
+        top_k (int): Number of chunks retrieved per document.
+        rerank (str): Rerank the retrieved chunks with None, "mmr" or "cross_encoder".
+        backend (VectorSearchBackend): Backend to retrieve from. Defaults to Azure Cognitive Search.
+        structured_fields (bool): Compare documents with fields on both sides by their fields only.
+        min_confidence (float): Field confidence below which a change is left to the LLM.
+        use_embedding_cache (bool): Serve the query embedding from the persistent embedding cache.
+
+    Yields:
+        str: The comparison report so far.
+    """
+    fields_only = structured_fields and bool(fields_doc1) and bool(fields_doc2)
+
+    # Retrieve the relevant chunks of each document with filtered queries, unless they were passed in
+    if not fields_only and document_ids is not None and not (chunks_doc1 and chunks_doc2):
+        retrieved = retrieve_document_chunks(service_endpoint, api_key, index_name, embed_query(query, use_embedding_cache),
+                                             document_ids, top_k=top_k, backend=backend, rerank=rerank, query=query)
+        chunks_doc1 = chunks_doc1 or retrieved[str(document_ids[0])]
+        chunks_doc2 = chunks_doc2 or retrieved[str(document_ids[1])]
+    if not fields_only and not (chunks_doc1 and chunks_doc2):
+        # Nothing to align: say so instead of comparing made-up text, and leave it out of the report
+        # cache so the documents are compared once their chunks can be retrieved
+        missing = [f"Document {i}" for i, chunks in ((1, chunks_doc1), (2, chunks_doc2)) if not chunks]
+        yield f"No content retrieved for {' and '.join(missing)}; the documents were not compared.\n"
+        return
+    retrieved_chunks_doc1 = chunks_doc1 or []
+    retrieved_chunks_doc2 = chunks_doc2 or []
+
+    if report_cache is not None:
+        if document_hashes is None:
+            document_hashes = (content_hash(retrieved_chunks_doc1, fields_doc1),
+                               content_hash(retrieved_chunks_doc2, fields_doc2))
+        cache_key = comparison_key(*document_hashes, query, use_llm, structured_fields, min_confidence, top_k, rerank)
+        cached = report_cache.get(cache_key)
+        if cached is not None:
+            yield cached["report"]
+            return
+
+    with telemetry.span("compare_fields"):
+        field_comparison = compare_fields(fields_doc1 or {}, fields_doc2 or {}, min_confidence)
 
-    # Combine chunks into single texts
-    text1 = " ".join(retrieved_chunks_doc1)
-    text2 = " ".join(retrieved_chunks_doc2)
+    if fields_only:
+        # Structured fast path: no embeddings, and the LLM only sees free-text or low-confidence fields
+        matrix = None
+        alignment = None
+        report = format_report(field_comparison, min_confidence=min_confidence)
+    else:
+        # Compute the chunk-level similarity matrix and align the chunks
+        with telemetry.span("similarity", chunks=len(retrieved_chunks_doc1) + len(retrieved_chunks_doc2)):
+            matrix = similarity_matrix(retrieved_chunks_doc1, retrieved_chunks_doc2)
+            similarity_score = document_similarity(matrix)
+            alignment = align_chunks(retrieved_chunks_doc1, retrieved_chunks_doc2, matrix=matrix)
+        report = format_report(field_comparison, alignment, similarity_score, min_confidence)
 
-    # Compute similarity score
-    similarity_score = compute_similarity(text1, text2)
+    llm_field_changes = [item for item in field_comparison if item["status"] != UNCHANGED and item["needs_llm"]]
+    modified_pairs = [item for item in alignment or [] if item["status"] == MODIFIED]
 
-    # Generate a comparison report
-    report = f"Similarity Score: {similarity_score:.2f}\n\n"
-    report += f"Differences:\n\nDocument 1:\n{text1}\n\nDocument 2:\n{text2}\n"
+    # Only the modified sections go to the LLM; identical documents skip generation entirely
+    if use_llm and (modified_pairs or llm_field_changes):
+        prompt = build_comparison_prompt(query, modified_pairs, llm_field_changes)
+        report += "Analysis:\n"
+        yield report
+        for piece in stream_generate(prompt, prefix=COMPARISON_INSTRUCTIONS):
+            report += piece
+            yield report
+        report += "\n"
 
-    return report
\ No newline at end of file
+    if report_cache is not None:
+        report_cache.put(cache_key, *document_hashes, report,
+                         [chunk_text(chunk) for chunk in retrieved_chunks_doc1],
+                         [chunk_text(chunk) for chunk in retrieved_chunks_doc2], matrix)
+    yield report
@@ -0,0 +1,238 @@
+import queue
+import threading
+import time
+from telemetry import telemetry
+
+_DONE = object()
+
+# Seconds between checks of the stop event while blocked on a queue
+_POLL_INTERVAL = 0.1
+
+class Stage:
+    """
+    One step of a streaming pipeline.
+
+    Args:
+        name (str): Stage name used in the statistics.
+        fn (callable): Maps one input item to one output item. Returning None drops the item. With
+            `batch_size` > 1 it maps a list of items to a list of outputs instead.
+        workers (int): Number of threads running `fn` concurrently.
+        queue_size (int): Capacity of the stage's input queue; a full queue blocks the upstream stage.
+        batch_size (int): Maximum number of items handed to `fn` at once.
+        batch_wait (float): Seconds a worker waits for more items after the first of a batch before
+            running a partial batch.
+    """
+
+    def __init__(self, name, fn, workers=1, queue_size=8, batch_size=1, batch_wait=0.05):
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.input = queue.Queue(maxsize=queue_size)
+        self.processed = 0
+        self.batches = 0
+        self.errors = []
+        self.busy_seconds = 0.0
+        self.max_queue_depth = 0
+        self.started_at = None
+        self.finished_at = None
+        self._running = workers
+        self._lock = threading.Lock()
+
+    def stats(self):
+        """
+        Return the stage's counters, current and maximum queue depth, and throughput.
+        """
+        end = self.finished_at or time.perf_counter()
+        elapsed = end - self.started_at if self.started_at else 0.0
+        return {
+            "stage": self.name,
+            "workers": self.workers,
+            "processed": self.processed,
+            "batches": self.batches,
+            "errors": len(self.errors),
+            "queue_depth": self.input.qsize(),
+            "max_queue_depth": self.max_queue_depth,
+            "busy_seconds": self.busy_seconds,
+            "items_per_second": self.processed / elapsed if elapsed > 0 else 0.0,
+        }
+
+class StreamingPipeline:
+    """
+    Run stages concurrently, connected by bounded queues.
+
+    Every stage has its own worker threads, so network-bound and CPU-bound stages overlap and the
+    overall throughput approaches that of the slowest stage. Bounded queues, the output queue
+    included, apply backpressure so intermediate results never pile up in memory. Stages with a
+    `batch_size` collect micro-batches, so batched work (embedding, bulk upserts and uploads) keeps
+    its batch sizes while documents stream through. Items that fail in a stage are recorded in the
+    stage's `errors` and dropped. An error raised by the input iterator itself is raised to the
+    consumer of `iter_run` once the items read before it have gone through; closing `iter_run`
+    early stops every worker.
+
+    Args:
+        stages (list): The stages, in order.
+        report_interval (float): Print per-stage statistics every this many seconds; never if None.
+        output_queue_size (int): Capacity of the queue of final outputs, read by `iter_run`.
+    """
+
+    def __init__(self, stages, report_interval=None, output_queue_size=8):
+        self.stages = stages
+        self.report_interval = report_interval
+        self.outputs = queue.Queue(maxsize=output_queue_size)
+        self._stop = threading.Event()
+        self._feed_error = None
+
+    def _put(self, target, item):
+        """
+        Put an item on a bounded queue, giving up if the pipeline is stopped. Returns True if it was put.
+        """
+        while not self._stop.is_set():
+            try:
+                target.put(item, timeout=_POLL_INTERVAL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _next_batch(self, stage):
+        """
+        Take up to `stage.batch_size` items, waiting at most `stage.batch_wait` seconds after the
+        first. Returns the batch and whether the end of the input (or a stop) was reached.
+        """
+        while True:
+            if self._stop.is_set():
+                return [], True
+            try:
+                item = stage.input.get(timeout=_POLL_INTERVAL)
+                break
+            except queue.Empty:
+                continue
+        if item is _DONE:
+            return [], True
+        batch = [item]
+        deadline = time.perf_counter() + stage.batch_wait
+        while len(batch) < stage.batch_size:
+            try:
+                item = stage.input.get(timeout=max(deadline - time.perf_counter(), 0))
+            except queue.Empty:
+                break
+            if item is _DONE:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _worker(self, index):
+        stage = self.stages[index]
+        next_stage = self.stages[index + 1] if index + 1 < len(self.stages) else None
+        downstream = next_stage.input if next_stage is not None else self.outputs
+        done = False
+        while not done:
+            batch, done = self._next_batch(stage)
+            if not batch:
+                break
+            start = time.perf_counter()
+            try:
+                with telemetry.span(f"stage.{stage.name}", items=len(batch)):
+                    results = stage.fn(batch) if stage.batch_size > 1 else [stage.fn(batch[0])]
+            except Exception as error:
+                results = []
+                with stage._lock:
+                    stage.errors += [(item, error) for item in batch]
+                print(f"Stage '{stage.name}' failed: {error}")
+            with stage._lock:
+                stage.busy_seconds += time.perf_counter() - start
+                stage.processed += len(batch)
+                stage.batches += 1
+            for result in results:
+                if result is None:
+                    continue
+                if not self._put(downstream, result):
+                    return
+                if next_stage is not None:
+                    next_stage.max_queue_depth = max(next_stage.max_queue_depth, downstream.qsize())
+
+        # The last worker of a stage to finish closes the next stage (or the outputs)
+        with stage._lock:
+            stage._running -= 1
+            last = stage._running == 0
+            if last:
+                stage.finished_at = time.perf_counter()
+        if last:
+            for _ in range(next_stage.workers if next_stage is not None else 1):
+                self._put(downstream, _DONE)
+
+    def _feed(self, items):
+        first = self.stages[0]
+        try:
+            for item in items:
+                if not self._put(first.input, item):
+                    return
+                first.max_queue_depth = max(first.max_queue_depth, first.input.qsize())
+        except Exception as error:
+            # Raised to the consumer once the items already fed have gone through
+            self._feed_error = error
+        finally:
+            for _ in range(first.workers):
+                self._put(first.input, _DONE)
+
+    def _monitor(self, stop):
+        while not stop.wait(self.report_interval):
+            for stage in self.stages:
+                stage.max_queue_depth = max(stage.max_queue_depth, stage.input.qsize())
+            print(self.format_stats())
+
+    def iter_run(self, items):
+        """
+        Push `items` through all stages, yielding the outputs of the last stage as they complete.
+
+        Raises the error of the `items` iterator, if it failed, after the last output. Closing the
+        generator early stops the workers once their current batch is done.
+        """
+        self._stop = threading.Event()
+        self._feed_error = None
+        feeder = threading.Thread(target=self._feed, args=(items,), daemon=True)
+        workers = []
+        now = time.perf_counter()
+        for index, stage in enumerate(self.stages):
+            stage.started_at = now
+            stage._running = stage.workers
+            workers += [threading.Thread(target=self._worker, args=(index,), daemon=True) for _ in range(stage.workers)]
+
+        monitor_stop = threading.Event()
+        if self.report_interval:
+            threading.Thread(target=self._monitor, args=(monitor_stop,), daemon=True).start()
+        for thread in [feeder] + workers:
+            thread.start()
+        try:
+            while True:
+                result = self.outputs.get()
+                if result is _DONE:
+                    break
+                yield result
+            if self._feed_error is not None:
+                raise self._feed_error
+        finally:
+            monitor_stop.set()
+            # Stops the workers (and the feeder, at its next item) if the consumer stopped early
+            self._stop.set()
+            for thread in workers:
+                thread.join()
+
+    def run(self, items):
+        """
+        Push `items` through all stages and return the outputs of the last stage (in completion order).
+        """
+        return list(self.iter_run(items))
+
+    def stats(self):
+        return [stage.stats() for stage in self.stages]
+
+    def format_stats(self):
+        lines = [f"{'stage':<10} {'workers':>7} {'done':>6} {'batches':>7} {'errors':>6} {'queue':>5} {'max q':>5} "
+                 f"{'items/s':>8}"]
+        for s in self.stats():
+            lines.append(f"{s['stage']:<10} {s['workers']:>7} {s['processed']:>6} {s['batches']:>7} {s['errors']:>6} "
+                         f"{s['queue_depth']:>5} {s['max_queue_depth']:>5} {s['items_per_second']:>8.2f}")
+        return "\n".join(lines)
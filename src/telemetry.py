@@ -0,0 +1,260 @@
+import contextvars
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+SINKS = ("none", "json", "otel", "prometheus")
+
+telemetry_settings = {
+    "sink": "none",
+    "path": "./data/telemetry.jsonl",  # json sink
+    "port": 9464,  # prometheus sink
+    "service_name": "document-comparison",  # otel sink
+}
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+def _rss_bytes():
+    """
+    Current resident set size of the process.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return _peak_rss_bytes()
+
+def _peak_rss_bytes():
+    """
+    Peak resident set size of the process so far.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+class _Sink:
+    def span(self, record):
+        pass
+
+    def counter(self, name, value, labels):
+        pass
+
+    def close(self):
+        pass
+
+class _JsonSink(_Sink):
+    """
+    Append one JSON line per finished span and counter increment to a local file.
+    """
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, "a", buffering=1)
+        self._lock = threading.Lock()
+
+    def _write(self, record):
+        with self._lock:
+            self._file.write(json.dumps(record, default=str) + "\n")
+
+    def span(self, record):
+        self._write({"type": "span", **record})
+
+    def counter(self, name, value, labels):
+        self._write({"type": "counter", "name": name, "value": value, "labels": labels, "time": time.time()})
+
+    def close(self):
+        self._file.close()
+
+class _OtelSink(_Sink):
+    """
+    Export spans and counters through the OpenTelemetry API; exporters are configured by the SDK environment.
+    """
+
+    def __init__(self, service_name):
+        from opentelemetry import metrics, trace
+
+        self._tracer = trace.get_tracer(service_name)
+        self._meter = metrics.get_meter(service_name)
+        self._counters = {}
+        self._durations = self._meter.create_histogram("stage.duration", unit="s")
+        self._peak_rss = self._meter.create_histogram("stage.peak_rss", unit="By")
+
+    def span(self, record):
+        span = self._tracer.start_span(record["name"], start_time=int(record["start"] * 1e9),
+                                       attributes={key: str(value) for key, value in record["attributes"].items()})
+        span.set_attribute("peak_rss_bytes", record["peak_rss_bytes"])
+        if record["error"]:
+            span.set_attribute("error", record["error"])
+        span.end(end_time=int((record["start"] + record["duration"]) * 1e9))
+        self._durations.record(record["duration"], {"stage": record["name"]})
+        self._peak_rss.record(record["peak_rss_bytes"], {"stage": record["name"]})
+
+    def counter(self, name, value, labels):
+        if name not in self._counters:
+            self._counters[name] = self._meter.create_counter(name)
+        self._counters[name].add(value, labels)
+
+class _PrometheusSink(_Sink):
+    """
+    Serve span durations, peak memory and counters on a Prometheus scrape endpoint.
+    """
+
+    def __init__(self, port):
+        from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+        self._counter_type = Counter
+        self._counters = {}
+        self._lock = threading.Lock()
+        self._durations = Histogram("stage_duration_seconds", "Duration of pipeline stages", ["stage"])
+        self._peak_rss = Gauge("stage_peak_rss_bytes", "Process peak RSS at the end of a stage", ["stage"])
+        start_http_server(port)
+
+    def span(self, record):
+        self._durations.labels(stage=record["name"]).observe(record["duration"])
+        self._peak_rss.labels(stage=record["name"]).set(record["peak_rss_bytes"])
+
+    def counter(self, name, value, labels):
+        metric_name = name.replace(".", "_").replace("-", "_") + "_total"
+        with self._lock:
+            if metric_name not in self._counters:
+                self._counters[metric_name] = self._counter_type(metric_name, name, sorted(labels))
+        counter = self._counters[metric_name]
+        (counter.labels(**labels) if labels else counter).inc(value)
+
+class Telemetry:
+    """
+    In-process spans and counters with a pluggable sink.
+
+    Every span records its duration, the process RSS change and the process peak RSS at its end;
+    spans nest per thread/task, so each record names its parent. Totals per span name and per
+    counter are always kept in memory (`snapshot`), and every event is also handed to the sink.
+    """
+
+    def __init__(self, sink=None):
+        self.sink = sink or _Sink()
+        self._lock = threading.Lock()
+        self._spans = {}
+        self._counters = {}
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """
+        Time a block of work, e.g. `with telemetry.span("embed", chunks=len(chunks)):`.
+
+        Do not hold a span open across the `yield` of a generator that may be resumed from another
+        thread or context (e.g. through `asyncio.to_thread`); time the work with `record_span` instead.
+        """
+        parent = _current_span.get()
+        token = _current_span.set(name)
+        record = {
+            "name": name,
+            "parent": parent,
+            "attributes": attributes,
+            "start": time.time(),
+            "error": None,
+        }
+        rss_before = _rss_bytes()
+        start = time.perf_counter()
+        try:
+            yield record["attributes"]
+        except BaseException as error:
+            record["error"] = f"{type(error).__name__}: {error}"
+            raise
+        finally:
+            record["duration"] = time.perf_counter() - start
+            record["rss_delta_bytes"] = _rss_bytes() - rss_before
+            record["peak_rss_bytes"] = _peak_rss_bytes()
+            try:
+                _current_span.reset(token)
+            except ValueError:
+                # Ended in another context than it started in; restore the parent there instead
+                _current_span.set(parent)
+            self._finish(record)
+
+    def record_span(self, name, duration, error=None, **attributes):
+        """
+        Record a span timed by the caller, ending now, e.g. for work spread over the yields of a generator.
+        """
+        record = {
+            "name": name,
+            "parent": _current_span.get(),
+            "attributes": attributes,
+            "start": time.time() - duration,
+            "error": error,
+            "duration": duration,
+            "rss_delta_bytes": 0,
+            "peak_rss_bytes": _peak_rss_bytes(),
+        }
+        self._finish(record)
+
+    def _finish(self, record):
+        name = record["name"]
+        with self._lock:
+            totals = self._spans.setdefault(name, {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0,
+                                                   "errors": 0, "peak_rss_bytes": 0})
+            totals["count"] += 1
+            totals["total_seconds"] += record["duration"]
+            totals["max_seconds"] = max(totals["max_seconds"], record["duration"])
+            totals["errors"] += record["error"] is not None
+            totals["peak_rss_bytes"] = max(totals["peak_rss_bytes"], record["peak_rss_bytes"])
+        self.sink.span(record)
+
+    def increment(self, name, value=1, **labels):
+        """
+        Add to a counter, e.g. `telemetry.increment("chunks", len(chunks))`.
+        """
+        if not value:
+            return
+        with self._lock:
+            key = (name, tuple(sorted(labels.items())))
+            self._counters[key] = self._counters.get(key, 0) + value
+        self.sink.counter(name, value, labels)
+
+    def snapshot(self):
+        """
+        Return the totals per span name and the counter values recorded so far.
+        """
+        with self._lock:
+            counters = {}
+            for (name, labels), value in self._counters.items():
+                counters[name + ("{" + ",".join(f"{k}={v}" for k, v in labels) + "}" if labels else "")] = value
+            return {"spans": {name: dict(totals) for name, totals in self._spans.items()}, "counters": counters}
+
+    def format_snapshot(self):
+        snapshot = self.snapshot()
+        lines = [f"{'span':<32} {'count':>6} {'total s':>9} {'max s':>8} {'peak MiB':>9}"]
+        for name, totals in sorted(snapshot["spans"].items(), key=lambda item: -item[1]["total_seconds"]):
+            lines.append(f"{name:<32} {totals['count']:>6} {totals['total_seconds']:>9.2f} "
+                         f"{totals['max_seconds']:>8.2f} {totals['peak_rss_bytes'] / 2**20:>9.0f}")
+        for name, value in sorted(snapshot["counters"].items()):
+            lines.append(f"{name:<32} {value:>6}")
+        return "\n".join(lines)
+
+telemetry = Telemetry()
+
+def configure_telemetry(**settings):
+    """
+    Override the telemetry settings (sink, path, port, service_name), e.g. from config.yaml, and switch sinks.
+    """
+    for key, value in settings.items():
+        if value is None:
+            continue
+        if key not in telemetry_settings:
+            raise ValueError(f"Unknown telemetry setting '{key}'.")
+        if key == "sink" and value not in SINKS:
+            raise ValueError(f"Unknown telemetry sink '{value}'. Expected one of {SINKS}.")
+        telemetry_settings[key] = value
+
+    sink = telemetry_settings["sink"]
+    telemetry.sink.close()
+    if sink == "json":
+        telemetry.sink = _JsonSink(telemetry_settings["path"])
+    elif sink == "otel":
+        telemetry.sink = _OtelSink(telemetry_settings["service_name"])
+    elif sink == "prometheus":
+        telemetry.sink = _PrometheusSink(telemetry_settings["port"])
+    else:
+        telemetry.sink = _Sink()
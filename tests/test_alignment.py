@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from comparison.alignment import (ADDED, MODIFIED, REMOVED, UNCHANGED, align_chunks, align_fields, match_greedy,
+                                  match_optimal, summarize_alignment)
+
+def test_align_chunks_classifies_pairs_in_document_order():
+    chunks1 = ["Premium: $100", "Deductible: $50", "Exclusions: flood"]
+    chunks2 = ["Premium:  $100", "Deductible: $75", "Agent: Jane Doe"]
+    # Rows are chunks1, columns chunks2; the similarities are given so no model is loaded
+    matrix = np.array([
+        [0.97, 0.40, 0.10],
+        [0.30, 0.90, 0.20],
+        [0.10, 0.20, 0.30],
+    ])
+    alignment = align_chunks(chunks1, chunks2, matrix=matrix)
+
+    assert [(item["status"], item["doc1"], item["doc2"]) for item in alignment] == [
+        # Identical up to whitespace: unchanged although below `unchanged_threshold`
+        (UNCHANGED, "Premium: $100", "Premium:  $100"),
+        (MODIFIED, "Deductible: $50", "Deductible: $75"),
+        (REMOVED, "Exclusions: flood", None),
+        (ADDED, None, "Agent: Jane Doe"),
+    ]
+    assert alignment[1]["score"] == pytest.approx(0.90)
+    assert summarize_alignment(alignment) == {UNCHANGED: 1, MODIFIED: 1, ADDED: 1, REMOVED: 1}
+
+def test_align_chunks_accepts_chunk_dicts_and_empty_documents():
+    chunks = [{"chunk": "a", "chunk_id": 0}]
+
+    assert align_chunks(chunks, [], matrix=np.zeros((1, 0))) == [
+        {"status": REMOVED, "doc1": chunks[0], "doc2": None, "score": None}]
+    assert align_chunks([], [], matrix=np.zeros((0, 0))) == []
+
+def test_optimal_matching_beats_greedy():
+    matrix = np.array([
+        [0.90, 0.80],
+        [0.85, 0.10],
+    ])
+
+    # Greedy takes the best pair (0, 0) first and is left with (1, 1)
+    assert sorted(match_greedy(matrix)) == [(0, 0), (1, 1)]
+    assert sorted(match_optimal(matrix)) == [(0, 1), (1, 0)]
+
+def test_match_threshold_leaves_dissimilar_chunks_unmatched():
+    alignment = align_chunks(["a"], ["b"], matrix=np.array([[0.5]]), match_threshold=0.75)
+
+    assert [item["status"] for item in alignment] == [REMOVED, ADDED]
+
+def test_align_fields():
+    fields1 = {"premium": {"value": "$100"}, "agent": {"value": "Jane"}, "year": {"value": "2024"}}
+    fields2 = {"premium": {"value": " $100 "}, "year": {"value": "2025"}, "carrier": {"value": "Acme"}}
+
+    assert [(item["field"], item["status"]) for item in align_fields(fields1, fields2)] == [
+        ("premium", UNCHANGED), ("agent", REMOVED), ("year", MODIFIED), ("carrier", ADDED)]
@@ -0,0 +1,87 @@
+import os
+import numpy as np
+
+from chunking.chunk_store import ChunkStore
+
+def chunks(document_index, count, offset=0.0, dim=4):
+    return [{"document_index": document_index, "chunk_id": i, "chunk": f"{document_index}/{i}",
+             "embedding": np.full(dim, offset + i, dtype=np.float32)} for i in range(count)]
+
+def segments(store):
+    return sorted(os.path.basename(path) for path in store._segment_paths())
+
+def test_append_and_load(tmp_path):
+    store = ChunkStore(str(tmp_path))
+    store.append(chunks("a", 2))
+    store.append(chunks("b", 3, offset=10))
+
+    records, embeddings = ChunkStore(str(tmp_path)).load()
+    assert [record["id"] for record in records] == [
+        "doc_a_chunk_0", "doc_a_chunk_1", "doc_b_chunk_0", "doc_b_chunk_1", "doc_b_chunk_2"]
+    np.testing.assert_array_equal(embeddings[:, 0], [0, 1, 10, 11, 12])
+    assert segments(store) == ["embeddings_00000.npy", "embeddings_00001.npy"]
+
+def test_load_document_is_a_view_of_its_segment(tmp_path):
+    store = ChunkStore(str(tmp_path))
+    store.append(chunks("a", 2) + chunks("b", 3, offset=10))
+
+    records, embeddings = store.load_document("b")
+    assert [record["chunk_id"] for record in records] == [0, 1, 2]
+    assert isinstance(embeddings, np.memmap)
+    np.testing.assert_array_equal(embeddings[:, 0], [10, 11, 12])
+    assert [chunk["chunk"] for chunk in store.document_chunks("a")] == ["a/0", "a/1"]
+    assert store.load_document("missing")[0] == []
+
+def test_append_supersedes_and_delete_hides(tmp_path):
+    store = ChunkStore(str(tmp_path), compact_ratio=None)
+    store.append(chunks("a", 2))
+    store.append(chunks("a", 1, offset=5))
+    store.delete(["doc_a_chunk_1"])
+
+    records, embeddings = store.load()
+    assert [record["id"] for record in records] == ["doc_a_chunk_0"]
+    np.testing.assert_array_equal(embeddings[:, 0], [5])
+    # 2 superseded or deleted records and 1 tombstone of 4 lines
+    assert store.dead_ratio() == 0.75
+
+def test_compact_rewrites_live_chunks_into_one_segment(tmp_path):
+    store = ChunkStore(str(tmp_path), compact_ratio=None)
+    store.append(chunks("a", 3))
+    store.append(chunks("b", 2, offset=10))
+    store.delete(["doc_a_chunk_1"])
+    before = store.load()
+
+    store.compact()
+
+    records, embeddings = ChunkStore(str(tmp_path)).load()
+    assert [record["id"] for record in records] == [record["id"] for record in before[0]]
+    np.testing.assert_array_equal(embeddings, before[1])
+    assert {record["segment"] for record in records} == {2}
+    assert segments(store) == ["embeddings_00002.npy"]
+    assert store.dead_ratio() == 0.0
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+def test_delete_compacts_past_the_ratio(tmp_path):
+    store = ChunkStore(str(tmp_path), compact_ratio=0.5)
+    store.append(chunks("a", 4))
+    store.append(chunks("b", 4, offset=10))
+
+    # 2 deleted records and 2 tombstones of 10 lines
+    store.delete(["doc_a_chunk_0", "doc_a_chunk_1"])
+    assert len(segments(store)) == 2
+
+    # 4 deleted records and 4 tombstones of 12 lines
+    store.delete(["doc_a_chunk_2", "doc_a_chunk_3"])
+    assert len(segments(store)) == 1
+    records, embeddings = store.load()
+    assert [record["document_index"] for record in records] == ["b"] * 4
+    np.testing.assert_array_equal(embeddings[:, 0], [10, 11, 12, 13])
+
+def test_empty_store(tmp_path):
+    store = ChunkStore(str(tmp_path))
+    store.append([])
+    store.delete([])
+
+    records, embeddings = store.load()
+    assert records == [] and embeddings.shape == (0, 0)
+    assert store.dead_ratio() == 0.0
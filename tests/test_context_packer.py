@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from comparison import context_packer
+from comparison.context_packer import TRUNCATION_MARK, pack_context, strip_overlaps
+
+@pytest.fixture(autouse=True)
+def word_tokens(monkeypatch):
+    # Count whitespace-separated words as tokens, so no LLaMA tokenizer is needed
+    monkeypatch.setattr(context_packer, "count_tokens", lambda texts: [len(text.split()) for text in texts])
+    monkeypatch.setattr(context_packer, "truncate_tokens",
+                        lambda text, max_tokens: " ".join(text.split()[:max(max_tokens, 0)]))
+
+def words(prefix, count):
+    return " ".join(f"{prefix}{i}" for i in range(count))
+
+def pair(number, size=30, score=0.5, embeddings=None):
+    embeddings = embeddings or (np.eye(8)[number], np.eye(8)[number])
+    return {side: {"chunk": words(f"{side}s{number}w", size), "embedding": embedding}
+            for side, embedding in zip(("doc1", "doc2"), embeddings)} | {"score": score}
+
+def test_sections_within_budget_are_kept_whole():
+    sections, stats = pack_context([pair(0), pair(1)], token_budget=200)
+
+    assert [section["doc1"] for section in sections] == [words("doc1s0w", 30), words("doc1s1w", 30)]
+    assert stats["tokens_before"] == stats["tokens_after"] == 120
+    assert stats["truncated"] == stats["over_budget"] == 0
+
+def test_most_changed_sections_come_first():
+    sections, _ = pack_context([pair(0, score=0.9), pair(1, score=0.5), pair(2, score=0.7)], token_budget=None)
+
+    assert [section["doc1"].split()[0] for section in sections] == ["doc1s1w0", "doc1s2w0", "doc1s0w0"]
+
+def test_budget_truncates_then_leaves_out_sections():
+    # 50 tokens per document: the first section fits, the second is cut to the 20 tokens left and
+    # the third is left out
+    sections, stats = pack_context([pair(0), pair(1), pair(2)], token_budget=100)
+
+    assert len(sections) == 2
+    assert sections[1]["doc1"] == words("doc1s1w", 19) + TRUNCATION_MARK
+    assert stats["tokens_after"] == 100
+    assert (stats["truncated"], stats["over_budget"]) == (1, 1)
+    assert stats["tokens_over_budget"] == 2 * 10 + 60
+    assert stats["tokens_before"] == stats["tokens_after"] + stats["tokens_saved"] + stats["tokens_over_budget"]
+
+def test_near_duplicates_refer_to_the_packed_section():
+    same = (np.eye(8)[0], np.eye(8)[0])
+    sections, stats = pack_context([pair(0, embeddings=same), pair(1, embeddings=same)], token_budget=None,
+                                   near_duplicate_threshold=0.95)
+
+    assert sections[1] == {"doc1": 1, "doc2": 1}
+    assert stats["near_duplicates"] == 2
+    assert stats["tokens_saved"] == 60
+    assert stats["tokens_after"] == 60
+
+def test_contained_chunks_are_near_duplicates():
+    first = pair(0)
+    second = pair(1)
+    second["doc2"] = {"chunk": first["doc2"]["chunk"].split(" ", 5)[-1], "embedding": np.eye(8)[1]}
+    sections, _ = pack_context([first, second], token_budget=None, near_duplicate_threshold=0.95)
+
+    assert sections[1]["doc2"] == 1
+    assert isinstance(sections[1]["doc1"], str)
+
+def test_overlap_with_packed_chunks_is_removed():
+    text = "Premium: $1,234.00 per year. Deductible: $500 per claim."
+    overlap = text[-25:]
+
+    assert strip_overlaps(overlap + " Agent: Jane Doe", [text], min_overlap=20) == "Agent: Jane Doe"
+    assert strip_overlaps("Agent: Jane Doe " + text[:25], [text], min_overlap=20) == "Agent: Jane Doe"
+    # Shorter shared spans are kept
+    assert strip_overlaps(text[-5:] + " tail", [text], min_overlap=20) == text[-5:] + " tail"
@@ -0,0 +1,69 @@
+import itertools
+import numpy as np
+import pytest
+
+from chunking import embedding_cache
+from chunking.embedding_cache import EmbeddingCache
+
+MODEL = "test-model"
+
+@pytest.fixture(autouse=True)
+def clock(monkeypatch):
+    # A strictly increasing clock, so recency never ties
+    ticks = itertools.count(1)
+    monkeypatch.setattr(embedding_cache.time, "time", lambda: float(next(ticks)))
+
+def vector(value, dim=3):
+    return np.full((1, dim), value, dtype=np.float32)
+
+def test_get_many_hits_and_misses(tmp_path):
+    cache = EmbeddingCache(str(tmp_path))
+    assert cache.get_many(MODEL, ["a"]) == [None]
+
+    cache.put_many(MODEL, ["a", "b"], np.vstack([vector(1), vector(2)]))
+    found = cache.get_many(MODEL, ["b", "c", "a"])
+
+    np.testing.assert_array_equal(found[0], vector(2)[0])
+    assert found[1] is None
+    np.testing.assert_array_equal(found[2], vector(1)[0])
+    assert cache.stats() == {"hits": 2, "misses": 2, "hit_rate": 0.5}
+
+def test_texts_differing_in_whitespace_share_an_entry(tmp_path):
+    cache = EmbeddingCache(str(tmp_path))
+    cache.put_many(MODEL, ["Premium:  $100\n"], vector(1))
+
+    assert cache.get_many(MODEL, ["Premium: $100"])[0] is not None
+
+def test_models_are_cached_separately(tmp_path):
+    cache = EmbeddingCache(str(tmp_path))
+    cache.put_many(MODEL, ["a"], vector(1))
+
+    assert cache.get_many("other-model", ["a"]) == [None]
+
+def test_least_recently_used_entry_is_evicted(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), max_entries=2)
+    cache.put_many(MODEL, ["a"], vector(1))
+    cache.put_many(MODEL, ["b"], vector(2))
+    cache.get_many(MODEL, ["a"])
+
+    cache.put_many(MODEL, ["c"], vector(3))
+
+    a, b, c = cache.get_many(MODEL, ["a", "b", "c"])
+    assert b is None
+    np.testing.assert_array_equal(a, vector(1)[0])
+    # "c" took the row "b" was evicted from
+    np.testing.assert_array_equal(c, vector(3)[0])
+
+def test_updating_an_entry_keeps_its_row(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), max_entries=2)
+    cache.put_many(MODEL, ["a", "b"], np.vstack([vector(1), vector(2)]))
+    cache.put_many(MODEL, ["a"], vector(5))
+
+    a, b = cache.get_many(MODEL, ["a", "b"])
+    np.testing.assert_array_equal(a, vector(5)[0])
+    np.testing.assert_array_equal(b, vector(2)[0])
+
+def test_entries_persist_across_instances(tmp_path):
+    EmbeddingCache(str(tmp_path)).put_many(MODEL, ["a"], vector(1))
+
+    np.testing.assert_array_equal(EmbeddingCache(str(tmp_path)).get_many(MODEL, ["a"])[0], vector(1)[0])
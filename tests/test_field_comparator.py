@@ -0,0 +1,107 @@
+import pytest
+
+from comparison.alignment import ADDED, MODIFIED, REMOVED, UNCHANGED
+from comparison.field_comparator import (COUNT, DATE, IDENTIFIER, MONEY, NAME, TEXT, YEAR, compare_field_pairs,
+                                         compare_fields, field_kind, format_field_change, parse_date, parse_money)
+
+def fields(**values):
+    return {name: {"value": value, "confidence": 0.99} for name, value in values.items()}
+
+@pytest.mark.parametrize("name, kind", [
+    ("insured_premium", MONEY),
+    ("insured_deductible", MONEY),
+    ("coverage_limit", MONEY),
+    ("no_of_accidents", COUNT),
+    ("number_of_claims", COUNT),
+    ("claimant", TEXT),
+    ("insured_year", YEAR),
+    ("EffectiveDate", DATE),
+    ("policy_number", IDENTIFIER),
+    ("insured_name", NAME),
+    ("insured_carrier", NAME),
+    ("insured_address", TEXT),
+    ("county", TEXT),
+    ("country", TEXT),
+    ("terminal", TEXT),
+    ("numeric", TEXT),
+])
+def test_field_kind_from_name(name, kind):
+    assert field_kind(name) == kind
+
+def test_field_kind_from_values():
+    assert field_kind("other", ["$1,234.00"]) == MONEY
+    assert field_kind("other", ["2024"]) == YEAR
+    assert field_kind("other", ["3"]) == COUNT
+    assert field_kind("other", ["03/01/2024"]) == DATE
+    assert field_kind("other", ["Jane Doe"]) == TEXT
+
+@pytest.mark.parametrize("value, amount", [
+    ("$1,234.50", 1234.5),
+    ("1234.5 USD", 1234.5),
+    ("($200.00)", -200.0),
+    ("-$5", -5.0),
+    ("about $5", None),
+])
+def test_parse_money(value, amount):
+    assert parse_money(value) == amount
+
+def test_parse_date_formats():
+    assert parse_date("2024-03-01") == parse_date("03/01/2024") == parse_date("March 1, 2024")
+    assert parse_date("soon") is None
+
+def test_money_change_has_delta_and_percent():
+    [item] = compare_fields(fields(insured_premium="$1,000.00"), fields(insured_premium="$1,200.00"))
+
+    assert item["kind"] == MONEY
+    assert item["status"] == MODIFIED
+    assert item["delta"] == pytest.approx(200.0)
+    assert item["pct_change"] == pytest.approx(20.0)
+    assert not item["needs_llm"]
+    assert format_field_change(item) == "- insured_premium (modified): $1,000.00 -> $1,200.00 (+200.00, +20.0%)"
+
+def test_equal_values_in_other_formats_are_unchanged():
+    comparison = compare_fields(
+        fields(insured_premium="$1,000.00", insured_name="Doe, Jane", policy_number="HO-2024 118734",
+               effective_date="2024-03-01"),
+        fields(insured_premium="1000 USD", insured_name="jane doe", policy_number="ho2024118734",
+               effective_date="03/01/2024"),
+    )
+
+    assert [item["status"] for item in comparison] == [UNCHANGED] * 4
+
+def test_date_and_year_deltas():
+    comparison = compare_fields(fields(insured_year="2024", effective_date="2024-03-01"),
+                                fields(insured_year="2025", effective_date="2024-03-31"))
+    by_field = {item["field"]: item for item in comparison}
+
+    assert by_field["insured_year"]["delta"] == 1
+    assert by_field["insured_year"]["pct_change"] is None
+    assert by_field["effective_date"]["delta"] == 30
+
+def test_added_and_removed_fields():
+    comparison = compare_fields(fields(insured_premium="$1.00"), fields(insured_deductible="$2.00"))
+
+    assert {item["field"]: item["status"] for item in comparison} == {
+        "insured_premium": REMOVED, "insured_deductible": ADDED}
+
+def test_llm_only_for_text_unparsed_or_low_confidence_changes():
+    fields1 = fields(insured_address="1 Main St", insured_premium="$100.00", no_of_accidents="2", insured_deductible="$5")
+    fields2 = fields(insured_address="2 Main St", insured_premium="call us", no_of_accidents="3", insured_deductible="$6")
+    fields2["insured_deductible"]["confidence"] = 0.5
+    needs_llm = {item["field"]: item["needs_llm"] for item in compare_fields(fields1, fields2, min_confidence=0.8)}
+
+    assert needs_llm == {"insured_address": True, "insured_premium": True, "no_of_accidents": False,
+                         "insured_deductible": True}
+
+def test_compare_field_pairs_matches_pairwise_comparison():
+    pairs = [
+        (fields(insured_premium="$100.00", no_of_accidents="0"), fields(insured_premium="$110.00", no_of_accidents="1")),
+        (fields(insured_premium="$0.00"), fields(insured_premium="$50.00")),
+        (fields(insured_name="A B"), None),
+    ]
+    batched = compare_field_pairs(pairs)
+
+    assert batched == [compare_fields(fields1, fields2) for fields1, fields2 in pairs]
+    # No percent change from zero
+    assert batched[1][0]["delta"] == 50.0 and batched[1][0]["pct_change"] is None
+    assert batched[2][0]["status"] == REMOVED
@@ -0,0 +1,101 @@
+import json
+from types import SimpleNamespace
+import pytest
+
+pytest.importorskip("azure.search.documents")
+
+from azure.core.exceptions import HttpResponseError
+from fakes import FakeSearchService
+from indexing.index_to_azure import _upload_batch, chunks_to_documents, index_documents, split_batches
+
+def documents(count, text="x"):
+    return [{"id": f"doc_{i}", "chunk_text": text} for i in range(count)]
+
+class ScriptedSearchClient:
+    """
+    Search client answering each upload with the next scripted response: a set of keys failing with
+    the given status, or an exception to raise.
+    """
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.uploads = []
+
+    def merge_or_upload_documents(self, documents):
+        self.uploads.append([document["id"] for document in documents])
+        response = self.responses.pop(0) if self.responses else {}
+        if isinstance(response, Exception):
+            raise response
+        return [SimpleNamespace(key=document["id"], succeeded=document["id"] not in response,
+                                status_code=response.get(document["id"], 200), error_message=None)
+                for document in documents]
+
+def http_error(status_code):
+    error = HttpResponseError(message=f"HTTP {status_code}")
+    error.status_code = status_code
+    return error
+
+def test_split_batches_respects_count_and_size():
+    assert [len(batch) for batch in split_batches(documents(5), max_docs=2)] == [2, 2, 1]
+
+    size = len(json.dumps(documents(1)[0], separators=(",", ":")))
+    assert [len(batch) for batch in split_batches(documents(5), max_bytes=2 * size)] == [2, 2, 1]
+    # A document larger than the limit still goes out, alone
+    assert [len(batch) for batch in split_batches(documents(2, "y" * 100), max_bytes=10)] == [1, 1]
+    assert split_batches([]) == []
+
+def test_upload_batch_retries_only_failed_keys():
+    client = ScriptedSearchClient({"doc_1": 503, "doc_3": 429}, {"doc_3": 503}, {})
+
+    succeeded, failed = _upload_batch(client, documents(4), "id", max_retries=5, base_delay=0)
+
+    assert client.uploads == [["doc_0", "doc_1", "doc_2", "doc_3"], ["doc_1", "doc_3"], ["doc_3"]]
+    assert (succeeded, failed) == (4, [])
+
+def test_upload_batch_reports_permanent_and_exhausted_failures():
+    client = ScriptedSearchClient({"doc_0": 400, "doc_1": 503}, {"doc_1": 503})
+
+    succeeded, failed = _upload_batch(client, documents(3), "id", max_retries=1, base_delay=0)
+
+    assert client.uploads == [["doc_0", "doc_1", "doc_2"], ["doc_1"]]
+    assert succeeded == 1
+    assert sorted((key, status) for key, status, _ in failed) == [("doc_0", 400), ("doc_1", 503)]
+
+def test_upload_batch_retries_retryable_request_errors():
+    client = ScriptedSearchClient(http_error(429), {})
+
+    assert _upload_batch(client, documents(2), "id", max_retries=2, base_delay=0) == (2, [])
+    assert len(client.uploads) == 2
+
+    with pytest.raises(HttpResponseError):
+        _upload_batch(ScriptedSearchClient(http_error(400)), documents(2), "id", max_retries=2, base_delay=0)
+
+@pytest.fixture
+def search_service():
+    service = FakeSearchService(failure_rate=0.3, seed=0).start()
+    yield service
+    service.stop()
+
+def chunks(count):
+    return [{"document_index": i // 4, "chunk_id": i % 4, "chunk": f"chunk {i}", "embedding": [float(i), 1.0]}
+            for i in range(count)]
+
+def test_index_documents_retries_partial_failures(search_service):
+    docs = chunks_to_documents(chunks(50))
+
+    stats = index_documents(search_service.endpoint, "key", "retries", docs, max_batch_docs=8, max_retries=20,
+                            base_delay=0)
+
+    assert (stats["indexed"], stats["failed"]) == (50, 0)
+    assert set(search_service.indexes["retries"]) == {doc["id"] for doc in docs}
+
+def test_index_documents_reports_failed_keys(search_service):
+    docs = chunks_to_documents(chunks(50))
+
+    stats = index_documents(search_service.endpoint, "key", "failures", docs, max_batch_docs=8, max_retries=0,
+                            base_delay=0)
+
+    failed_keys = {key for key, _, _ in stats["failures"]}
+    assert stats["failed"] == len(failed_keys) > 0
+    assert stats["indexed"] + stats["failed"] == 50
+    assert set(search_service.indexes["failures"]) == {doc["id"] for doc in docs} - failed_keys
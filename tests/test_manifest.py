@@ -0,0 +1,66 @@
+import json
+import os
+
+from indexing.manifest import IngestManifest, file_sha256, source_id
+
+FINGERPRINT = IngestManifest.fingerprint("abc", "model-1", {"chunk_size": 500}, "all-MiniLM-L6-v2")
+
+def test_record_save_and_reload(tmp_path):
+    path = str(tmp_path / "manifest.json")
+    manifest = IngestManifest(path)
+    manifest.record(str(tmp_path / "a.pdf"), FINGERPRINT, ["a_0", "a_1"])
+    manifest.save()
+
+    reloaded = IngestManifest(path)
+    assert reloaded.is_current(str(tmp_path / "a.pdf"), FINGERPRINT)
+    assert reloaded.chunk_ids(str(tmp_path / "a.pdf")) == ["a_0", "a_1"]
+    assert not os.path.exists(path + ".tmp")
+
+def test_changed_fingerprint_is_not_current(tmp_path):
+    manifest = IngestManifest(str(tmp_path / "manifest.json"))
+    manifest.record("a.pdf", FINGERPRINT, [])
+
+    assert not manifest.is_current("a.pdf", {**FINGERPRINT, "chunker": {"chunk_size": 400}})
+    assert not manifest.is_current("b.pdf", FINGERPRINT)
+
+def test_sources_are_keyed_by_absolute_path(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    manifest = IngestManifest(str(tmp_path / "manifest.json"))
+    manifest.record("a.pdf", FINGERPRINT, ["a_0"])
+
+    assert manifest.is_current(str(tmp_path / "a.pdf"), FINGERPRINT)
+    manifest.remove(os.path.join(".", "a.pdf"))
+    assert manifest.entries == {}
+
+def test_relative_keys_of_older_manifests_are_made_absolute(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    path = tmp_path / "manifest.json"
+    path.write_text(json.dumps({"a.pdf": {"fingerprint": FINGERPRINT, "chunk_ids": ["a_0"]}}))
+
+    assert IngestManifest(str(path)).is_current(str(tmp_path / "a.pdf"), FINGERPRINT)
+
+def test_stale_chunk_ids(tmp_path):
+    manifest = IngestManifest(str(tmp_path / "manifest.json"))
+    manifest.record("a.pdf", FINGERPRINT, ["a_0", "a_1", "a_2"])
+
+    assert manifest.stale_chunk_ids("a.pdf", ["a_0", "a_1"]) == ["a_2"]
+    assert manifest.stale_chunk_ids("new.pdf", ["n_0"]) == []
+
+def test_removed_sources_only_within_the_scanned_folder(tmp_path):
+    folder = tmp_path / "docs"
+    folder.mkdir()
+    manifest = IngestManifest(str(tmp_path / "manifest.json"))
+    for source in (folder / "kept.pdf", folder / "gone.pdf", tmp_path / "elsewhere.pdf"):
+        manifest.record(str(source), FINGERPRINT, [])
+
+    assert manifest.removed_sources([str(folder / "kept.pdf")], str(folder)) == [str(folder / "gone.pdf")]
+    # A single file was scanned: nothing is considered removed
+    assert manifest.removed_sources([str(folder / "kept.pdf")], str(folder / "kept.pdf")) == []
+
+def test_source_id_and_file_hash(tmp_path):
+    path = tmp_path / "policy 2024 (copy).pdf"
+    path.write_bytes(b"content")
+
+    assert source_id(str(path)).startswith("policy_2024__copy_-")
+    assert source_id(str(path)) != source_id(str(tmp_path / "other" / path.name))
+    assert file_sha256(str(path)) == "ed7002b439e9ac845f22357d822bac1444730fbdb6016d3ec9432297b9ec9f73"
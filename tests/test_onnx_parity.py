@@ -0,0 +1,94 @@
+"""
+Parity of the ONNX Runtime encoder backend with PyTorch: mean-pooled embeddings of the same texts
+must stay within `MIN_COSINE` of the PyTorch ones, for fp32 and int8 weights.
+
+By default the check runs offline on a tiny randomly initialized BERT built by the test. Set
+ONNX_PARITY_MODELS to a comma-separated list of model names or local paths to check real models
+instead, e.g. "sentence-transformers/all-MiniLM-L6-v2,bert-base-uncased" for the MiniLM embedding
+model and the BERT similarity model; they are downloaded from HuggingFace on first use.
+
+Usage:
+    python -m pytest tests/test_onnx_parity.py
+"""
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+ort = pytest.importorskip("onnxruntime")
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+
+from chunking.onnx_encoder import OnnxEncoder
+
+MIN_COSINE = 0.98  # As `benchmarks/bench_encoders.py --min-cosine`
+
+# Stands for the model built by the `tiny_bert` fixture
+TINY_BERT = "tiny-bert"
+MODELS = os.getenv("ONNX_PARITY_MODELS", TINY_BERT).split(",")
+
+TEXTS = [
+    "Insured Name: Jane Doe",
+    "Policy Number: HO-2024-118734",
+    "Premium: $1,234.00",
+    "Deductible: $500 per claim",
+    "Coverage Limit: $300,000 dwelling, $150,000 personal property",
+    "Effective Date: 2024-03-01, Expiration Date: 2025-03-01",
+    "Exclusions: flood, earthquake, and damage caused by wear and tear or gradual deterioration.",
+    "The insurer will pay for direct physical loss to the dwelling caused by fire, lightning, windstorm or "
+    "hail, provided the loss is reported within 60 days and the premises were not vacant for more than 30 "
+    "consecutive days before the loss.",
+    "x",
+]
+
+@pytest.fixture(scope="module")
+def onnx_directory(tmp_path_factory):
+    return str(tmp_path_factory.mktemp("onnx_models"))
+
+@pytest.fixture(scope="module")
+def tiny_bert(tmp_path_factory):
+    """
+    A two-layer BERT with random weights and a word-piece vocabulary covering `TEXTS`, saved locally.
+    """
+    directory = tmp_path_factory.mktemp("tiny_bert")
+    words = sorted({word for text in TEXTS for word in transformers.BasicTokenizer().tokenize(text)})
+    vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + words
+    vocab_path = directory / "vocab.txt"
+    vocab_path.write_text("\n".join(vocab) + "\n")
+    transformers.BertTokenizerFast(vocab_file=str(vocab_path)).save_pretrained(directory)
+
+    torch.manual_seed(0)
+    config = transformers.BertConfig(vocab_size=len(vocab), hidden_size=64, num_hidden_layers=2, num_attention_heads=4,
+                                     intermediate_size=128, max_position_embeddings=512)
+    transformers.BertModel(config).eval().save_pretrained(directory)
+    return str(directory)
+
+def torch_embeddings(model_name):
+    """
+    Mean-pooled, L2-normalized embeddings with PyTorch, as sentence-transformers and `compute_similarity` compute them.
+    """
+    try:
+        tokenizer = transformers.AutoTokenizer.from_pretrained(model_name)
+        model = transformers.AutoModel.from_pretrained(model_name).eval()
+    except OSError as error:
+        pytest.skip(f"Model '{model_name}' is not available: {error}")
+    inputs = tokenizer(TEXTS, return_tensors="pt", padding=True, truncation=True, max_length=512)
+    with torch.inference_mode():
+        hidden = model(**inputs).last_hidden_state
+    mask = inputs["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+    embeddings = ((hidden * mask).sum(dim=1) / mask.sum(dim=1)).numpy()
+    return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+@pytest.mark.parametrize("quantize", [False, True], ids=["fp32", "int8"])
+@pytest.mark.parametrize("model_name", MODELS)
+def test_onnx_matches_torch(model_name, quantize, onnx_directory, request):
+    if model_name == TINY_BERT:
+        model_name = request.getfixturevalue("tiny_bert")
+    reference = torch_embeddings(model_name)
+    embeddings = OnnxEncoder(model_name, quantize=quantize, directory=onnx_directory).embed(TEXTS, normalize=True)
+
+    assert embeddings.shape == reference.shape
+    cosine = np.sum(embeddings * reference, axis=1)
+    assert cosine.min() >= MIN_COSINE, f"Lowest cosine similarity {cosine.min():.4f} for {TEXTS[cosine.argmin()]!r}"
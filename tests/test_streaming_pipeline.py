@@ -0,0 +1,69 @@
+import threading
+import time
+import pytest
+
+from streaming_pipeline import Stage, StreamingPipeline
+
+def pipeline_threads():
+    return [thread for thread in threading.enumerate() if thread is not threading.current_thread() and thread.daemon]
+
+def test_items_pass_through_every_stage():
+    pipeline = StreamingPipeline([
+        Stage("double", lambda x: 2 * x, workers=3),
+        Stage("sum", lambda batch: [sum(batch)], batch_size=100, batch_wait=1.0),
+    ])
+
+    assert pipeline.run(range(10)) == [90]
+    stats = {s["stage"]: s for s in pipeline.stats()}
+    assert stats["double"]["processed"] == 10
+    assert (stats["sum"]["processed"], stats["sum"]["batches"]) == (10, 1)
+
+def test_failed_items_are_recorded_and_dropped():
+    def check(x):
+        if x % 3 == 0:
+            raise ValueError(x)
+        return x
+
+    stage = Stage("check", check, workers=2)
+    assert sorted(StreamingPipeline([stage, Stage("none", lambda x: None if x == 4 else x)]).run(range(7))) == [1, 2, 5]
+    assert sorted(item for item, _ in stage.errors) == [0, 3, 6]
+
+def test_input_error_is_raised_after_the_items_before_it():
+    def items():
+        yield 1
+        yield 2
+        raise RuntimeError("listing failed")
+
+    outputs = []
+    with pytest.raises(RuntimeError, match="listing failed"):
+        for output in StreamingPipeline([Stage("id", lambda x: x)]).iter_run(items()):
+            outputs.append(output)
+    assert outputs == [1, 2]
+
+def test_closing_early_stops_every_thread():
+    produced = []
+
+    def items():
+        for i in range(10_000):
+            produced.append(i)
+            yield i
+
+    before = set(pipeline_threads())
+    pipeline = StreamingPipeline([Stage("slow", lambda x: time.sleep(0.01) or x, workers=2, queue_size=2),
+                                  Stage("id", lambda x: x, queue_size=2)], output_queue_size=2)
+    outputs = pipeline.iter_run(items())
+    assert next(outputs) is not None
+    outputs.close()
+
+    deadline = time.monotonic() + 5
+    while set(pipeline_threads()) - before and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not set(pipeline_threads()) - before
+    # Bounded queues: the input was read only a few items ahead
+    assert len(produced) < 50
+
+def test_pipeline_can_run_again():
+    pipeline = StreamingPipeline([Stage("inc", lambda x: x + 1, workers=2)])
+
+    assert sorted(pipeline.run(range(3))) == [1, 2, 3]
+    assert sorted(pipeline.run(range(3, 5))) == [4, 5]